@@ -0,0 +1,69 @@
+"""Cold start of the entry points, from `python -X importtime`.
+
+Exit with an error when the median import time is over the budget.
+
+Usage: python -m benchmarks.bench_import [MODULE ...]
+"""
+
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from statistics import median
+
+from monitor import utils
+
+MODULES = ["monitor.do", "monitor.daemon"]
+BUDGET_MS = 400  # import of an entry point, on a warm disk cache
+RUNS = 5
+TOP = 10
+
+
+def importtime(module: str) -> dict[str, tuple[int, int]]:
+    """Self and cumulative microseconds of every imported module"""
+    env = {k: v for k, v in os.environ.items() if k != "SPOTIFY_AUTH"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us), int(cumulative))
+    return times
+
+
+def main(modules: list[str]) -> None:
+    over = False
+    for module in modules:
+        runs = [importtime(module) for _ in range(RUNS)]
+        total = median(run[module][1] for run in runs) / 1000
+        cumulative = defaultdict(list)
+        for run in runs:
+            for name, (_, cumul) in run.items():
+                cumulative[name].append(cumul)
+        # the slowest top level imports of the package and of the libraries
+        top = sorted(
+            (
+                (median(times) / 1000, name)
+                for name, times in cumulative.items()
+                if name != module and (name.startswith("monitor.") or "." not in name)
+            ),
+            reverse=True,
+        )[:TOP]
+        results = [["module", "cumulative (ms)"]]
+        results += [[name, f"{ms:.1f}"] for ms, name in top]
+        print(f"{module}: {total:.1f} ms, {len(runs[0])} modules, budget {BUDGET_MS} ms")
+        utils.print_ascii_table(results, 0)
+        over = over or total > BUDGET_MS
+    if over:
+        sys.exit("Import time over budget")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or MODULES)
@@ -0,0 +1,102 @@
+"""Offline ingestion: replay the recorded cassettes through every station main.
+
+Every cycle rewrites the titles with a counter, so the plays are new and
+really inserted; with --dupes they are the same and the dedup path is measured.
+
+Usage: python -m benchmarks.bench_ingest [--dupes] [CYCLES]
+"""
+
+import itertools
+import sys
+import time
+from pathlib import Path
+from statistics import median, quantiles
+
+import vcr
+from vcr.record_mode import RecordMode
+
+from monitor import db_init, utils
+from monitor.radio import capital, deejay, freccia, m2o, r101, r105, rds, rtl, virgin
+
+DB = "bench_ingest.sqlite3"
+CYCLES = 1000
+CASSETTES = {
+    capital: "fixtures/e2e_capital.yml",
+    deejay: "fixtures/e2e_dj.yml",
+    freccia: "fixtures/e2e_freccia.yml",
+    m2o: "fixtures/e2e_m2o.yml",
+    r101: "fixtures/e2e_r101.yml",
+    r105: "fixtures/e2e_r105.yml",
+    rds: "fixtures/e2e_rds.yml",
+    rtl: "fixtures/e2e_rtl.yml",
+    virgin: "fixtures/e2e_virgin.yml",
+}
+
+
+def main(cycles: int, dupes: bool) -> None:
+    orig_db = utils.conn_db
+    orig_insert_plays = utils.insert_plays
+    Path(DB).unlink(missing_ok=True)
+
+    def bench_conn_db(path=""):
+        return orig_db(DB)
+
+    insert_times = list[float]()
+    counter = itertools.count()
+
+    def timed_insert_plays(plays, acquisition_id, conn):
+        plays = list(plays)
+        n = next(counter)
+        if not dupes:
+            plays = [play._replace(title=f"{play.title} #{n}") for play in plays]
+        start = time.perf_counter()
+        try:
+            return orig_insert_plays(plays, acquisition_id, conn)
+        finally:
+            insert_times.append(time.perf_counter() - start)
+
+    utils.conn_db = bench_conn_db
+    utils.insert_plays = timed_insert_plays
+    db_init.main()
+    my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
+    results = [["station", "cycles", "parse p50", "insert p50", "cycle p50", "cycle p99", "plays"]]
+    try:
+        for module, cassette in CASSETTES.items():
+            name = module.__name__.rsplit(".", 1)[1]
+            insert_times.clear()
+            cycle_times = []
+            with my_vcr.use_cassette(cassette, allow_playback_repeats=True):  # type: ignore
+                for _ in range(cycles):
+                    start = time.perf_counter()
+                    module.main(utils.generate_batch(f"bench_{name}"))
+                    cycle_times.append(time.perf_counter() - start)
+            parse_times = [c - i for c, i in zip(cycle_times, insert_times, strict=True)]
+            with utils.conn_db() as conn:
+                plays = conn.fetch_one(
+                    int, "SELECT COUNT(*) FROM play WHERE acquisition_id LIKE ?", f"bench_{name}_%"
+                )
+            results.append(
+                [
+                    name,
+                    cycles,
+                    f"{median(parse_times) * 1000:.3f}",
+                    f"{median(insert_times) * 1000:.3f}",
+                    f"{median(cycle_times) * 1000:.3f}",
+                    f"{quantiles(cycle_times, n=100)[98] * 1000:.3f}",
+                    plays,
+                ]
+            )
+            print(f"Done {name}", flush=True)
+    finally:
+        utils.conn_db = orig_db
+        utils.insert_plays = orig_insert_plays
+        Path(DB).unlink(missing_ok=True)
+    print("times in ms, parse is the rest of the cycle: replayed HTTP, parsing, connection")
+    utils.print_ascii_table(results, 0)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    dupes = "--dupes" in args
+    args = [arg for arg in args if arg != "--dupes"]
+    main(int(args[0]) if args else CYCLES, dupes)
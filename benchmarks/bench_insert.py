@@ -0,0 +1,122 @@
+"""Insert latency as the play table grows.
+
+The dedup query scans idx_play_station_observed_epoch (migration 005),
+the legacy one scans the whole table.
+
+Usage: python -m benchmarks.bench_insert [SIZE ...]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import median
+
+from monitor import db_init, utils
+
+DB = "bench_insert.sqlite3"
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+SAMPLES = 200
+LEGACY_SAMPLES = 5
+START = datetime(2020, 1, 1)
+STATIONS = 9
+
+
+def fill(start: int, end: int) -> None:
+    """Add plays up to end, spread over the stations, one every minute"""
+    with utils.conn_db() as conn:
+        conn.exec(
+            """
+WITH RECURSIVE n(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+INSERT INTO play (station_id, observed_at, title_raw, performer_raw, acquisition_id)
+SELECT
+    (i % ?) + 1,
+    strftime('%Y-%m-%dT%H:%M:%S', ?, '+' || (i / ?) || ' minutes'),
+    'Title ' || (i % 5000),
+    'Performer ' || (i % 700),
+    'bench'
+FROM n""",
+            start,
+            end - 1,
+            STATIONS,
+            START.isoformat(),
+            STATIONS,
+        )
+
+
+def legacy_is_duplicate(radio: str, timestamp: datetime) -> None:
+    """The full scan dedup query, before idx_play_station_observed_epoch"""
+    with utils.conn_db() as conn:
+        conn.fetch_many(
+            tuple[str, str, str],
+            """
+    SELECT observed_at, title_raw, performer_raw
+    FROM play NOT INDEXED
+    WHERE station_id = (SELECT station_id FROM station WHERE station_code = ?)
+    ORDER BY ABS(strftime('%s', observed_at) - strftime('%s', ?))
+    LIMIT 2
+    """,
+            radio,
+            timestamp.isoformat(),
+        )
+
+
+def timeit(fn, samples: int) -> float:
+    """Median time in milliseconds"""
+    times = []
+    for i in range(samples):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+    return median(times) * 1000
+
+
+def main(sizes: list[int]) -> None:
+    orig_db = utils.conn_db
+    Path(DB).unlink(missing_ok=True)
+
+    def bench_conn_db(path=""):
+        return orig_db(DB)
+
+    utils.conn_db = bench_conn_db
+    db_init.main()
+    random.seed(0)
+    results = [["plays", "insert (ms)", "dedup query (ms)", "legacy query (ms)"]]
+    count = 0
+    for size in sorted(sizes):
+        fill(count, size)
+        count = size
+        end = START + timedelta(minutes=size // STATIONS)
+
+        def insert(i: int, end=end) -> None:
+            # a new song, after the last play
+            utils.insert_into_radio("dj", "Bench", f"New {i}", "bench", end + timedelta(minutes=i))
+
+        def dedup(_: int, end=end) -> None:
+            # a random time in the past, the cache can not answer
+            timestamp = START + (end - START) * random.random()
+            with utils.conn_db() as conn:
+                utils._is_duplicate_db("dj", "Title", "Performer", timestamp, conn)
+
+        def legacy(_: int, end=end) -> None:
+            legacy_is_duplicate("dj", START + (end - START) * random.random())
+
+        results.append(
+            [
+                size,
+                f"{timeit(insert, SAMPLES):.3f}",
+                f"{timeit(dedup, SAMPLES):.3f}",
+                f"{timeit(legacy, LEGACY_SAMPLES):.3f}",
+            ]
+        )
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM play WHERE acquisition_id = 'bench' AND performer_raw = 'Bench'")
+        print(f"Done {size} plays", flush=True)
+    utils.conn_db = orig_db
+    Path(DB).unlink()
+    utils.print_ascii_table(results, 0)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
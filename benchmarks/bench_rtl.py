@@ -0,0 +1,76 @@
+"""RTL metadata: native ID3 reader against ffprobe, on the recorded fixtures.
+
+Usage: python -m benchmarks.bench_rtl [SAMPLES]
+"""
+
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+import vcr
+import yaml
+from vcr.record_mode import RecordMode
+
+from monitor import utils
+from monitor.radio import rtl
+
+CASSETTE = "fixtures/e2e_rtl.yml"
+SAMPLES = 50
+
+
+def timeit(fn, samples: int) -> tuple[float, float]:
+    """Median wall and CPU time in milliseconds"""
+    walls, cpus = [], []
+    for _ in range(samples):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        fn()
+        walls.append(time.perf_counter() - start)
+        cpus.append(time.process_time() - start_cpu)
+    return median(walls) * 1000, median(cpus) * 1000
+
+
+def write_stream(directory: Path) -> Path:
+    """Copy the playlists and the segment of the cassette on disk, return the master playlist"""
+    with Path(CASSETTE).open("rt") as fi:
+        interactions = yaml.safe_load(fi)["interactions"]
+    master = None
+    for interaction in interactions[1:]:
+        path = directory / interaction["request"]["uri"].rsplit("/", 1)[1]
+        body = interaction["response"]["body"]["string"]
+        if isinstance(body, str):
+            body = body.encode()
+        path.write_bytes(body)
+        master = master or path
+    assert master
+    return master
+
+
+def main(samples: int) -> None:
+    my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
+    results = [["path", "wall (ms)", "cpu (ms)"]]
+    with my_vcr.use_cassette(CASSETTE, allow_playback_repeats=True):  # type: ignore
+        wall, cpu = timeit(lambda: rtl.parse(rtl.URL), samples)
+    results.append(["native, replayed http", f"{wall:.3f}", f"{cpu:.3f}"])
+    with tempfile.TemporaryDirectory() as tmp:
+        master = write_stream(Path(tmp))
+        segment = sorted(Path(tmp).glob("*.aac"))[0].read_bytes()
+        wall, cpu = timeit(lambda: rtl.parse_id3(segment), samples)
+        results.append(["native, id3 only", f"{wall:.3f}", f"{cpu:.3f}"])
+        if shutil.which("ffprobe"):
+            cmd = rtl._ffprobe(str(master))
+            # the CPU of the child process is not counted by process_time
+            wall, cpu = timeit(
+                lambda: subprocess.run(cmd, capture_output=True, check=True), samples
+            )
+            results.append(["ffprobe, local files", f"{wall:.3f}", "n/a"])
+        else:
+            print("ffprobe not found, skipped")
+    utils.print_ascii_table(results, 0)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SAMPLES)
@@ -0,0 +1,192 @@
+"""Re-parse the stored payloads of the plays, after a parser fix.
+
+Plays are read in chunks by play_id (keyset pagination), parsed by the
+station `parse_payload` in a pool of processes, and the changed rows are
+written in one transaction per chunk, together with the progress:
+an interrupted backfill resumes from the last written chunk.
+The plays with new raw strings are queued again for the matcher.
+
+Usage: python -m monitor.backfill [--restart] [--name NAME] [STATION_CODE ...]
+"""
+
+import importlib
+import os
+import sys
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from onlymaps import Bulk
+
+from monitor import payloads, smatcher, utils
+
+if TYPE_CHECKING:
+    from onlymaps import Database
+
+CHUNK = 5000  # plays per chunk and per transaction
+# station_code -> station module in monitor.radio, freccia stores no payload
+PARSERS = {
+    "cap": "capital",
+    "dj": "deejay",
+    "m2o": "m2o",
+    "101": "r101",
+    "105": "r105",
+    "rds": "rds",
+    "rtl": "rtl",
+    "vir": "virgin",
+}
+
+# play_id, station_code, title_raw, performer_raw, observed_at, source_payload, data, dict_id
+type Row = tuple[int, str, str, str, str, str | None, bytes | None, int | None]
+# play_id, title_raw, performer_raw, observed_at
+type Update = tuple[int, str, str, str]
+
+
+def reparse(rows: list[Row], zdicts: dict[int, bytes]) -> tuple[list[Update], int]:
+    """Parse the payloads again, return the changed plays and the parse errors"""
+    updates = list[Update]()
+    errors = 0
+    for play_id, code, title, performer, observed_at, source_payload, data, dict_id in rows:
+        if data is not None:
+            txt = payloads.decompress(data, zdicts[dict_id] if dict_id else None)
+        else:
+            txt = source_payload
+        if not txt or code not in PARSERS:
+            continue
+        module = importlib.import_module(f"monitor.radio.{PARSERS[code]}")
+        try:
+            parsed = module.parse_payload(txt)
+        except Exception:
+            errors += 1
+            continue
+        if not parsed:
+            continue
+        new_performer, new_title, timestamp = parsed
+        new = (
+            new_title.strip(),
+            new_performer.strip(),
+            timestamp.isoformat() if timestamp else observed_at,
+        )
+        if new != (title, performer, observed_at):
+            updates.append((play_id, *new))
+    return updates, errors
+
+
+def read_chunk(
+    last_id: int, codes: list[str], conn: "Database"
+) -> tuple[list[Row], dict[int, bytes]]:
+    rows = conn.fetch_many(
+        ...,
+        f"""
+SELECT p.play_id, s.station_code, p.title_raw, p.performer_raw, p.observed_at,
+    p.source_payload, pl.data, pl.dict_id
+FROM play AS p
+JOIN station AS s ON s.station_id = p.station_id
+LEFT JOIN payload AS pl ON pl.payload_id = p.payload_id
+WHERE p.play_id > ? AND s.station_code IN ({", ".join("?" * len(codes))})
+ORDER BY p.play_id
+LIMIT ?""",
+        last_id,
+        *codes,
+        CHUNK,
+    )
+    # the dictionaries are sent once per chunk, not once per row
+    zdicts = {}
+    if dict_ids := sorted({row[7] for row in rows if row[7]}):
+        zdicts = dict(
+            conn.fetch_many(
+                ...,
+                "SELECT dict_id, zdict FROM payload_dict"
+                f" WHERE dict_id IN ({', '.join('?' * len(dict_ids))})",
+                *dict_ids,
+            )
+        )
+    return rows, zdicts
+
+
+def write_chunk(name: str, last_id: int, updates: list[Update], conn: "Database") -> None:
+    """Store the changed plays and the progress, the plays with new raw strings
+    lose their matches and are matched again"""
+    with conn.transaction():
+        if updates:
+            texts = {play_id: (title, performer) for play_id, title, performer, _ in updates}
+            old = conn.fetch_many(
+                tuple[int, str, str],
+                "SELECT play_id, title_raw, performer_raw FROM play"
+                f" WHERE play_id IN ({', '.join('?' * len(texts))})",
+                *texts,
+            )
+            smatcher.rematch_plays(
+                [(play_id, t, p) for play_id, t, p in old if (t, p) != texts[play_id]], conn
+            )
+            conn.exec(
+                """UPDATE play SET title_raw = ?2, performer_raw = ?3, observed_at = ?4
+                WHERE play_id = ?1""",
+                Bulk(updates),
+            )
+        conn.exec(
+            """INSERT INTO backfill_state (name, last_play_id, updated) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                last_play_id = excluded.last_play_id,
+                updated = updated + excluded.updated,
+                updated_at = strftime('%Y-%m-%dT%H:%M:%fZ','now')""",
+            name,
+            last_id,
+            len(updates),
+        )
+
+
+def backfill(
+    conn: "Database",
+    codes: list[str] | None = None,
+    name: str = "backfill",
+    restart: bool = False,
+    workers: int | None = None,
+) -> int:
+    """Re-parse the plays of the stations, return the number of changed plays"""
+    codes = [code for code in codes or PARSERS if code in PARSERS]
+    if restart:
+        conn.exec("DELETE FROM backfill_state WHERE name = ?", name)
+    last_id = (
+        conn.fetch_one_or_none(int, "SELECT last_play_id FROM backfill_state WHERE name = ?", name)
+        or 0
+    )
+    changed = errors = 0
+    workers = workers or os.process_cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        # chunks are written in order, while the next ones are parsed
+        pending = list[tuple[int, Future]]()
+        depth = workers * 2
+        while True:
+            rows, zdicts = read_chunk(last_id, codes, conn) if codes else ([], {})
+            if rows:
+                last_id = rows[-1][0]
+                pending.append((last_id, pool.submit(reparse, rows, zdicts)))
+            while pending and (len(pending) >= depth or not rows):
+                chunk_last_id, future = pending.pop(0)
+                updates, chunk_errors = future.result()
+                write_chunk(name, chunk_last_id, updates, conn)
+                changed += len(updates)
+                errors += chunk_errors
+                print(f"Backfill {name}: up to play {chunk_last_id}, {changed} changed", flush=True)
+            if not rows:
+                break
+    if errors:
+        print(f"Backfill {name}: {errors} payloads not parsed")
+    return changed
+
+
+def main(args: list[str]) -> None:
+    restart = "--restart" in args
+    args = [arg for arg in args if arg != "--restart"]
+    name = "backfill"
+    if "--name" in args:
+        i = args.index("--name")
+        name = args[i + 1]
+        del args[i : i + 2]
+    with utils.conn_db() as conn:
+        changed = backfill(conn, args or None, name, restart)
+    print(f"Changed {changed} plays")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main(sys.argv[1:])
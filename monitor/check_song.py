@@ -1,7 +1,6 @@
 from typing import TYPE_CHECKING, NamedTuple
 
-from monitor import smatcher, utils
-from monitor.musicbrainz import find_releases as mb_find_releases
+from monitor import musicbrainz, smatcher, spotify, utils
 from monitor.smatcher import CandidateByID, CandidateBySong, CandidateList, Song, db_find
 from monitor.utils import print_ascii_table
 
@@ -195,6 +194,7 @@ def save_alias_solution(s: Song | int, play_id: int, conn: "Database", method="h
             play_id,
             play_id,
         )
+    smatcher.sync_aliases(conn)
 
 
 def ask_user(play_id: int, conn: "Database") -> bool:
@@ -205,11 +205,21 @@ def ask_user(play_id: int, conn: "Database") -> bool:
     return True
 
 
-def query_spotify(play_id: int, token: str, conn: "Database") -> bool:
+def find_spotify(title: str, performer: str, conn: "Database") -> list[spotify.SpSong]:
+    """The Spotify results, none when the search failed"""
+    try:
+        # the session can outlast a token, get_token renews it
+        return spotify.cached_find(title, performer, spotify.get_token(), conn)
+    except spotify.SearchError as e:
+        print(f" -> {e}")
+        return []
+
+
+def query_spotify(play_id: int, conn: "Database") -> bool:
     r = input_from_user(False)
     if not r:
         return False
-    releases = smatcher.spotify_find(r.title, r.s_performers, token)
+    releases = find_spotify(r.title, r.s_performers, conn)
     if releases:
         print_ascii_table(
             [
@@ -353,7 +363,6 @@ def join_songs(conn: "Database") -> None:
 def main() -> None:
     with utils.conn_db() as conn:
         last_id = -1
-        token = smatcher.get_token()
         while True:
             to_check = find_play_tocheck(last_id, conn)
             if not to_check:
@@ -426,7 +435,7 @@ def main() -> None:
                     continue
                 case "r" | "retry":
                     # Retry spotify search
-                    releases = smatcher.spotify_find(title, performer, token)
+                    releases = find_spotify(title, performer, conn)
                     if releases:
                         candidates[play_id] = [
                             CandidateBySong(Song.from_spotify(ss), ss.score, "mspotify")
@@ -441,8 +450,8 @@ def main() -> None:
                     continue
                 case "m" | "mb" | "mbrainz" | "musicbrainz":
                     # Try MusicBrainz search
-                    releases = mb_find_releases(
-                        utils.clear_title(title), utils.clear_artist(performer)
+                    releases = musicbrainz.cached_find(
+                        utils.clear_title(title), utils.clear_artist(performer), conn
                     )
                     if releases:
                         candidates[play_id] = [
@@ -458,7 +467,7 @@ def main() -> None:
                     continue
                 case "s" | "spotify":
                     # Query Spotify with manual input for title+performer
-                    _ = query_spotify(play_id, token, conn)
+                    _ = query_spotify(play_id, conn)
                     last_id -= 1
                     continue
                 case "e" | "i" | "entry" | "insert":
@@ -0,0 +1,121 @@
+"""Process-wide registry of pooled HTTP clients.
+
+Hosts are grouped in pools, every pool has its own client (sync and async)
+so connections are kept alive and reused between requests,
+with timeouts and limits tuned for the hosts in the pool.
+"""
+
+import atexit
+import importlib.util
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+
+# h2 is not a dependency, HTTP/2 only if it is installed anyway
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+class Pool(NamedTuple):
+    hosts: tuple[str, ...]
+    timeout: float = 10  # seconds
+    connect_timeout: float = 5  # seconds
+    max_connections: int = 10
+    max_keepalive: int = 5
+    keepalive_expiry: float = 120  # seconds
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+POOLS = {
+    # GEDI: deejay, capital, m2o
+    "gedi": Pool(("www.deejay.it", "www.capital.it", "www.m2o.it")),
+    # mediaset-mediaplayer API: r101, r105, virgin
+    "mediaset": Pool(("www.r101.it", "www.105.net", "www.virginradio.it")),
+    # ICY streams of r101, r105, virgin: long-lived, one connection per station
+    "icy": Pool(("icy.unitedradio.it", "icecast.unitedradio.it"), timeout=30),
+    "rds": Pool(("cdnapi.rds.it",)),
+    "rtl": Pool(("cloud.rtl.it",)),
+    "spotify": Pool(("accounts.spotify.com", "api.spotify.com"), max_connections=5),
+    # musicbrainz allows one request per second, no need for more connections
+    "musicbrainz": Pool(("musicbrainz.org",), timeout=20, max_connections=1, max_keepalive=1),
+    "default": Pool((), timeout=15),
+}
+
+_HOST_POOL = {host: name for name, pool in POOLS.items() for host in pool.hosts}
+
+_clients = dict[str, httpx.Client]()
+_async_clients = ContextVar[dict[str, httpx.AsyncClient] | None]("async_clients", default=None)
+
+
+def pool_name(url: str) -> str:
+    return _HOST_POOL.get(urlsplit(url).hostname or "", "default")
+
+
+def client(url: str) -> httpx.Client:
+    """The shared client for the pool of the url host"""
+    name = pool_name(url)
+    if name not in _clients:
+        pool = POOLS[name]
+        _clients[name] = httpx.Client(http2=HTTP2, timeout=pool.timeouts(), limits=pool.limits())
+    return _clients[name]
+
+
+def get(url: str, **kwargs: Any) -> httpx.Response:
+    return client(url).get(url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> httpx.Response:
+    return client(url).post(url, **kwargs)
+
+
+@atexit.register
+def close() -> None:
+    for c in _clients.values():
+        c.close()
+    _clients.clear()
+
+
+@asynccontextmanager
+async def async_pools() -> AsyncIterator[None]:
+    """Async clients are bound to an event loop,
+    they are available (and kept alive) only inside this context"""
+    if _async_clients.get() is not None:
+        raise RuntimeError("Async pools already open")
+    clients = dict[str, httpx.AsyncClient]()
+    token = _async_clients.set(clients)
+    try:
+        yield
+    finally:
+        _async_clients.reset(token)
+        for c in clients.values():
+            await c.aclose()
+
+
+def async_client(url: str) -> httpx.AsyncClient:
+    """The shared async client for the pool of the url host"""
+    clients = _async_clients.get()
+    if clients is None:
+        raise RuntimeError("Async pools not open, use async_pools()")
+    name = pool_name(url)
+    if name not in clients:
+        pool = POOLS[name]
+        clients[name] = httpx.AsyncClient(
+            http2=HTTP2, timeout=pool.timeouts(), limits=pool.limits()
+        )
+    return clients[name]
+
+
+async def aget(url: str, **kwargs: Any) -> httpx.Response:
+    return await async_client(url).get(url, **kwargs)
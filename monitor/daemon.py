@@ -0,0 +1,159 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from types import ModuleType
+from typing import TYPE_CHECKING
+
+from monitor import clients, utils
+from monitor.radio import do as radio
+
+if TYPE_CHECKING:
+    from onlymaps import Database
+
+MIN_INTERVAL = 15  # seconds, polling rate when a change is due
+MAX_INTERVAL = 300  # seconds, polling rate when nothing changes for a long time
+TYPICAL_DURATION = 210  # seconds, used when the song duration is unknown
+MATCH_INTERVAL = 600  # seconds between two runs of the matcher
+
+
+@dataclass
+class StationState:
+    """What the scheduler knows about the song currently on air on a station"""
+
+    module: ModuleType
+    current: tuple[str, str] | None = None  # performer, title
+    started_at: datetime | None = None
+    duration: int | None = None
+    interval: float = MIN_INTERVAL
+    next_poll: float = 0  # event loop time
+    overdue: int = 0  # polls without a change since the predicted end
+
+    def update(self, play: None | utils.RadioPlay, now: datetime, duration: int | None) -> bool:
+        """Record the result of a poll, return True if the song changed"""
+        if not play or (play.performer, play.title) == self.current:
+            return False
+        self.current = (play.performer, play.title)
+        self.started_at = play.timestamp.astimezone() if play.timestamp else now
+        self.duration = duration
+        return True
+
+    def predicted_end(self) -> datetime | None:
+        if not self.started_at:
+            return None
+        return self.started_at + timedelta(seconds=self.duration or TYPICAL_DURATION)
+
+    def next_interval(self, now: datetime, changed: bool) -> float:
+        """Seconds to wait before the next poll of this station"""
+        end = self.predicted_end()
+        remaining = (end - now).total_seconds() if end else 0
+        if changed or remaining > 0:
+            # wait for the current song to end
+            self.overdue = 0
+            self.interval = min(max(remaining, MIN_INTERVAL), MAX_INTERVAL)
+        else:
+            # a change is due but the metadata is the same: back off from MIN_INTERVAL
+            self.overdue += 1
+            self.interval = min(MIN_INTERVAL * 2**self.overdue, MAX_INTERVAL)
+        return self.interval
+
+
+def find_duration(performer: str, title: str, conn: "Database") -> int | None:
+    """Duration of the song resolved for a previous play of the same raw data"""
+    return conn.fetch_one_or_none(
+        int,
+        """
+SELECT s.duration
+FROM play AS p
+JOIN play_resolution AS pr ON pr.play_id = p.play_id
+JOIN song AS s ON s.song_id = pr.song_id
+WHERE p.title_raw = ? AND p.performer_raw = ?
+AND pr.status != 'pending' AND s.duration > 0
+ORDER BY p.play_id DESC
+LIMIT 1""",
+        title.strip(),
+        performer.strip(),
+    )
+
+
+async def poll(state: StationState, conn: "Database") -> None | utils.RadioPlay:
+    """Poll a station and schedule the next poll, return the play if changed"""
+    play = await radio.fetch_station(state.module)
+    now = datetime.now().astimezone()
+    duration = None
+    if play and (play.performer, play.title) != state.current:
+        duration = find_duration(play.performer, play.title, conn)
+    changed = state.update(play, now, duration)
+    state.next_poll = asyncio.get_running_loop().time() + state.next_interval(now, changed)
+    return play if changed else None
+
+
+def store(plays: list[utils.RadioPlay], acquisition_id: str, conn: "Database") -> None:
+    try:
+        utils.insert_plays(plays, acquisition_id, conn)
+    except Exception:
+        import traceback
+
+        traceback.print_exc()
+
+
+def match() -> None:
+    from monitor import smatcher
+    from monitor.utils import RMError
+
+    try:
+        smatcher.main()
+    except RMError as e:
+        print(e)
+    except Exception:
+        import traceback
+
+        traceback.print_exc()
+
+
+async def schedule(states: list[StationState], conn: "Database") -> None:
+    """Poll the stations when due, run the matcher every MATCH_INTERVAL"""
+    loop = asyncio.get_running_loop()
+    next_match = loop.time()
+    matcher: asyncio.Task | None = None
+    while True:
+        now = loop.time()
+        due = [state for state in states if state.next_poll <= now]
+        if due:
+            plays = await asyncio.gather(*(poll(state, conn) for state in due))
+            store([play for play in plays if play], utils.generate_batch("daemon"), conn)
+        if next_match <= now:
+            if not matcher or matcher.done():
+                # the matcher runs in background, polls go on meanwhile
+                matcher = asyncio.create_task(asyncio.to_thread(match))
+            next_match = now + MATCH_INTERVAL
+        wake_up = min([*(state.next_poll for state in states), next_match])
+        await asyncio.sleep(max(wake_up - loop.time(), 0))
+
+
+async def run(modules: list[ModuleType] | None = None) -> None:
+    """Stations with an ICY stream push their changes, the others are polled"""
+    if modules is None:
+        modules = radio.stations()
+    states = [StationState(module) for module in modules if not hasattr(module, "listen")]
+    async with clients.async_pools():
+        with utils.conn_db() as conn:
+
+            def on_play(play: utils.RadioPlay) -> None:
+                store([play], utils.generate_batch("icy"), conn)
+
+            async with asyncio.TaskGroup() as tasks:
+                for module in modules:
+                    if hasattr(module, "listen"):
+                        tasks.create_task(module.listen(on_play))
+                tasks.create_task(schedule(states, conn))
+
+
+def main() -> None:  # pragma: no cover
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -4,10 +4,12 @@ from onlymaps import Database
 
 from monitor import utils
 
+SQL_PATH = Path(__file__).parent / Path("sql")
 
-def init_schema(conn: Database) -> None:
-    base = Path(__file__).parent / Path("sql")
-    with (base / Path("db_init.sql")).open("rt") as fi:
+
+def read_statements(path: Path) -> list[str]:
+    """Read a SQL file, statements are separated by empty lines"""
+    with path.open("rt") as fi:
         sql = fi.read()
         statems = [""]
         for line in sql.splitlines():
@@ -15,24 +17,51 @@ def init_schema(conn: Database) -> None:
                 statems.append("")
             else:
                 statems[-1] = statems[-1] + "\n" + line
+    return [statem for statem in statems if statem.strip()]
+
+
+def migrations() -> list[tuple[int, Path]]:
+    """Numbered migrations for existing databases, in order"""
+    return sorted(
+        (int(path.name.split("_")[0]), path) for path in (SQL_PATH / "migrations").glob("*.sql")
+    )
+
+
+def init_schema(conn: Database) -> None:
     with conn.transaction():
-        for statem in statems:
-            if statem.strip():
-                conn.exec(statem)
+        for statem in read_statements(SQL_PATH / Path("db_init.sql")):
+            conn.exec(statem)
+        # db_init.sql is already up to date
+        conn.exec(f"PRAGMA user_version = {max((n for n, _ in migrations()), default=0)}")
 
 
 def init_data(conn: Database) -> None:
-    base = Path(__file__).parent / Path("sql")
-    with (base / Path("data_init.sql")).open("rt") as fi:
+    with (SQL_PATH / Path("data_init.sql")).open("rt") as fi:
         with conn.transaction():
             sql = fi.read()
             for statem in sql.split(";"):
                 conn.exec(statem)
 
 
+def migrate(conn: Database) -> None:
+    """Apply the migrations newer than the database version"""
+    version = conn.fetch_one(int, "PRAGMA user_version")
+    for number, path in migrations():
+        if number <= version:
+            continue
+        with conn.transaction():
+            for statem in read_statements(path):
+                conn.exec(statem)
+            conn.exec(f"PRAGMA user_version = {number}")
+        print(f"Applied migration {path.name}")
+
+
 def main() -> None:
     with utils.conn_db() as conn:
-        init_schema(conn)
+        if conn.fetch_one_or_none(int, "SELECT 1 FROM sqlite_master WHERE name = 'play'"):
+            migrate(conn)
+        else:
+            init_schema(conn)
         init_data(conn)
 
 
@@ -1,10 +1,14 @@
-from monitor import smatcher
+import sys
+
 from monitor.radio import do as radio
 from monitor.utils import RMError
 
 
-def main() -> None:
-    radio.main()
+def main(names: list[str] | None = None) -> None:
+    radio.main_async(radio.stations(names or radio.STATIONS))
+
+    # the matcher and the Spotify client are imported only now
+    from monitor import smatcher
 
     try:
         smatcher.main()
@@ -17,4 +21,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
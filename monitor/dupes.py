@@ -117,19 +117,21 @@ def join_songs(song_ids: set[int], conn: "Database") -> bool:
     return True
 
 
-def sort_cand(candidates: list[_SongCandidate], song: _FullSong) -> list[_SongCandidate]:
-    scandidates: list[tuple[float, _SongCandidate]] = [
-        (
-            utils.calc_score(
-                c.title,
-                c.performers,
-                song.title,
-                song.performers,
-            ),
-            c,
-        )
-        for c in candidates
-    ]
+def score_cand(candidates: list[_SongCandidate], song: _FullSong) -> list[float]:
+    """calc_score of every candidate against the song"""
+    return utils.calc_score_many(
+        (song.title, song.performers),
+        [(c.title, c.performers) for c in candidates],
+        reverse=True,
+    )
+
+
+def sort_cand(
+    candidates: list[_SongCandidate], song: _FullSong, scores: list[float] | None = None
+) -> list[_SongCandidate]:
+    if scores is None:
+        scores = score_cand(candidates, song)
+    scandidates: list[tuple[float, _SongCandidate]] = list(zip(scores, candidates, strict=True))
     scandidates = sorted(scandidates, key=lambda x: x[0], reverse=True)
     return [c for _, c in scandidates]
 
@@ -148,22 +150,16 @@ def main() -> None:
                 continue
             max_c_id = max(c.song_id for c in candidates)
             # filter candidates for likeness
-            candidates = [
-                c
-                for c in candidates
-                if utils.calc_score(
-                    c.title,
-                    c.performers,
-                    song.title,
-                    song.performers,
-                )
-                > 0.7
+            scored = [
+                (score, c)
+                for score, c in zip(score_cand(candidates, song), candidates, strict=True)
+                if score > 0.7
             ]
-            if not candidates:
+            if not scored:
                 save_work_review(song.song_id, [max_c_id], False, conn)
                 print(f"No dupes for {song.song_id} (untill {max_c_id})")
                 continue
-            candidates = sort_cand(candidates, song)
+            candidates = sort_cand([c for _, c in scored], song, [score for score, _ in scored])
             print_ascii_table(
                 [
                     ["v", "title", "performers", "year", "country", "#uses"],
@@ -0,0 +1,164 @@
+"""Sharded acquisition: fetcher processes and a single writer process.
+
+Every fetcher owns a shard of the stations, polls them every interval and
+sends the plays to the writer over a queue. The writer holds the only
+write connection to the database and commits the plays of all the shards
+in groups, so the fetchers never compete for the SQLite lock.
+
+Usage: python -m monitor.ingest [--once] [--shards N] [--interval SECONDS] [STATION ...]
+"""
+
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import time
+from collections.abc import Sequence
+from types import ModuleType
+from typing import TYPE_CHECKING
+
+from monitor import clients, utils
+from monitor.radio import breaker
+from monitor.radio import do as radio
+
+if TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+    from multiprocessing.queues import Queue
+    from multiprocessing.synchronize import Event
+
+INTERVAL = 60  # seconds between two cycles of a fetcher
+COMMIT_INTERVAL = 2  # seconds, max wait of a play before its commit
+COMMIT_SIZE = 500  # plays, commit earlier when the group is this big
+QUEUE_SIZE = 100  # cycles waiting for the writer, then the fetchers wait
+# the children do not inherit the state of this process, like smatcher.drain
+START_METHOD = "spawn"
+
+# plays of a cycle and breakers of the polled stations, the name of a fetcher when it stops
+type Message = str | tuple[list[utils.RadioPlay], list[breaker.Breaker]]
+
+
+def shard(names: Sequence[str], shards: int) -> list[list[str]]:
+    """Split the stations in shards, round robin"""
+    return [list(names[i::shards]) for i in range(shards) if names[i::shards]]
+
+
+def fetcher(names: list[str], messages: "Queue[Message]", stop: "Event", interval: float) -> None:
+    """Poll a shard of stations until stop is set (at least once), never write to the database"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    modules = radio.stations(names)
+    with utils.conn_db() as conn:
+        breakers = breaker.load(names, conn)
+    try:
+        asyncio.run(fetch_cycles(modules, breakers, messages, stop, interval))
+    finally:
+        messages.put(mp.current_process().name)
+
+
+async def fetch_cycles(
+    modules: list[ModuleType],
+    breakers: dict[str, breaker.Breaker],
+    messages: "Queue[Message]",
+    stop: "Event",
+    interval: float,
+) -> None:
+    """The cycles of a fetcher, in one event loop on the same clients, until stop is set"""
+    async with clients.async_pools():
+        while True:
+            messages.put(await radio.cycle(modules, breakers))
+            if await asyncio.to_thread(stop.wait, interval):
+                break
+
+
+def writer(messages: "Queue[Message]", fetchers: list[str]) -> None:
+    """Store what the fetchers send, until all of them are done"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    running = set(fetchers)
+    with utils.conn_db() as conn:
+        while running:
+            plays = list[utils.RadioPlay]()
+            breakers = dict[str, breaker.Breaker]()
+            deadline = time.monotonic() + COMMIT_INTERVAL
+            while running and len(plays) < COMMIT_SIZE:
+                try:
+                    message = messages.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if isinstance(message, str):
+                    running.discard(message)
+                    continue
+                cycle_plays, cycle_breakers = message
+                plays += cycle_plays
+                breakers.update((b.station, b) for b in cycle_breakers)
+            try:
+                if plays:
+                    utils.insert_plays(plays, utils.generate_batch("ingest"), conn)
+                breaker.save(list(breakers.values()), conn)
+            except Exception:
+                # the group is lost, keep the writer alive for the next ones
+                import traceback
+
+                traceback.print_exc()
+
+
+def run(
+    names: Sequence[str] = radio.STATIONS,
+    shards: int | None = None,
+    interval: float = INTERVAL,
+    once: bool = False,
+) -> None:
+    """Start the fetchers and the writer, stop them on Ctrl-C (or after one cycle)"""
+    shards = shards or min(os.process_cpu_count() or 1, len(names))
+    ctx = mp.get_context(START_METHOD)
+    messages: Queue[Message] = ctx.Queue(QUEUE_SIZE)
+    stop = ctx.Event()
+    if once:
+        stop.set()
+    fetchers = [
+        ctx.Process(target=fetcher, args=(part, messages, stop, interval), name=f"fetcher-{i}")
+        for i, part in enumerate(shard(names, shards))
+    ]
+    write = ctx.Process(
+        target=writer, args=(messages, [process.name for process in fetchers]), name="writer"
+    )
+    write.start()
+    for process in fetchers:
+        process.start()
+    try:
+        join(fetchers, write, messages)
+    except KeyboardInterrupt:
+        # the children ignore SIGINT, let them finish the cycle and the commit
+        stop.set()
+        join(fetchers, write, messages)
+
+
+def join(fetchers: list["BaseProcess"], write: "BaseProcess", messages: "Queue[Message]") -> None:
+    """Wait for the fetchers, then for the writer"""
+    for process in fetchers:
+        process.join()
+        # a fetcher killed before it could say so must not keep the writer waiting
+        messages.put(process.name)
+    write.join()
+
+
+def main(args: list[str]) -> None:
+    once = "--once" in args
+    args = [arg for arg in args if arg != "--once"]
+    options = {}
+    for option in ("--shards", "--interval"):
+        if option in args:
+            i = args.index(option)
+            options[option] = float(args[i + 1])
+            del args[i : i + 2]
+    radio.stations(args)  # check the names
+    run(
+        args or radio.STATIONS,
+        int(options.get("--shards", 0)) or None,
+        options.get("--interval", INTERVAL),
+        once,
+    )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main(sys.argv[1:])
@@ -0,0 +1,107 @@
+"""Responses of the song search providers (Spotify, MusicBrainz), kept in the database.
+
+Entries are keyed by provider and query, the query as sent (already normalized
+by `clear_title`/`clear_artist`), and hold the parsed songs as JSON, without
+the score: the score depends on the play and it is computed again on every lookup.
+The searches without results are not stored, see `smatcher.record_misses`.
+Entries older than TTL are fetched again, the least recently used ones are
+evicted beyond MAX_ENTRIES.
+
+The database is read and written only by `cached`, in the calling thread:
+the searches can run in other threads with the `Lookups` it yields.
+"""
+
+import json
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from onlymaps import Bulk
+
+if TYPE_CHECKING:
+    from onlymaps import Database
+
+TTL = 30 * 24 * 3600  # seconds
+MAX_ENTRIES = 50_000
+
+
+@dataclass
+class Lookups:
+    """Cached songs of the queries, and the ones fetched meanwhile"""
+
+    hits: dict[str, Any] = field(default_factory=dict)
+    fetched: dict[str, Any] = field(default_factory=dict)
+
+    def get(self, query: str) -> Any:
+        if query in self.hits:
+            return self.hits[query]
+        return self.fetched.get(query)
+
+    def add(self, query: str, songs: Any) -> None:
+        self.fetched[query] = songs
+
+
+def load(provider: str, queries: list[str], conn: "Database", ttl: float = TTL) -> Lookups:
+    """The fresh entries of the queries, marked as used"""
+    queries = list(dict.fromkeys(queries))
+    if not queries:
+        return Lookups()
+    now = int(time.time())
+    rows = conn.fetch_many(
+        tuple[str, str],
+        f"""
+SELECT query, songs
+FROM lookup_cache
+WHERE provider = ? AND fetched_at >= ? AND query IN ({", ".join("?" * len(queries))})""",
+        provider,
+        now - ttl,
+        *queries,
+    )
+    if rows:
+        conn.exec(
+            "UPDATE lookup_cache SET used_at = ? WHERE provider = ? AND query = ?",
+            Bulk([(now, provider, query) for query, _ in rows]),
+        )
+    return Lookups({query: json.loads(songs) for query, songs in rows})
+
+
+def save(
+    provider: str,
+    fetched: dict[str, Any],
+    conn: "Database",
+    max_entries: int = MAX_ENTRIES,
+) -> None:
+    """Store the fetched entries, evict the least recently used ones"""
+    if not fetched:
+        return
+    now = int(time.time())
+    with conn.transaction():
+        conn.exec(
+            """INSERT INTO lookup_cache (provider, query, songs, fetched_at, used_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (provider, query) DO UPDATE SET
+                songs = excluded.songs,
+                fetched_at = excluded.fetched_at,
+                used_at = excluded.used_at""",
+            Bulk(
+                [(provider, query, json.dumps(songs), now, now) for query, songs in fetched.items()]
+            ),
+        )
+        conn.exec(
+            """DELETE FROM lookup_cache WHERE rowid IN (
+                SELECT rowid FROM lookup_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?
+            )""",
+            max_entries,
+        )
+
+
+@contextmanager
+def cached(
+    provider: str, queries: list[str], conn: "Database", ttl: float = TTL
+) -> Iterator[Lookups]:
+    """Load the entries of the queries, store the ones fetched inside the block"""
+    lookups = load(provider, queries, conn, ttl)
+    yield lookups
+    save(provider, lookups.fetched, conn)
@@ -1,15 +1,29 @@
+from dataclasses import replace
+from typing import TYPE_CHECKING
+
 import httpx
 
-from monitor.spotify import SpSong
-from monitor.utils import calc_score, print_ascii_table
+from monitor import clients, lookup_cache
+from monitor.spotify import SpSong, from_cache, to_cache
+from monitor.utils import calc_score_many, print_ascii_table
+
+if TYPE_CHECKING:
+    from onlymaps import Database
+
+PROVIDER = "musicbrainz"  # in the lookup cache
+
 
+def search_query(title: str, artist: str) -> str:
+    return f"title:{title} AND artist:{artist}"
 
-def find_releases(title: str, artist: str) -> list[SpSong]:
+
+def search(query: str) -> None | list[SpSong]:
+    """The releases found by the query, not scored, None on HTTP errors"""
     # fetch musicbrainz API
-    r = httpx.get(
+    r = clients.get(
         "https://musicbrainz.org/ws/2/recording/",
         params={
-            "query": f"title:{title} AND artist:{artist}",
+            "query": query,
             "inc": "isrcs+media+artist-credits",
             "fmt": "json",
         },
@@ -18,7 +32,7 @@ def find_releases(title: str, artist: str) -> list[SpSong]:
         r.raise_for_status()
     except httpx.HTTPStatusError as e:
         print(e)
-        return []
+        return None
     tree = r.json()
     findings: list[SpSong] = []
     if not tree["recordings"]:
@@ -46,17 +60,46 @@ def find_releases(title: str, artist: str) -> list[SpSong]:
                     title=str(recording["title"]),
                     s_performers=iartist,
                     l_performers=tuple(a["name"] for a in recording["artist-credit"]),
-                    score=calc_score(title, artist, recording["title"], iartist),
+                    score=0,
                     isrc=isrc,
                     duration=recording.get("length", 0) // 1000,
                 )
             )
+    return findings
+
+
+def rank(songs: list[SpSong], title: str, artist: str) -> list[SpSong]:
+    """Score the releases against the play, keep the oldest good ones"""
+    scores = calc_score_many((title, artist), [(r.title, r.s_performers) for r in songs])
+    findings = [replace(r, score=score) for r, score in zip(songs, scores, strict=True)]
     if not findings:
         return []
     findings = sorted(findings, key=lambda r: r.year / r.score)[:5]
     return sorted(findings, key=lambda r: r.score, reverse=True)
 
 
+def find_releases(
+    title: str, artist: str, lookups: None | lookup_cache.Lookups = None
+) -> list[SpSong]:
+    query = search_query(title, artist)
+    cached = lookups.get(query) if lookups else None
+    if cached is not None:
+        return rank(from_cache(cached), title, artist)
+    songs = search(query)
+    if songs is None:
+        return []
+    if lookups and songs:
+        # a miss is not cached, its backoff decides when it is searched again
+        lookups.add(query, to_cache(songs))
+    return rank(songs, title, artist)
+
+
+def cached_find(title: str, artist: str, conn: "Database") -> list[SpSong]:
+    """find_releases, through the lookup cache"""
+    with lookup_cache.cached(PROVIDER, [search_query(title, artist)], conn) as lookups:
+        return find_releases(title, artist, lookups)
+
+
 def main():  # pragma: no cover
     while True:
         title = input("Title (or q): ").strip()
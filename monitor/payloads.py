@@ -0,0 +1,197 @@
+"""Raw payloads of the plays, stored once per content and compressed.
+
+A payload is keyed by the sha256 of its text and compressed with zlib,
+using a preset dictionary trained on the previous payloads of the same station:
+the responses of a station share most of their structure, so the dictionary
+holds the boilerplate and every payload keeps only what changes.
+Payloads are decompressed only when read, with `load`.
+"""
+
+import hashlib
+import zlib
+from typing import TYPE_CHECKING
+
+from onlymaps import Bulk
+
+if TYPE_CHECKING:
+    from onlymaps import Database
+
+ZDICT_SIZE = 32 * 1024  # zlib window, longer dictionaries are not used
+TRAIN_SAMPLES = 16  # payloads of a station used to train its dictionary
+LEVEL = 9
+
+
+def digest(payload: str) -> bytes:
+    return hashlib.sha256(payload.encode()).digest()
+
+
+def train(samples: list[str]) -> bytes:
+    """Dictionary from the samples, oldest first.
+    zlib prefers matches at the end of the dictionary, keep the recent ones there"""
+    zdict = b""
+    for sample in dict.fromkeys(reversed(samples)):
+        zdict = sample.encode() + zdict
+        if len(zdict) >= ZDICT_SIZE:
+            break
+    return zdict[-ZDICT_SIZE:]
+
+
+def compress(payload: str, zdict: bytes | None) -> bytes:
+    if zdict:
+        c = zlib.compressobj(LEVEL, zdict=zdict)
+    else:
+        c = zlib.compressobj(LEVEL)
+    return c.compress(payload.encode()) + c.flush()
+
+
+def decompress(data: bytes, zdict: bytes | None) -> str:
+    d = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return (d.decompress(data) + d.flush()).decode()
+
+
+def _samples(station_id: int, conn: "Database") -> list[str]:
+    """The last payloads of a station, oldest first"""
+    # blobs are not mapped by onlymaps, fetch raw rows
+    rows = conn.fetch_many(
+        ...,
+        """
+SELECT pl.data, pd.zdict
+FROM payload AS pl
+LEFT JOIN payload_dict AS pd ON pd.dict_id = pl.dict_id
+WHERE pl.station_id = ?
+ORDER BY pl.payload_id DESC
+LIMIT ?""",
+        station_id,
+        TRAIN_SAMPLES,
+    )
+    return [decompress(data, zdict) for data, zdict in reversed(rows)]
+
+
+def train_station(station_id: int, conn: "Database") -> None | tuple[int, bytes]:
+    """Store a new dictionary for the station, if there are enough payloads"""
+    samples = _samples(station_id, conn)
+    if len(samples) < TRAIN_SAMPLES:
+        return None
+    zdict = train(samples)
+    dict_id = conn.fetch_one(
+        int,
+        "INSERT INTO payload_dict (station_id, zdict) VALUES (?, ?) RETURNING dict_id",
+        station_id,
+        zdict,
+    )
+    return dict_id, zdict
+
+
+def store(payloads: list[tuple[int, str]], conn: "Database") -> list[int | None]:
+    """Store the (station_id, payload) pairs, return their payload_id.
+    Empty payloads are not stored. Run it inside the transaction of the plays."""
+    ids = list[int | None]([None] * len(payloads))
+    todo = [(i, station_id, payload) for i, (station_id, payload) in enumerate(payloads) if payload]
+    if not todo:
+        return ids
+    zdicts = {
+        station_id: (dict_id, zdict)
+        for station_id, dict_id, zdict in conn.fetch_many(
+            ...,
+            """
+SELECT station_id, dict_id, zdict
+FROM payload_dict
+WHERE dict_id IN (SELECT MAX(dict_id) FROM payload_dict GROUP BY station_id)""",
+        )
+    }
+    for station_id in {station_id for _, station_id, _ in todo} - zdicts.keys():
+        if trained := train_station(station_id, conn):
+            zdicts[station_id] = trained
+    hashes = [digest(payload) for _, _, payload in todo]
+    rows = []
+    for (_, station_id, payload), payload_hash in zip(todo, hashes, strict=True):
+        dict_id, zdict = zdicts.get(station_id, (None, None))
+        rows.append((payload_hash, station_id, dict_id, compress(payload, zdict)))
+    conn.exec(
+        "INSERT INTO payload (payload_hash, station_id, dict_id, data) VALUES (?, ?, ?, ?)"
+        " ON CONFLICT (payload_hash) DO NOTHING",
+        Bulk(rows),
+    )
+    unique = list(dict.fromkeys(hashes))
+    by_hash = dict(
+        conn.fetch_many(
+            ...,
+            "SELECT payload_hash, payload_id FROM payload"
+            f" WHERE payload_hash IN ({', '.join('?' * len(unique))})",
+            *unique,
+        )
+    )
+    for (i, _, _), payload_hash in zip(todo, hashes, strict=True):
+        ids[i] = by_hash[payload_hash]
+    return ids
+
+
+def load(play_id: int, conn: "Database") -> None | str:
+    """The raw payload of a play, decompressed"""
+    row = conn.fetch_one_or_none(
+        ...,
+        """
+SELECT p.source_payload, pl.data, pd.zdict
+FROM play AS p
+LEFT JOIN payload AS pl ON pl.payload_id = p.payload_id
+LEFT JOIN payload_dict AS pd ON pd.dict_id = pl.dict_id
+WHERE p.play_id = ?""",
+        play_id,
+    )
+    if not row:
+        return None
+    source_payload, data, zdict = row
+    if data is None:
+        # not moved yet
+        return source_payload
+    return decompress(data, zdict)
+
+
+def compact(conn: "Database", batch: int = 1000) -> int:
+    """Move the payloads still in play.source_payload to the payload table"""
+    moved = last_id = 0
+    while True:
+        with conn.transaction():
+            rows = conn.fetch_many(
+                tuple[int, int, str],
+                """
+SELECT play_id, station_id, source_payload
+FROM play
+WHERE play_id > ? AND source_payload IS NOT NULL
+ORDER BY play_id
+LIMIT ?""",
+                last_id,
+                batch,
+            )
+            if not rows:
+                return moved
+            last_id = rows[-1][0]
+            ids = store([(station_id, payload) for _, station_id, payload in rows], conn)
+            conn.exec(
+                "UPDATE play SET payload_id = ?, source_payload = NULL WHERE play_id = ?",
+                Bulk(
+                    [
+                        (payload_id, play_id)
+                        for (play_id, _, _), payload_id in zip(rows, ids, strict=True)
+                    ]
+                ),
+            )
+        moved += len(rows)
+
+
+def main() -> None:
+    from monitor import utils
+
+    with utils.conn_db() as conn:
+        moved = compact(conn)
+        print(f"Moved {moved} payloads")
+        for station_id, code in conn.fetch_many(
+            tuple[int, str], "SELECT station_id, station_code FROM station"
+        ):
+            # retrain on the recent payloads, new payloads will use it
+            if train_station(station_id, conn):
+                print(f"Trained dictionary for {code}")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
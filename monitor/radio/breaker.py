@@ -0,0 +1,77 @@
+"""Circuit breakers of the stations, persisted between acquisition cycles.
+
+After FAILURES consecutive failures the breaker opens and the station is not
+polled until the cooldown is over; then one poll is let through (half-open):
+a success closes the breaker, a failure opens it again for twice as long.
+"""
+
+from dataclasses import dataclass
+from types import ModuleType
+from typing import TYPE_CHECKING
+
+from onlymaps import Bulk
+
+if TYPE_CHECKING:
+    from onlymaps import Database
+
+FAILURES = 3  # consecutive failures to open the breaker
+COOLDOWN = 300  # seconds, first time open
+MAX_COOLDOWN = 3600  # seconds
+
+
+def station_name(module: ModuleType) -> str:
+    return module.__name__.rsplit(".", 1)[-1]
+
+
+@dataclass
+class Breaker:
+    station: str
+    failures: int = 0
+    open_until: float | None = None  # unix time
+    last_error: str | None = None
+
+    def state(self, now: float) -> str:
+        if self.open_until is None:
+            return "closed"
+        return "open" if now < self.open_until else "half-open"
+
+    def allow(self, now: float) -> bool:
+        """True if the station can be polled"""
+        return self.state(now) != "open"
+
+    def record(self, error: str | None, now: float) -> None:
+        """Record the outcome of a poll"""
+        if error is None:
+            self.failures, self.open_until, self.last_error = 0, None, None
+            return
+        self.failures += 1
+        self.last_error = error
+        if self.failures >= FAILURES:
+            cooldown = COOLDOWN * 2 ** (self.failures - FAILURES)
+            self.open_until = now + min(cooldown, MAX_COOLDOWN)
+
+
+def load(names: list[str], conn: "Database") -> dict[str, Breaker]:
+    breakers = {name: Breaker(name) for name in names}
+    for station, failures, open_until, last_error in conn.fetch_many(
+        tuple[str, int, float | None, str | None],
+        "SELECT station, failures, open_until, last_error FROM station_breaker",
+    ):
+        if station in breakers:
+            breakers[station] = Breaker(station, failures, open_until, last_error)
+    return breakers
+
+
+def save(breakers: list[Breaker], conn: "Database") -> None:
+    if not breakers:
+        return
+    conn.exec(
+        """INSERT INTO station_breaker (station, failures, open_until, last_error)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (station) DO UPDATE SET
+            failures = excluded.failures,
+            open_until = excluded.open_until,
+            last_error = excluded.last_error,
+            updated_at = strftime('%Y-%m-%dT%H:%M:%fZ','now')""",
+        Bulk([(b.station, b.failures, b.open_until, b.last_error) for b in breakers]),
+    )
@@ -1,11 +1,18 @@
 from monitor import utils
 from monitor.radio import m2o
 
+parse_payload = m2o.parse_payload
+
+URL = "https://www.capital.it/api/pub/v2/all/gdwc-audio-player/onair?format=json"
+
+
+async def fetch() -> None | utils.RadioPlay:
+    author, title, payload = await m2o.aparse(URL)
+    return utils.RadioPlay("cap", author, title, None, payload)
+
 
 def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    author, title, payload = m2o.parse(
-        "https://www.capital.it/api/pub/v2/all/gdwc-audio-player/onair?format=json"
-    )
+    author, title, payload = m2o.parse(URL)
     return utils.insert_into_radio("cap", author, title, acquisition_id, None, payload)
 
 
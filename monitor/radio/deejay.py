@@ -1,20 +1,36 @@
+import json
 from datetime import datetime
 
-import httpx
+from monitor import clients, utils
 
-from monitor import utils
+URL = "https://www.deejay.it/api/broadcast_airplay/?get=now"
 
 
-def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    r = httpx.get("https://www.deejay.it/api/broadcast_airplay/?get=now")
-    r.raise_for_status()
-    d = r.json()["result"]
+def parse(txt: str) -> utils.RadioPlay:
+    d = json.loads(txt)["result"]
     timestamp = None
     try:
         timestamp = datetime.fromisoformat(d["datePlay"])
     except BaseException:
         pass
-    return utils.insert_into_radio("dj", d["artist"], d["title"], acquisition_id, timestamp, r.text)
+    return utils.RadioPlay("dj", d["artist"], d["title"], timestamp, txt)
+
+
+def parse_payload(txt: str) -> None | tuple[str, str, datetime | None]:
+    play = parse(txt)
+    return play.performer, play.title, play.timestamp
+
+
+async def fetch() -> None | utils.RadioPlay:
+    r = await clients.aget(URL)
+    r.raise_for_status()
+    return parse(r.text)
+
+
+def main(acquisition_id: str) -> None | tuple[str, str, str]:
+    r = clients.get(URL)
+    r.raise_for_status()
+    return utils.insert_play(parse(r.text), acquisition_id)
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -1,22 +1,147 @@
+import asyncio
+import importlib
+import sys
+import time
+from collections.abc import Iterable, Sequence
+from types import ModuleType
+from typing import NamedTuple
+
 import httpx
 
-from monitor import utils
-from monitor.radio import capital, deejay, freccia, m2o, r101, r105, rds, rtl, virgin
+from monitor import clients, utils
+from monitor.radio import breaker
+
+# station modules in monitor.radio, imported only when used
+STATIONS = ("capital", "deejay", "freccia", "m2o", "r101", "r105", "rds", "rtl", "virgin")
+CYCLE_BUDGET = 40  # seconds for a whole acquisition cycle
+STATION_DEADLINE = 15  # seconds for a station, unless the module sets DEADLINE
+
 
+def stations(names: Iterable[str] = STATIONS) -> list[ModuleType]:
+    """Import the station modules"""
+    modules = []
+    for name in names:
+        if name not in STATIONS:
+            raise utils.RMError(f"Unknown station {name}, choose from {', '.join(STATIONS)}")
+        modules.append(importlib.import_module(f"monitor.radio.{name}"))
+    return modules
 
-def main() -> None:
-    modules = [capital, deejay, freccia, m2o, r101, r105, rds, rtl, virgin]
+
+def main(names: Iterable[str] = STATIONS) -> None:
     acquisition_id = utils.generate_batch("do")
+    modules = stations(names)
+    start = time.monotonic()
+    with utils.conn_db() as conn:
+        breakers = breaker.load([breaker.station_name(m) for m in modules], conn)
+        polled = []
+        for module in modules:
+            b = breakers[breaker.station_name(module)]
+            if not b.allow(time.time()):
+                continue
+            if time.monotonic() - start > CYCLE_BUDGET:
+                print(f"Cycle budget spent, radio {module.__name__} skipped")
+                continue
+            error = None
+            try:
+                module.main(acquisition_id)
+            except httpx.ReadTimeout:
+                print(f"Radio {module.__name__} in timeout")
+                error = "timeout"
+            except BaseException as e:
+                import traceback
+
+                traceback.print_exc()
+                error = repr(e)
+            b.record(error, time.time())
+            polled.append(b)
+        breaker.save(polled, conn)
+
+
+class Outcome(NamedTuple):
+    module: ModuleType
+    play: None | utils.RadioPlay
+    error: None | str
+
+
+def deadline(module: ModuleType, budget: float = CYCLE_BUDGET) -> float:
+    """Seconds a station can take, within the budget of the cycle"""
+    return min(getattr(module, "DEADLINE", STATION_DEADLINE), budget)
+
+
+async def fetch_outcome(module: ModuleType, seconds: float) -> Outcome:
+    """Fetch one station within the deadline, a failure is reported and returned"""
+    try:
+        async with asyncio.timeout(seconds):
+            return Outcome(module, await module.fetch(), None)
+    except (TimeoutError, httpx.TimeoutException):
+        print(f"Radio {module.__name__} in timeout")
+        return Outcome(module, None, "timeout")
+    except Exception as e:
+        import traceback
+
+        traceback.print_exc()
+        return Outcome(module, None, repr(e))
+
+
+async def fetch_station(module: ModuleType) -> None | utils.RadioPlay:
+    """Fetch one station, a failing station is reported and skipped"""
+    return (await fetch_outcome(module, deadline(module))).play
+
+
+async def fetch_outcomes(
+    modules: Sequence[ModuleType], budget: float = CYCLE_BUDGET
+) -> list[Outcome]:
+    """Fetch the stations concurrently on the shared clients, each within its deadline,
+    inside async_pools"""
+    return await asyncio.gather(
+        *(fetch_outcome(module, deadline(module, budget)) for module in modules)
+    )
+
+
+async def fetch_all(modules: Sequence[ModuleType] | None = None) -> list[utils.RadioPlay]:
+    """Fetch every station concurrently on the shared clients"""
+    if modules is None:
+        modules = stations()
+    async with clients.async_pools():
+        return [outcome.play for outcome in await fetch_outcomes(modules) if outcome.play]
+
+
+async def cycle(
+    modules: Sequence[ModuleType], breakers: dict[str, breaker.Breaker]
+) -> tuple[list[utils.RadioPlay], list[breaker.Breaker]]:
+    """Fetch the stations with a closed (or half-open) breaker and record the outcomes,
+    inside async_pools. Return the plays and the breakers of the polled stations"""
+    now = time.time()
+    polled = [m for m in modules if breakers[breaker.station_name(m)].allow(now)]
     for module in modules:
-        try:
-            module.main(acquisition_id)
-        except httpx.ReadTimeout:
-            print(f"Radio {module.__name__} in timeout")
-        except BaseException:
-            import traceback
+        if module not in polled:
+            print(f"Radio {module.__name__} skipped, circuit open")
+    outcomes = await fetch_outcomes(polled)
+    now = time.time()
+    for outcome in outcomes:
+        breakers[breaker.station_name(outcome.module)].record(outcome.error, now)
+    plays = [outcome.play for outcome in outcomes if outcome.play]
+    return plays, [breakers[breaker.station_name(m)] for m in polled]
+
+
+def main_async(modules: Sequence[ModuleType] | None = None) -> None:
+    """One acquisition cycle, the stations with an open breaker are skipped"""
+    if modules is None:
+        modules = stations()
+    acquisition_id = utils.generate_batch("do")
+
+    async def pooled_cycle(
+        breakers: dict[str, breaker.Breaker],
+    ) -> tuple[list[utils.RadioPlay], list[breaker.Breaker]]:
+        async with clients.async_pools():
+            return await cycle(modules, breakers)
 
-            traceback.print_exc()
+    with utils.conn_db() as conn:
+        breakers = breaker.load([breaker.station_name(m) for m in modules], conn)
+        plays, polled = asyncio.run(pooled_cycle(breakers))
+        utils.insert_plays(plays, acquisition_id, conn)
+        breaker.save(polled, conn)
 
 
 if __name__ == "__main__":  # pragma: no cover
-    main()
+    main(sys.argv[1:] or STATIONS)
@@ -1,11 +1,19 @@
 from monitor import utils
 from monitor.radio import rtl
 
+URL = "https://cloud.rtl.it/api-play.rtl.it/media/1.0/live/17/radiofreccia-radiovisione/-1/0/"
+DEADLINE = rtl.DEADLINE
+
+
+async def fetch() -> None | utils.RadioPlay:
+    r = await rtl.aparse(URL)
+    if r:
+        return utils.RadioPlay("fre", r[0], r[1])
+    return None
+
 
 def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    r = rtl.parse(
-        "https://cloud.rtl.it/api-play.rtl.it/media/1.0/live/17/radiofreccia-radiovisione/-1/0/"
-    )
+    r = rtl.parse(URL)
     if r:
         return utils.insert_into_radio("fre", r[0], r[1], acquisition_id)
     return None
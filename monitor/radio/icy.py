@@ -0,0 +1,112 @@
+"""ICY (Shoutcast/Icecast) in-stream metadata.
+
+With the `Icy-MetaData: 1` request header the server interleaves a metadata
+block every `icy-metaint` bytes of audio: one length byte (times 16) followed
+by `StreamTitle='...';` padded with NUL. The audio is discarded.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Callable
+
+from monitor import clients, utils
+
+RECONNECT_MIN = 5  # seconds
+RECONNECT_MAX = 300  # seconds
+
+
+class _Reader:
+    """Exact size reads over the raw chunks of a response"""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self.chunks = chunks
+        self.buffer = b""
+
+    async def _fill(self) -> None:
+        chunk = await anext(self.chunks, None)
+        if chunk is None:
+            raise EOFError("Stream closed")
+        self.buffer += chunk
+
+    async def skip(self, size: int) -> None:
+        while len(self.buffer) < size:
+            size -= len(self.buffer)
+            self.buffer = b""
+            await self._fill()
+        self.buffer = self.buffer[size:]
+
+    async def read(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            await self._fill()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def decode_metadata(block: bytes) -> str:
+    """Text of a metadata block, UTF-8 or else Latin-1"""
+    raw = block.rstrip(b"\x00")
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def parse_metadata(block: bytes) -> dict[str, str]:
+    """Fields of a metadata block, like StreamTitle='Artist - Title';StreamUrl='';"""
+    fields = {}
+    for part in decode_metadata(block).split("';"):
+        key, sep, value = part.partition("='")
+        if sep:
+            fields[key.strip()] = value
+    return fields
+
+
+def split_title(stream_title: str) -> tuple[str, str]:
+    """Performer and title of a StreamTitle"""
+    performer, sep, title = stream_title.partition(" - ")
+    if not sep:
+        return "", stream_title.strip()
+    return performer.strip(), title.strip()
+
+
+async def read_titles(url: str) -> AsyncIterator[tuple[str, str]]:
+    """Yield the StreamTitle and the metadata block, on every change, until the stream ends"""
+    client = clients.async_client(url)
+    async with client.stream("GET", url, headers={"Icy-MetaData": "1"}) as r:
+        r.raise_for_status()
+        metaint = int(r.headers.get("icy-metaint", 0))
+        if not metaint:
+            raise ValueError(f"No ICY metadata from {url}")
+        reader = _Reader(r.aiter_raw())
+        current = None
+        while True:
+            try:
+                await reader.skip(metaint)
+                length = (await reader.read(1))[0] * 16
+                if not length:
+                    # no change since the last block
+                    continue
+                block = await reader.read(length)
+            except EOFError:
+                return
+            metadata = decode_metadata(block)
+            title = parse_metadata(block).get("StreamTitle", "")
+            if title != current:
+                current = title
+                yield title, metadata
+
+
+async def listen(url: str, radio: str, on_play: Callable[[utils.RadioPlay], None]) -> None:
+    """Keep a connection to the stream open, reconnecting when it drops,
+    and push a play on every title change"""
+    delay = RECONNECT_MIN
+    while True:
+        try:
+            async for stream_title, metadata in read_titles(url):
+                delay = RECONNECT_MIN
+                performer, title = split_title(stream_title)
+                on_play(utils.RadioPlay(radio, performer, title, None, metadata))
+        except Exception as e:
+            # any failure, of the stream or of on_play, must not stop the station
+            print(f"ICY {url}: {e!r}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX)
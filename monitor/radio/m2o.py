@@ -1,16 +1,35 @@
-import httpx
+import json
+from datetime import datetime
 
-from monitor import utils
+from monitor import clients, utils
+
+URL = "https://www.m2o.it/api/pub/v2/all/gdwc-audio-player/onair?format=json"
 
 
 def parse(url: str) -> tuple[str, str, str]:
-    r = httpx.get(url)
+    r = clients.get(url)
     r.raise_for_status()
-    d = r.json()
-    title, author = split_song(d["title"])
+    author, title = parse_onair(r.text)
     return author, title, r.text
 
 
+async def aparse(url: str) -> tuple[str, str, str]:
+    r = await clients.aget(url)
+    r.raise_for_status()
+    author, title = parse_onair(r.text)
+    return author, title, r.text
+
+
+def parse_onair(txt: str) -> tuple[str, str]:
+    d = json.loads(txt)
+    title, author = split_song(d["title"])
+    return author, title
+
+
+def parse_payload(txt: str) -> None | tuple[str, str, datetime | None]:
+    return *parse_onair(txt), None
+
+
 def split_song(txt: str):
     for i in range(len(txt)):
         if not txt[i].isspace():
@@ -22,10 +41,13 @@ def split_song(txt: str):
     raise ValueError(f"Not split: {txt}")
 
 
+async def fetch() -> None | utils.RadioPlay:
+    author, title, payload = await aparse(URL)
+    return utils.RadioPlay("m2o", author, title, None, payload)
+
+
 def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    author, title, payload = parse(
-        "https://www.m2o.it/api/pub/v2/all/gdwc-audio-player/onair?format=json"
-    )
+    author, title, payload = parse(URL)
     return utils.insert_into_radio("m2o", author, title, acquisition_id, None, payload)
 
 
@@ -1,12 +1,26 @@
+from collections.abc import Callable
+
 from monitor import utils
-from monitor.radio import virgin
+from monitor.radio import icy, virgin
+
+URL = "https://www.105.net/wp-json/mediaset-mediaplayer/v1/getStreamInfo"
+STREAM = "https://icy.unitedradio.it/Radio105.aac"
+
+parse_payload = virgin.parse_payload
+
+
+async def fetch() -> None | utils.RadioPlay:
+    performer, title, payload = await virgin.aparse(URL, STREAM)
+    return utils.RadioPlay("105", performer, title, None, payload)
+
+
+async def listen(on_play: Callable[[utils.RadioPlay], None], stream: str = STREAM) -> None:
+    """Push the title changes of the ICY stream, instead of polling"""
+    await icy.listen(stream, "105", on_play)
 
 
 def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    performer, title, payload = virgin.parse(
-        "https://www.105.net/wp-json/mediaset-mediaplayer/v1/getStreamInfo",
-        "https://icy.unitedradio.it/Radio105.aac",
-    )
+    performer, title, payload = virgin.parse(URL, STREAM)
     return utils.insert_into_radio("105", performer, title, acquisition_id, None, payload)
 
 
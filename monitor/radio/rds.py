@@ -1,24 +1,41 @@
+import json
 from datetime import datetime
 
-import httpx
+from monitor import clients, utils
 
-from monitor import utils
+URL = "https://cdnapi.rds.it/v2/site/get_player_info"
 
 
-def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    r = httpx.get("https://cdnapi.rds.it/v2/site/get_player_info")
-    r.raise_for_status()
-    d = r.json()["song_status"]["current_song"]
+def parse(txt: str) -> None | utils.RadioPlay:
+    d = json.loads(txt)["song_status"]["current_song"]
     if d["artist"] == "RDS":
-        return ("RDS", "RDS", "None")
+        return None
     timestamp = None
     try:
         timestamp = datetime.fromisoformat(d["mid"].split("#")[2])
     except BaseException:
         pass
-    return utils.insert_into_radio(
-        "rds", d["artist"], d["title"], acquisition_id, timestamp, r.text
-    )
+    return utils.RadioPlay("rds", d["artist"], d["title"], timestamp, txt)
+
+
+def parse_payload(txt: str) -> None | tuple[str, str, datetime | None]:
+    play = parse(txt)
+    return (play.performer, play.title, play.timestamp) if play else None
+
+
+async def fetch() -> None | utils.RadioPlay:
+    r = await clients.aget(URL)
+    r.raise_for_status()
+    return parse(r.text)
+
+
+def main(acquisition_id: str) -> None | tuple[str, str, str]:
+    r = clients.get(URL)
+    r.raise_for_status()
+    play = parse(r.text)
+    if not play:
+        return ("RDS", "RDS", "None")
+    return utils.insert_play(play, acquisition_id)
 
 
 if __name__ == "__main__":  # pragma: no cover
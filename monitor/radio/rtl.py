@@ -1,17 +1,20 @@
+import asyncio
 import json
+import shutil
 import subprocess
+from datetime import datetime
+from urllib.parse import urljoin
 
-import httpx
+from monitor import clients, utils
 
-from monitor import utils
+URL = "https://cloud.rtl.it/api-play.rtl.it/media/1.0/live/1/radiovisione/-1/0/"
 
+ID3_HEADER = 10  # bytes
+DEADLINE = 25  # seconds, ffprobe may be needed
 
-def parse(url: str) -> None | tuple[str, str, str]:
-    r = httpx.get(url)
-    r.raise_for_status()
-    playlist_url = r.json()["data"]["mediaInfo"]["uri"]
 
-    ffprobe = [
+def _ffprobe(playlist_url: str) -> list[str]:
+    return [
         "ffprobe",
         "-v",
         "debug",
@@ -21,9 +24,159 @@ def parse(url: str) -> None | tuple[str, str, str]:
         playlist_url,
     ]
 
-    result = subprocess.run(ffprobe, capture_output=True, text=True, check=True)
 
-    txt = result.stdout
+def next_uri(playlist: str, playlist_url: str) -> tuple[str, bool]:
+    """The newest segment of a media playlist, or the first variant of a master one.
+    Return the absolute url and True if it is another playlist"""
+    lines = [line.strip() for line in playlist.splitlines()]
+    uris = [line for line in lines if line and not line.startswith("#")]
+    if not uris:
+        raise utils.RMError(f"Empty playlist {playlist_url}")
+    if any(line.startswith("#EXT-X-STREAM-INF") for line in lines):
+        return urljoin(playlist_url, uris[0]), True
+    return urljoin(playlist_url, uris[-1]), False
+
+
+def id3_size(head: bytes) -> int:
+    """Total length of the ID3v2 tag at the start of head, 0 if there is none"""
+    if len(head) < ID3_HEADER or not head.startswith(b"ID3"):
+        return 0
+    size = _syncsafe(head[6:10])
+    footer = 10 if head[5] & 0x10 else 0
+    return ID3_HEADER + size + footer
+
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_text(data: bytes) -> str:
+    encoding, text = data[0], data[1:]
+    if encoding == 0:
+        value = text.decode("latin-1")
+    elif encoding == 1:
+        value = text.decode("utf-16")
+    elif encoding == 2:
+        value = text.decode("utf-16-be")
+    else:
+        value = text.decode("utf-8")
+    return value.rstrip("\x00")
+
+
+def parse_id3(data: bytes) -> dict[str, str]:
+    """Text frames of an ID3v2.3/2.4 tag, as ffprobe reports them"""
+    size = id3_size(data)
+    if not size or len(data) < size:
+        return {}
+    version, flags = data[3], data[5]
+    body = data[ID3_HEADER:size]
+    if flags & 0x80 and version == 3:
+        # unsynchronisation of the whole tag, only v2.3
+        body = body.replace(b"\xff\x00", b"\xff")
+    pos = 0
+    if flags & 0x40:
+        # skip the extended header
+        pos = _syncsafe(body[0:4]) if version == 4 else 4 + int.from_bytes(body[0:4])
+    tags = {}
+    while pos + ID3_HEADER <= len(body) and body[pos] != 0:
+        frame_id = body[pos : pos + 4].decode("latin-1")
+        raw_size = body[pos + 4 : pos + 8]
+        frame_size = _syncsafe(raw_size) if version == 4 else int.from_bytes(raw_size)
+        frame = body[pos + ID3_HEADER : pos + ID3_HEADER + frame_size]
+        pos += ID3_HEADER + frame_size
+        if frame_id.startswith("T") and frame_id != "TXXX" and frame:
+            tags[frame_id] = _decode_text(frame)
+    return tags
+
+
+def _payload(tags: dict[str, str]) -> None | str:
+    """The ffprobe JSON for the tags, None without the TEXT frame"""
+    if "TEXT" not in tags:
+        return None
+    return json.dumps({"streams": [{"tags": tags}]})
+
+
+def read_id3(playlist_url: str) -> None | str:
+    """Read the ID3 tag of the newest segment, without downloading all of it"""
+    url, is_playlist = playlist_url, True
+    while is_playlist:
+        r = clients.get(url)
+        r.raise_for_status()
+        url, is_playlist = next_uri(r.text, url)
+    head = b""
+    with clients.client(url).stream("GET", url) as r:
+        r.raise_for_status()
+        for chunk in r.iter_bytes():
+            head += chunk
+            if len(head) >= ID3_HEADER and len(head) >= id3_size(head):
+                break
+    return _payload(parse_id3(head))
+
+
+async def aread_id3(playlist_url: str) -> None | str:
+    url, is_playlist = playlist_url, True
+    while is_playlist:
+        r = await clients.aget(url)
+        r.raise_for_status()
+        url, is_playlist = next_uri(r.text, url)
+    head = b""
+    async with clients.async_client(url).stream("GET", url) as r:
+        r.raise_for_status()
+        async for chunk in r.aiter_bytes():
+            head += chunk
+            if len(head) >= ID3_HEADER and len(head) >= id3_size(head):
+                break
+    return _payload(parse_id3(head))
+
+
+def _no_metadata(playlist_url: str) -> utils.RMError:
+    return utils.RMError(f"No ID3 TEXT frame in {playlist_url} and ffprobe not available")
+
+
+def parse(url: str) -> None | tuple[str, str, str]:
+    r = clients.get(url)
+    r.raise_for_status()
+    playlist_url = r.json()["data"]["mediaInfo"]["uri"]
+
+    payload = read_id3(playlist_url)
+    if payload is None:
+        # not packed audio, let ffprobe demux the stream
+        if not shutil.which("ffprobe"):
+            raise _no_metadata(playlist_url)
+        result = subprocess.run(
+            _ffprobe(playlist_url), capture_output=True, text=True, check=True, timeout=DEADLINE
+        )
+        payload = result.stdout
+    return parse_probe(payload)
+
+
+async def aparse(url: str) -> None | tuple[str, str, str]:
+    r = await clients.aget(url)
+    r.raise_for_status()
+    playlist_url = r.json()["data"]["mediaInfo"]["uri"]
+
+    payload = await aread_id3(playlist_url)
+    if payload is None:
+        if not shutil.which("ffprobe"):
+            raise _no_metadata(playlist_url)
+        cmd = _ffprobe(playlist_url)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            # deadline of the station, do not leave a zombie
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+        payload = stdout.decode()
+    return parse_probe(payload)
+
+
+def parse_probe(txt: str) -> None | tuple[str, str, str]:
     metadata = json.loads(txt)
 
     songinfo = json.loads(metadata["streams"][0]["tags"]["TEXT"])["songInfo"]
@@ -36,8 +189,21 @@ def parse(url: str) -> None | tuple[str, str, str]:
     return present["mus_art_name"], present["mus_sng_title"], txt
 
 
+def parse_payload(txt: str) -> None | tuple[str, str, datetime | None]:
+    r = parse_probe(txt)
+    return (r[0], r[1], None) if r else None
+
+
+async def fetch() -> None | utils.RadioPlay:
+    r = await aparse(URL)
+    if r:
+        performer, title, payload = r
+        return utils.RadioPlay("rtl", performer, title, None, payload)
+    return None
+
+
 def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    r = parse("https://cloud.rtl.it/api-play.rtl.it/media/1.0/live/1/radiovisione/-1/0/")
+    r = parse(URL)
     if r:
         performer, title, payload = r
         return utils.insert_into_radio("rtl", performer, title, acquisition_id, None, payload)
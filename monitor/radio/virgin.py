@@ -1,26 +1,58 @@
-import httpx
+import json
+from collections.abc import Callable
+from datetime import datetime
 
-from monitor import utils
+from monitor import clients, utils
+from monitor.radio import icy
+
+URL = "https://www.virginradio.it/wp-json/mediaset-mediaplayer/v1/getStreamInfo"
+STREAM = "https://icy.unitedradio.it/Virgin.mp3"
 
 
 def parse(url: str, stream: str) -> tuple[str, str, str]:
-    r = httpx.get(url, params={"stream": stream})
+    r = clients.get(url, params={"stream": stream})
+    r.raise_for_status()
+    return parse_info(r.text)
+
+
+async def aparse(url: str, stream: str) -> tuple[str, str, str]:
+    r = await clients.aget(url, params={"stream": stream})
     r.raise_for_status()
-    d = r.json()
+    return parse_info(r.text)
+
+
+def parse_info(txt: str) -> tuple[str, str, str]:
+    d = json.loads(txt)
     if "success" not in d or not d["success"]:
         return "", "", ""
     try:
-        return d["title"], d["artist"], r.text
+        return d["title"], d["artist"], txt
     except KeyError:
         print(d)
         return "", "", ""
 
 
+def parse_payload(txt: str) -> None | tuple[str, str, datetime | None]:
+    """From the API response or from the ICY metadata"""
+    if txt.startswith("StreamTitle="):
+        performer, title = icy.split_title(icy.parse_metadata(txt.encode()).get("StreamTitle", ""))
+        return performer, title, None
+    performer, title, _ = parse_info(txt)
+    return performer, title, None
+
+
+async def fetch() -> None | utils.RadioPlay:
+    performer, title, payload = await aparse(URL, STREAM)
+    return utils.RadioPlay("vir", performer, title, None, payload)
+
+
+async def listen(on_play: Callable[[utils.RadioPlay], None], stream: str = STREAM) -> None:
+    """Push the title changes of the ICY stream, instead of polling"""
+    await icy.listen(stream, "vir", on_play)
+
+
 def main(acquisition_id: str) -> None | tuple[str, str, str]:
-    performer, title, payload = parse(
-        "https://www.virginradio.it/wp-json/mediaset-mediaplayer/v1/getStreamInfo",
-        "https://icy.unitedradio.it/Virgin.mp3",
-    )
+    performer, title, payload = parse(URL, STREAM)
     return utils.insert_into_radio("vir", performer, title, acquisition_id, None, payload)
 
 
@@ -1,14 +1,32 @@
+import multiprocessing as mp
+import os
+import secrets
+import sys
+import time
 import unicodedata
-from time import sleep
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from typing import TYPE_CHECKING, NamedTuple
 
-from monitor import utils
+from onlymaps import Bulk
+
+from monitor import lookup_cache, spotify, utils
 from monitor.spotify import SpSong, get_token, spotify_find
-from monitor.utils import calc_score
+from monitor.utils import calc_score_many
 
 if TYPE_CHECKING:
     from onlymaps import Database
 
+SPOTIFY_WORKERS = 4  # searches in flight, the rate is up to spotify.limiter
+MISS_BACKOFF = 3600  # seconds, a play not found is skipped this long, doubled at every miss
+MISS_MAX_BACKOFF = 30 * 24 * 3600  # seconds
+LEASE = 15 * 60  # seconds, a play claimed and not released is claimed again after it
+SEARCH_RETRY = 600  # seconds, a play whose search failed is claimed again after it
+MAX_ATTEMPTS = 5  # claims of a play without a result, then it is left in match_queue
+CHUNK = 50  # plays per chunk of drain
+MAX_QUERIES = 2  # Spotify searches of a play, see spotify.queries
+
 
 class Song(NamedTuple):
     title: str
@@ -81,12 +99,75 @@ def build_match_expr(title: str, performer: str) -> str:
     return " AND ".join(parts)
 
 
+class _AliasIndex:
+    """The song_id of every song_alias by exact_key, kept in memory by the process:
+    the exact matches of db_find skip the FTS search"""
+
+    def __init__(self) -> None:
+        # database file, last song_alias_id loaded and its row
+        self.key: tuple[str, int, str | None] = ("", 0, None)
+        self.songs = dict[tuple[str, str], list[int]]()
+        self.conn: weakref.ref[Database] | None = None  # connection of the last sync
+
+    def sync(self, conn: "Database") -> None:
+        """Load the aliases added since the last sync, by this process or by others"""
+        file, last_id, last_row = self.key
+        db_file, max_id, row = conn.fetch_one(
+            tuple[str, int, str | None],
+            """SELECT
+                (SELECT file FROM pragma_database_list WHERE name = 'main'),
+                COALESCE((SELECT MAX(song_alias_id) FROM song_alias), 0),
+                (SELECT song_id || '|' || title || '|' || performers
+                FROM song_alias WHERE song_alias_id = ?)""",
+            last_id,
+        )
+        self.conn = weakref.ref(conn)
+        if (db_file, row) != (file, last_row) or max_id < last_id:
+            # another database, or aliases deleted: start over
+            self.key = (db_file, 0, None)
+            self.songs.clear()
+        if max_id == self.key[1]:
+            return
+        for song_alias_id, song_id, title, performers in conn.fetch_many(
+            tuple[int, int, str, str],
+            """SELECT song_alias_id, song_id, title, performers
+            FROM song_alias
+            WHERE song_alias_id > ?
+            ORDER BY song_alias_id""",
+            self.key[1],
+        ):
+            self.key = (db_file, song_alias_id, f"{song_id}|{title}|{performers}")
+            if key := utils.exact_key(title, performers):
+                songs = self.songs.setdefault(key, [])
+                if song_id not in songs:
+                    songs.append(song_id)
+
+    def find(self, title: str, performer: str, conn: "Database") -> list[int]:
+        if self.conn is None or self.conn() is not conn:
+            self.sync(conn)
+        if key := utils.exact_key(title, performer):
+            return self.songs.get(key, [])
+        return []
+
+
+_aliases = _AliasIndex()
+
+
+def sync_aliases(conn: "Database") -> None:
+    """Update the index of the aliases: once per batch, and after adding songs or aliases"""
+    _aliases.sync(conn)
+
+
 def db_find(title: str, performer: str, conn: "Database") -> list[tuple[int, float]]:
     """
     Search FTS5 by title and/or performer.
     Returns canonical display fields with bm25 score:
       (song_id, song_title, song_performers, score)
+    Exact matches of an alias are found in memory, with score 1.
     """
+    if song_ids := _aliases.find(title, performer, conn):
+        return [(song_id, 1.0) for song_id in song_ids[:5]]
+
     match_expr = build_match_expr(title, performer)
 
     sql = """
@@ -105,120 +186,310 @@ def db_find(title: str, performer: str, conn: "Database") -> list[tuple[int, flo
     LIMIT 10
     """
 
-    rows = [
-        (
-            row[0],
-            1.0
-            if calc_score(title, performer, row[3], row[4]) == 1.0  # perfect alias match
-            else calc_score(title, performer, row[1], row[2]),
+    hits = conn.fetch_many(tuple[int, str, str, str, str, float], sql, match_expr)
+    alias_scores = calc_score_many((title, performer), [(row[3], row[4]) for row in hits])
+    # the canonical title, unless a perfect alias match
+    canonical_scores = iter(
+        calc_score_many(
+            (title, performer),
+            [
+                (row[1], row[2])
+                for row, score in zip(hits, alias_scores, strict=True)
+                if score != 1.0
+            ],
         )
-        for row in conn.fetch_many(tuple[int, str, str, str, str, float], sql, match_expr)
+    )
+    rows = [
+        (row[0], 1.0 if score == 1.0 else next(canonical_scores))
+        for row, score in zip(hits, alias_scores, strict=True)
     ]
     return sorted(rows, key=lambda r: r[1], reverse=True)[:5]
 
 
-def find_play_todo(conn: "Database", limit=20) -> list[tuple[int, str, str]]:
-    return conn.fetch_many(
-        tuple[int, str, str],
-        """
-SELECT p.play_id, p.title_raw, p.performer_raw
+def claim_plays(
+    claim: str, conn: "Database", limit=20, lease: int = LEASE
+) -> list[tuple[int, str, str]]:
+    """Claim the due plays of match_queue for lease seconds, other matchers skip them.
+    The resolved plays leave the queue, the ones of a missed (title, performer) wait for it"""
+    while True:
+        now = int(time.time())
+        play_ids = conn.fetch_many(
+            int,
+            """
+UPDATE match_queue SET claim = ?1, due_at = ?2 + ?3, attempts = attempts + 1
+WHERE play_id IN (
+    SELECT play_id FROM match_queue
+    WHERE due_at <= ?2 AND attempts < ?4
+    ORDER BY due_at, play_id
+    LIMIT ?5
+)
+RETURNING play_id""",
+            claim,
+            now,
+            lease,
+            MAX_ATTEMPTS,
+            limit,
+        )
+        if not play_ids:
+            return []
+        rows = conn.fetch_many(
+            tuple[int, str, str, int | None, bool],
+            f"""
+SELECT p.play_id, p.title_raw, p.performer_raw, mm.next_at, EXISTS (
+    SELECT 1 FROM play_resolution AS pr
+    WHERE pr.play_id = p.play_id AND pr.status != 'pending'
+)
 FROM play AS p
-LEFT JOIN match_candidate AS mc ON mc.play_id = p.play_id
-WHERE mc.play_id IS NULL
-ORDER BY p.inserted_at ASC
-LIMIT ?""",
-        limit,
+LEFT JOIN match_miss AS mm ON mm.title_raw = p.title_raw AND mm.performer_raw = p.performer_raw
+WHERE p.play_id IN ({", ".join("?" * len(play_ids))})
+ORDER BY p.inserted_epoch ASC, p.play_id ASC""",
+            *play_ids,
+        )
+        todos = [row[:3] for row in rows if not row[4] and (row[3] or 0) <= now]
+        # resolved meanwhile (by a human) or deleted
+        complete_plays(list({*play_ids} - {row[0] for row in rows if not row[4]}), claim, conn)
+        release_plays([row[0] for row in rows if not row[4] and (row[3] or 0) > now], claim, conn)
+        if todos:
+            return todos
+
+
+def complete_plays(play_ids: list[int], claim: str, conn: "Database") -> None:
+    """Remove the matched plays from the queue"""
+    if play_ids:
+        conn.exec(
+            "DELETE FROM match_queue WHERE play_id = ? AND claim = ?",
+            Bulk([(play_id, claim) for play_id in play_ids]),
+        )
+
+
+def release_plays(
+    play_ids: list[int], claim: str, conn: "Database", delay: int | None = None
+) -> None:
+    """Put the plays back in the queue, due after delay seconds if given,
+    else when the lookup of their miss is"""
+    if play_ids:
+        conn.exec(
+            """UPDATE match_queue SET claim = NULL, attempts = 0, due_at = CASE
+                WHEN ?3 IS NOT NULL THEN unixepoch() + ?3
+                ELSE COALESCE(
+                    (SELECT mm.next_at FROM play AS p
+                    JOIN match_miss AS mm
+                        ON mm.title_raw = p.title_raw AND mm.performer_raw = p.performer_raw
+                    WHERE p.play_id = match_queue.play_id),
+                    unixepoch()
+                )
+            END
+            WHERE play_id = ?1 AND claim = ?2""",
+            Bulk([(play_id, claim, delay) for play_id in play_ids]),
+        )
+
+
+def rematch_plays(plays: list[tuple[int, str, str]], conn: "Database") -> None:
+    """Drop the matches of the plays whose raw strings changed, given the old strings,
+    and queue them again. A human signature of the old strings is kept"""
+    if not plays:
+        return
+    play_ids = Bulk([(play_id,) for play_id, _, _ in plays])
+    conn.exec("DELETE FROM match_candidate WHERE play_id = ?", play_ids)
+    conn.exec("DELETE FROM play_resolution WHERE play_id = ?", play_ids)
+    conn.exec(
+        "DELETE FROM match_signature WHERE signature = ? AND status = 'auto'",
+        Bulk([(sig,) for sig in dict.fromkeys(signature(t, p) for _, t, p in plays)]),
+    )
+    # a claimed play is matched again, its claim is lost
+    conn.exec(
+        "INSERT OR REPLACE INTO match_queue (play_id, due_at) VALUES (?, unixepoch())", play_ids
     )
 
 
+def signature(title: str, performer: str) -> str:
+    """Key of the raw strings of a play, case and spaces do not count"""
+    return " ".join(title.split()).casefold() + "|" + " ".join(performer.split()).casefold()
+
+
+def find_signatures(
+    todos: list[tuple[int, str, str]], conn: "Database"
+) -> dict[int, CandidateByID]:
+    """Candidates of the plays with the raw strings of a play already resolved"""
+    signatures = {play_id: signature(title, performer) for play_id, title, performer in todos}
+    unique = list(set(signatures.values()))
+    if not unique:
+        return {}
+    known = {
+        key: CandidateByID(song_id, score, "signature")
+        for key, song_id, score in conn.fetch_many(
+            tuple[str, int, float],
+            "SELECT signature, song_id, score FROM match_signature"
+            f" WHERE signature IN ({', '.join('?' * len(unique))})",
+            *unique,
+        )
+    }
+    return {play_id: known[key] for play_id, key in signatures.items() if key in known}
+
+
+def remember_signatures(play_ids: list[int] | None, conn: "Database") -> None:
+    """Store the signatures of the resolved plays (all of them with None).
+    A human decision is not replaced by an automatic one"""
+    where = ""
+    if play_ids is not None:
+        if not play_ids:
+            return
+        where = f"AND pr.play_id IN ({', '.join('?' * len(play_ids))})"
+    rows = conn.fetch_many(
+        tuple[str, str, int, float, str],
+        f"""
+SELECT p.title_raw, p.performer_raw, pr.song_id, COALESCE(pr.chosen_score, 0), pr.status
+FROM play_resolution AS pr
+JOIN play AS p ON p.play_id = pr.play_id
+WHERE pr.status != 'pending' {where}
+ORDER BY pr.decided_epoch, pr.play_id""",
+        *(play_ids or []),
+    )
+    if not rows:
+        return
+    conn.exec(
+        """INSERT INTO match_signature (signature, song_id, score, status) VALUES (?, ?, ?, ?)
+        ON CONFLICT (signature) DO UPDATE SET
+            song_id = excluded.song_id,
+            score = excluded.score,
+            status = excluded.status,
+            updated_at = strftime('%Y-%m-%dT%H:%M:%fZ','now')
+        WHERE excluded.status = 'human' OR match_signature.status != 'human'""",
+        Bulk(
+            [
+                (signature(title, performer), song_id, score, status)
+                for title, performer, song_id, score, status in rows
+            ]
+        ),
+    )
+
+
+def record_misses(signatures: list[tuple[str, str]], conn: "Database") -> None:
+    """Skip the (title, performer) in claim_plays, twice as long after every miss"""
+    if not signatures:
+        return
+    now = int(time.time())
+    conn.exec(
+        """INSERT INTO match_miss (title_raw, performer_raw, misses, last_at, next_at)
+        VALUES (?1, ?2, 1, ?3, ?3 + ?4)
+        ON CONFLICT (title_raw, performer_raw) DO UPDATE SET
+            misses = misses + 1,
+            last_at = excluded.last_at,
+            next_at = excluded.last_at + min(?4 << min(misses, 20), ?5)""",
+        Bulk(
+            [
+                (title, performer, now, MISS_BACKOFF, MISS_MAX_BACKOFF)
+                for title, performer in dict.fromkeys(signatures)
+            ]
+        ),
+    )
+
+
+def clear_misses(signatures: list[tuple[str, str]], conn: "Database") -> None:
+    if signatures:
+        conn.exec(
+            "DELETE FROM match_miss WHERE title_raw = ? AND performer_raw = ?",
+            Bulk(list(dict.fromkeys(signatures))),
+        )
+
+
 CAND_TODO = CandidateBySong(Song("TODO", "TODO", (), None, 0, "", 0), 0, "todo")
 CAND_IGNORED = CandidateBySong(Song("TODO", "TODO", (), None, 1, "", 0), 1, "todo")
 
 
+def song_ids(keys: list[str], conn: "Database") -> dict[str, int]:
+    """The song_id of the songs by unique_key, the missing ones are left out"""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    return dict(
+        conn.fetch_many(
+            tuple[str, int],
+            f"SELECT song_key, song_id FROM song WHERE song_key IN ({', '.join('?' * len(keys))})",
+            *keys,
+        )
+    )
+
+
 def save_candidates(candidates: dict[int, CandidateList], conn: "Database"):
+    """Store the new songs with their artists, then the candidates of the plays.
+    Every table is written with one statement"""
+    songs = dict[str, Song]()
+    for cl in candidates.values():
+        for c in cl:
+            if isinstance(c, CandidateBySong) and c != CAND_TODO and c != CAND_IGNORED:
+                # the first one wins, as the conflicts do nothing
+                songs.setdefault(c.song.unique_key(), c.song)
+    artists = list(dict.fromkeys(p for song in songs.values() for p in song.l_performers))
     with conn.transaction():
-        for cl in candidates.values():
-            for c in cl:
-                if c == CAND_TODO or c == CAND_IGNORED:
-                    continue
-                if isinstance(c, CandidateBySong):
-                    # SONG
-                    conn.exec(
-                        """
+        if songs:
+            conn.exec(
+                """
     INSERT INTO song
         (song_title, song_performers, song_key, isrc, year, country, duration) VALUES
         (?,          ?,               ?,        ?,    ?,    ?,       ?     )
         ON CONFLICT DO NOTHING""",
-                        c.song.title,
-                        c.song.s_performers,
-                        c.song.unique_key(),
-                        c.song.isrc,
-                        c.song.year,
-                        c.song.country,
-                        c.song.duration,
-                    )
-        # artist
-        for cl in candidates.values():
-            for c in cl:
-                if c == CAND_TODO or c == CAND_IGNORED:
-                    continue
-                if isinstance(c, CandidateBySong):
-                    for p in c.song.l_performers:
-                        conn.exec(
-                            """
-                        INSERT INTO artist
-                            (artist_name) VALUES
-                            (?)
-                            ON CONFLICT DO NOTHING""",
-                            p,
-                        )
-        # song_artist
-        for cl in candidates.values():
-            for c in cl:
-                if c == CAND_TODO or c == CAND_IGNORED:
-                    continue
-                if isinstance(c, CandidateBySong):
-                    for p in c.song.l_performers:
-                        conn.exec(
-                            """
-                        INSERT INTO song_artist
-                            (song_id, artist_id) VALUES
-                            ((SELECT s.song_id FROM song s WHERE song_key = ?),
-                                    (SELECT artist_id FROM artist WHERE artist_name = ?))
-                            ON CONFLICT DO NOTHING""",
-                            c.song.unique_key(),
-                            p,
-                        )
+                Bulk(
+                    [
+                        (s.title, s.s_performers, key, s.isrc, s.year, s.country, s.duration)
+                        for key, s in songs.items()
+                    ]
+                ),
+            )
+        # the TODO candidates refer to the TODO song too
+        ids = song_ids(
+            [
+                c.song.unique_key()
+                for cl in candidates.values()
+                for c in cl
+                if isinstance(c, CandidateBySong)
+            ],
+            conn,
+        )
+        if artists:
+            conn.exec(
+                "INSERT INTO artist (artist_name) VALUES (?) ON CONFLICT DO NOTHING",
+                Bulk([(p,) for p in artists]),
+            )
+            artist_ids = dict(
+                conn.fetch_many(
+                    tuple[str, int],
+                    "SELECT artist_name, artist_id FROM artist"
+                    f" WHERE artist_name IN ({', '.join('?' * len(artists))})",
+                    *artists,
+                )
+            )
+            conn.exec(
+                "INSERT INTO song_artist (song_id, artist_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                Bulk(
+                    [
+                        (ids.get(key), artist_ids[p])
+                        for key, song in songs.items()
+                        for p in dict.fromkeys(song.l_performers)
+                    ]
+                ),
+            )
         # never delete old match_candidate entries
-        # match_candidate by song title+performers
-        for play_id, cl in candidates.items():
-            for c in cl:
-                if isinstance(c, CandidateBySong):
-                    conn.exec(
-                        """
-                    INSERT INTO match_candidate
-                        (play_id, song_id, candidate_score, method) VALUES
-                        (?,       (SELECT s.song_id FROM song s WHERE song_key = ?),
-                                        ?,               ?     )
-                        ON CONFLICT DO NOTHING""",
-                        play_id,
-                        c.song.unique_key(),
-                        c.score,
-                        c.method,
-                    )
-                    # match_candidate by song id
-                else:
-                    conn.exec(
-                        """
-                    INSERT INTO match_candidate
-                        (play_id, song_id, candidate_score, method) VALUES
-                        (?,       ?,       ?,               ?     )
-                        ON CONFLICT DO NOTHING""",
-                        play_id,
-                        c.song_id,
-                        c.score,
-                        c.method,
-                    )
+        rows = [
+            (
+                play_id,
+                ids.get(c.song.unique_key()) if isinstance(c, CandidateBySong) else c.song_id,
+                c.score,
+                c.method,
+            )
+            for play_id, cl in candidates.items()
+            for c in cl
+        ]
+        if rows:
+            conn.exec(
+                """
+            INSERT INTO match_candidate
+                (play_id, song_id, candidate_score, method) VALUES
+                (?,       ?,       ?,               ?     )
+                ON CONFLICT DO NOTHING""",
+                Bulk(rows),
+            )
+    sync_aliases(conn)
 
 
 def find_best_candidate(
@@ -228,6 +499,9 @@ def find_best_candidate(
     status = "pending"
     if not candidates_list:
         return CAND_TODO, "pending"
+    if candidates_list[0].method == "signature":
+        # same raw strings of a play already resolved
+        return candidates_list[0], reason
     if candidates_list != sorted(candidates_list, key=lambda c: c.score, reverse=True):
         raise ValueError("Candidates list not sorted")
     if not candidates_list:
@@ -260,33 +534,33 @@ def save_resolution(
     candidates: dict[int, CandidateList], conn: "Database", reason="auto"
 ) -> dict[int, bool]:
     resolution_map = dict[int, bool]()
-    for play_id, candidates_list in candidates.items():
-        resolution, status = find_best_candidate(candidates_list, reason)
-        # Save to DB
-        song_id = None
+    resolutions = {
+        play_id: find_best_candidate(candidates_list, reason)
+        for play_id, candidates_list in candidates.items()
+    }
+    # Look up the song_id of the songs
+    ids = song_ids(
+        [r.song.unique_key() for r, _ in resolutions.values() if isinstance(r, CandidateBySong)],
+        conn,
+    )
+    rows = []
+    for play_id, (resolution, status) in resolutions.items():
         if isinstance(resolution, CandidateByID):
             song_id = resolution.song_id
         else:
-            # Look up song_id
-            song_id = conn.fetch_one_or_none(
-                int,
-                """
-            SELECT song_id FROM song
-            WHERE song_key = ?""",
-                resolution.song.unique_key(),
-            )
+            song_id = ids.get(resolution.song.unique_key())
         if not song_id:
             raise ValueError("Song resolved but not found in DB")
+        rows.append((play_id, song_id, resolution.score, status))
+        resolution_map[play_id] = status != "pending"
+    if rows:
         conn.exec(
             """INSERT OR REPLACE INTO play_resolution
             (play_id, song_id, chosen_score, status) VALUES
             (?,       ?,       ?,            ?     )""",
-            play_id,
-            song_id,
-            resolution.score,
-            status,
+            Bulk(rows),
         )
-        resolution_map[play_id] = status != "pending"
+    remember_signatures(list(candidates), conn)
     return resolution_map
 
 
@@ -331,41 +605,164 @@ def unique_candidates(candidates: dict[int, CandidateList]) -> dict[int, Candida
     return new_candidates_list
 
 
-def main() -> None:
+def spotify_lookups(
+    todos: list[tuple[int, str, str]], conn: "Database"
+) -> dict[int, None | list[SpSong]]:
+    """Search the plays on Spotify, concurrently, the cached queries are not sent.
+    None for the plays whose search failed"""
+    if not todos:
+        return {}
+    queries = [
+        query for _, title, performer in todos for query in spotify.queries(title, performer)
+    ]
+    with lookup_cache.cached(spotify.PROVIDER, queries, conn) as lookups:
+        if all(lookups.get(query) is not None for query in queries):
+            token = ""  # all cached, no need for a token
+        else:
+            token = get_token()
+
+        def find(todo: tuple[int, str, str]) -> None | list[SpSong]:
+            try:
+                return spotify_find(todo[1], todo[2], token, lookups)
+            except spotify.SearchError as e:
+                print(e)
+                return None
+
+        with ThreadPoolExecutor(min(SPOTIFY_WORKERS, len(todos))) as pool:
+            results = pool.map(find, todos)
+            return {todo[0]: releases for todo, releases in zip(todos, results, strict=True)}
+
+
+def match_db(
+    todos: list[tuple[int, str, str]], conn: "Database"
+) -> tuple[dict[int, CandidateList], list[tuple[int, str, str]]]:
+    """Candidates of the plays from the database only, and the plays to search on Spotify"""
+    candidates: dict[int, CandidateList] = {}
+    spotify_todos = []
+    # the aliases added by the other matchers
+    sync_aliases(conn)
+    # known raw strings: no search at all
+    signatures = find_signatures(todos, conn)
+    for play_id, title, performer in todos:
+        if not title.strip() or not performer.strip():
+            # empty parts, do not handle
+            candidates[play_id] = [CAND_TODO]
+            continue
+        if play_id in signatures:
+            candidates[play_id] = [signatures[play_id]]
+            continue
+        # DB first
+        song_match = db_find(title, performer, conn)
+        if song_match:
+            candidates[play_id] = [CandidateByID(s[0], s[1], "db") for s in song_match]
+        else:
+            spotify_todos.append((play_id, title, performer))
+    return candidates, spotify_todos
+
+
+def save_matches(
+    todos: list[tuple[int, str, str]],
+    candidates: dict[int, CandidateList],
+    spotify_todos: list[tuple[int, str, str]],
+    claim: str,
+    conn: "Database",
+) -> None:
+    """Search the rest of the plays on Spotify, store all the candidates and resolutions"""
+    failed = set()
+    for play_id, releases in spotify_lookups(spotify_todos, conn).items():
+        if releases is None:
+            # not answered, not a miss: no candidate, no backoff
+            failed.add(play_id)
+        elif releases:
+            candidates[play_id] = [
+                CandidateBySong(Song.from_spotify(ss), ss.score, "spotify") for ss in releases
+            ]
+        else:
+            # Generate one fake candidate
+            candidates[play_id] = [CAND_TODO]
+    todos = [todo for todo in todos if todo[0] not in failed]
+    spotify_todos = [todo for todo in spotify_todos if todo[0] not in failed]
+    # same order as the todos
+    candidates = {play_id: candidates[play_id] for play_id, _, _ in todos}
+    candidates = unique_candidates(candidates)
+    save_candidates(candidates, conn)
+    save_resolution(candidates, conn)
+    # not found on Spotify: look them up again later, less and less often
+    misses = [(t, p) for play_id, t, p in spotify_todos if candidates[play_id] == [CAND_TODO]]
+    record_misses(misses, conn)
+    clear_misses([(t, p) for _, t, p in todos if (t, p) not in misses], conn)
+    missed = {play_id for play_id, t, p in spotify_todos if (t, p) in misses}
+    release_plays(list(missed), claim, conn)
+    release_plays(list(failed), claim, conn, SEARCH_RETRY)
+    complete_plays([play_id for play_id, _, _ in todos if play_id not in missed], claim, conn)
+
+
+# read-only connection of a worker process
+_worker = ExitStack()
+_worker_conn: list["Database"] = []
+
+
+def _init_worker(path: str) -> None:
+    conn = _worker.enter_context(utils.conn_db(path))
+    conn.exec("PRAGMA query_only = ON")
+    _worker_conn.append(conn)
+
+
+def _match_chunk(
+    todos: list[tuple[int, str, str]],
+) -> tuple[dict[int, CandidateList], list[tuple[int, str, str]]]:
+    return match_db(todos, _worker_conn[0])
+
+
+def drain(conn: "Database", workers: int | None = None, chunk: int = CHUNK) -> int:
+    """Match all the due plays of the queue, return their number.
+    The database matching runs in a pool of processes, with read-only connections,
+    the Spotify searches and all the writes in this process, chunk by chunk in order"""
+    workers = workers or os.process_cpu_count() or 1
+    claim = secrets.token_hex(8)
+    matched = 0
+    path = conn.fetch_one(str, "SELECT file FROM pragma_database_list WHERE name = 'main'")
+    # spawned, a forked worker would inherit the open connection of this process
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(workers, ctx, _init_worker, (path,)) as pool:
+        pending = list[tuple[list[tuple[int, str, str]], Future]]()
+        depth = workers * 2
+        while True:
+            # the chunks ahead wait for their throttled Spotify searches, the lease too
+            ahead = sum(len(chunk_todos) for chunk_todos, _ in pending) + chunk
+            lease = LEASE + ahead * MAX_QUERIES // spotify.RATE
+            todos = claim_plays(claim, conn, chunk, lease)
+            if todos:
+                pending.append((todos, pool.submit(_match_chunk, todos)))
+            while pending and (len(pending) >= depth or not todos):
+                chunk_todos, future = pending.pop(0)
+                candidates, spotify_todos = future.result()
+                save_matches(chunk_todos, candidates, spotify_todos, claim, conn)
+                matched += len(chunk_todos)
+                print(f"Matched {matched} plays", flush=True)
+            if not todos:
+                return matched
+
+
+def main(args: list[str] | None = None) -> None:
+    args = args or []
     with utils.conn_db() as conn:
+        if not conn.fetch_one(int, "SELECT EXISTS (SELECT 1 FROM match_signature)"):
+            # new table, learn from the past resolutions
+            remember_signatures(None, conn)
+        if "--workers" in args:
+            drain(conn, int(args[args.index("--workers") + 1]))
+            return
+        claim = secrets.token_hex(8)
         spotify_limit = 20
         while spotify_limit > 0:
-            candidates: dict[int, CandidateList] = {}
-            todos = find_play_todo(conn, spotify_limit)
+            todos = claim_plays(claim, conn, spotify_limit)
             if not todos:
                 break
-            for play_id, title, performer in todos:
-                if not title.strip() or not performer.strip():
-                    # empty parts, do not handle
-                    candidates[play_id] = [CAND_TODO]
-                    continue
-                # DB first
-                song_match = db_find(title, performer, conn)
-                if song_match:
-                    candidates[play_id] = [CandidateByID(s[0], s[1], "db") for s in song_match]
-                if play_id not in candidates:
-                    releases = []
-                    releases = spotify_find(title, performer, get_token())
-                    if releases:
-                        candidates[play_id] = [
-                            CandidateBySong(Song.from_spotify(ss), ss.score, "spotify")
-                            for ss in releases
-                        ]
-                    spotify_limit -= 1
-                    sleep(1)
-                if play_id not in candidates:
-                    # Generate one fake candidate
-                    candidates[play_id] = [CAND_TODO]
-            candidates = unique_candidates(candidates)
-            save_candidates(candidates, conn)
-            save_resolution(candidates, conn)
-            spotify_limit -= 1
+            candidates, spotify_todos = match_db(todos, conn)
+            save_matches(todos, candidates, spotify_todos, claim, conn)
+            spotify_limit -= len(spotify_todos) + 1
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -1,13 +1,82 @@
 import base64
+import json
 import os
-from dataclasses import dataclass
-from functools import cache
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, NamedTuple
 
 import httpx
 
-from monitor.utils import RMError, calc_score, clear_artist, clear_title, print_ascii_table
+from monitor import clients, lookup_cache
+from monitor.utils import RMError, calc_score_many, clear_artist, clear_title, print_ascii_table
 
-SPOTIFY_AUTH = os.environ["SPOTIFY_AUTH"]
+try:
+    import fcntl
+except ImportError:  # not on Windows, the processes do not share the token file safely
+    fcntl = None
+
+if TYPE_CHECKING:
+    from onlymaps import Database
+
+PROVIDER = "spotify"  # in the lookup cache
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+TOKEN_FILE = ".spotify_token.json"  # SPOTIFY_TOKEN_FILE overrides it
+TOKEN_MARGIN = 300  # seconds, a token is renewed this long before it expires
+SEARCH_URL = "https://api.spotify.com/v1/search"
+RATE = 3  # searches per second, on average
+BURST = 5  # searches sent at once after an idle time
+RETRIES = 3  # of a search answered with 429
+RETRY_AFTER = 5  # seconds, if the 429 has no Retry-After
+
+
+class SearchError(RMError):
+    """A search not answered, unlike a search without results"""
+
+
+class TokenBucket:
+    """Rate limiter shared by the threads: every request takes a token,
+    tokens come back at `rate` per second, up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.not_before = 0.0  # monotonic time, set by a 429
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait for a token"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.not_before and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.not_before - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """No requests for seconds, for everyone"""
+        with self.lock:
+            self.not_before = max(self.not_before, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+limiter = TokenBucket(RATE, BURST)
+
+
+def retry_after(response: httpx.Response) -> float:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return RETRY_AFTER
 
 
 @dataclass
@@ -22,13 +91,22 @@ class SpSong:
     duration: int  # in seconds
 
 
-@cache
-def get_token() -> str:
-    r = httpx.post(
-        "https://accounts.spotify.com/api/token",
-        headers={
-            "Authorization": "Basic " + base64.b64encode(SPOTIFY_AUTH.encode()).decode("ascii")
-        },
+class Token(NamedTuple):
+    client_id: str
+    access_token: str
+    expires_at: float  # unix time
+
+    def fresh(self, client_id: str) -> bool:
+        return self.client_id == client_id and self.expires_at - TOKEN_MARGIN > time.time()
+
+
+_tokens = dict[str, Token]()  # by client id, in memory
+
+
+def request_token(auth: str) -> Token:
+    r = clients.post(
+        TOKEN_URL,
+        headers={"Authorization": "Basic " + base64.b64encode(auth.encode()).decode("ascii")},
         data={"grant_type": "client_credentials"},
     )
     try:
@@ -38,24 +116,89 @@ def get_token() -> str:
             raise RMError("Spotify token HTTP error 503") from e
         raise e
     jr = r.json()
-    return jr["access_token"]
-
-
-def find_releases(title: str, performer: str, token: str) -> list[SpSong]:
-    # fetch spotify API
-    r = httpx.get(
-        "https://api.spotify.com/v1/search",
-        params={
-            "q": f"{clear_title(title)} artist:{clear_artist(performer)}",
-            "type": "track",
-        },
-        headers={"Authorization": f"Bearer {token}"},
-    )
+    return Token(auth.split(":")[0], jr["access_token"], time.time() + jr.get("expires_in", 3600))
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[IO[str]]:
+    """The token file, locked against the other processes"""
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), "r+") as f:
+        if fcntl:
+            # released on close
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield f
+
+
+def get_token() -> str:
+    """A valid token: the one in memory, the one in the token file (shared by the
+    processes), or a new one when they expire in less than TOKEN_MARGIN"""
+    auth = os.environ.get("SPOTIFY_AUTH")
+    if not auth:
+        raise RMError("SPOTIFY_AUTH not set")
+    client_id = auth.split(":")[0]
+    token = _tokens.get(client_id)
+    if token and token.fresh(client_id):
+        return token.access_token
+    with _locked(Path(os.environ.get("SPOTIFY_TOKEN_FILE", TOKEN_FILE))) as f:
+        try:
+            token = Token(**json.load(f))
+        except (ValueError, TypeError):
+            token = None
+        if not token or not token.fresh(client_id):
+            # the other processes wait for it on the lock
+            token = request_token(auth)
+            f.seek(0)
+            f.truncate()
+            json.dump(token._asdict(), f)
+    _tokens[client_id] = token
+    return token.access_token
+
+
+def drop_token(access_token: str) -> None:
+    """Forget a token refused by Spotify, in memory and in the token file"""
+    for client_id, token in list(_tokens.items()):
+        if token.access_token == access_token:
+            del _tokens[client_id]
+    with _locked(Path(os.environ.get("SPOTIFY_TOKEN_FILE", TOKEN_FILE))) as f:
+        try:
+            token = Token(**json.load(f))
+        except (ValueError, TypeError):
+            return
+        if token.access_token == access_token:
+            f.seek(0)
+            f.truncate()
+
+
+def search_query(title: str, performer: str) -> str:
+    return f"{clear_title(title)} artist:{clear_artist(performer)}"
+
+
+def _search(query: str, token: str) -> httpx.Response:
+    # fetch spotify API, within the rate limit
+    for _ in range(RETRIES + 1):
+        limiter.acquire()
+        r = clients.get(
+            SEARCH_URL,
+            params={"q": query, "type": "track"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        if r.status_code != 429:
+            break
+        limiter.pause(retry_after(r))
+    return r
+
+
+def search(query: str, token: str) -> list[SpSong]:
+    """The tracks found by the query, not scored. SearchError on HTTP errors"""
     try:
+        r = _search(query, token)
+        if r.status_code == 401:
+            # refused before its expiry, a new token once
+            drop_token(token)
+            r = _search(query, get_token())
         r.raise_for_status()
-    except httpx.HTTPStatusError as e:
-        print(e)
-        return []
+    except httpx.HTTPError as e:
+        raise SearchError(f"Spotify search failed: {e}") from e
     tree = r.json()
     findings: list[SpSong] = []
     try:
@@ -65,14 +208,13 @@ def find_releases(title: str, performer: str, token: str) -> list[SpSong]:
                 country = item["external_ids"]["isrc"][:2]
             except BaseException:
                 pass
-            s_performers = ", ".join(a["name"] for a in item["artists"])
             r = SpSong(
                 year=int(item["album"]["release_date"][:4]),
                 country=country,
                 title=item["name"],
-                s_performers=s_performers,
+                s_performers=", ".join(a["name"] for a in item["artists"]),
                 l_performers=tuple(a["name"] for a in item["artists"]),
-                score=calc_score(title, performer, item["name"], s_performers) or 0.01,
+                score=0,
                 isrc=item["external_ids"].get("isrc", ""),
                 duration=int(item["duration_ms"] / 1000),
             )
@@ -82,23 +224,67 @@ def find_releases(title: str, performer: str, token: str) -> list[SpSong]:
             findings.append(r)
     except KeyError:
         pass
+    return findings
+
+
+def rank(songs: list[SpSong], title: str, performer: str) -> list[SpSong]:
+    """Score the songs against the play, keep the best ones"""
+    scores = calc_score_many((title, performer), [(r.title, r.s_performers) for r in songs])
+    findings = [replace(r, score=score or 0.01) for r, score in zip(songs, scores, strict=True)]
     if findings:
         limit = max(5, sum(1 for r in findings if r.score >= 0.5))
         return sorted(findings, key=lambda r: r.score, reverse=True)[:limit]
     return []
 
 
-def spotify_find(title: str, artist: str, token: str) -> list[SpSong]:
-    release = find_releases(title, artist, token)
+def to_cache(songs: list[SpSong]) -> list[dict[str, Any]]:
+    return [asdict(song) for song in songs]
+
+
+def from_cache(songs: list[dict[str, Any]]) -> list[SpSong]:
+    return [SpSong(**song | {"l_performers": tuple(song["l_performers"])}) for song in songs]
+
+
+def find_releases(
+    title: str, performer: str, token: str, lookups: None | lookup_cache.Lookups = None
+) -> list[SpSong]:
+    query = search_query(title, performer)
+    cached = lookups.get(query) if lookups else None
+    if cached is not None:
+        return rank(from_cache(cached), title, performer)
+    songs = search(query, token)
+    if lookups and songs:
+        # a miss is not cached, its backoff decides when it is searched again
+        lookups.add(query, to_cache(songs))
+    return rank(songs, title, performer)
+
+
+def queries(title: str, artist: str) -> list[str]:
+    """The queries of spotify_find"""
+    if " X " in artist:
+        return [search_query(title, artist), search_query(title, artist.split(" X ")[0])]
+    return [search_query(title, artist)]
+
+
+def spotify_find(
+    title: str, artist: str, token: str, lookups: None | lookup_cache.Lookups = None
+) -> list[SpSong]:
+    release = find_releases(title, artist, token, lookups)
     if not release:
         if " X " in artist:
-            release = find_releases(title, artist.split(" X ")[0], token)
+            release = find_releases(title, artist.split(" X ")[0], token, lookups)
             if release:
                 return release
         return []
     return release
 
 
+def cached_find(title: str, artist: str, token: str, conn: "Database") -> list[SpSong]:
+    """spotify_find, through the lookup cache"""
+    with lookup_cache.cached(PROVIDER, queries(title, artist), conn) as lookups:
+        return spotify_find(title, artist, token, lookups)
+
+
 def main():  # pragma: no cover
     token = get_token()
     while True:
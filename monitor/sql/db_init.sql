@@ -21,6 +21,24 @@ CREATE TABLE station (
   active         INTEGER NOT NULL DEFAULT 1 CHECK (active IN (0,1))
 );
 
+-- RAW PAYLOADS, see payloads.py
+CREATE TABLE payload_dict (
+  dict_id        INTEGER PRIMARY KEY,
+  station_id     INTEGER NOT NULL REFERENCES station(station_id) ON DELETE RESTRICT,
+  zdict          BLOB NOT NULL,           -- zlib preset dictionary
+  created_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
+
+CREATE TABLE payload (
+  payload_id     INTEGER PRIMARY KEY,
+  payload_hash   BLOB NOT NULL UNIQUE,    -- sha256 of the raw text
+  station_id     INTEGER NOT NULL REFERENCES station(station_id) ON DELETE RESTRICT,
+  dict_id        INTEGER REFERENCES payload_dict(dict_id) ON DELETE RESTRICT,
+  data           BLOB NOT NULL            -- zlib compressed, with the dictionary if any
+);
+
+CREATE INDEX idx_payload_station ON payload(station_id, payload_id);
+
 -- RAW DATA for ingestion
 CREATE TABLE play (
   play_id            INTEGER PRIMARY KEY,
@@ -29,11 +47,35 @@ CREATE TABLE play (
   title_raw          TEXT NOT NULL,           -- as captured from radio
   performer_raw      TEXT NOT NULL,           -- as captured from radio
   acquisition_id     TEXT,                    -- ingestion batch/job id
-  source_payload     TEXT,                    -- raw JSON/text as string if needed
-  inserted_at        TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+  source_payload     TEXT,                    -- legacy, raw JSON/text before payload
+  inserted_at        TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+  payload_id         INTEGER REFERENCES payload(payload_id),  -- raw JSON/text, compressed
+  observed_epoch     INTEGER GENERATED ALWAYS AS (unixepoch(observed_at)) VIRTUAL,
+  inserted_epoch     INTEGER GENERATED ALWAYS AS (unixepoch(inserted_at)) VIRTUAL
 );
 
-CREATE INDEX idx_play_observed_at ON play(observed_at);
+CREATE INDEX idx_play_observed_epoch ON play(observed_epoch);
+
+CREATE INDEX idx_play_station_observed_epoch ON play(station_id, observed_epoch);
+
+CREATE INDEX idx_play_inserted_epoch ON play(inserted_epoch);
+
+-- Progress of the re-parse of the payloads, see backfill.py
+CREATE TABLE backfill_state (
+  name           TEXT PRIMARY KEY,        -- name of the backfill run
+  last_play_id   INTEGER NOT NULL,        -- plays up to this one are done
+  updated        INTEGER NOT NULL DEFAULT 0,  -- changed plays
+  updated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
+
+-- Circuit breakers of the acquisition, see radio/breaker.py
+CREATE TABLE station_breaker (
+  station        TEXT PRIMARY KEY,        -- station module in monitor.radio
+  failures       INTEGER NOT NULL DEFAULT 0,  -- consecutive failed polls
+  open_until     REAL,                    -- unix time, not polled until then
+  last_error     TEXT,
+  updated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
 
 -- ARTISTS
 CREATE TABLE artist (
@@ -196,6 +238,18 @@ BEGIN
   DELETE FROM song_fts WHERE rowid = OLD.song_alias_id;
 END;
 
+-- Responses of the song search providers, see lookup_cache.py
+CREATE TABLE lookup_cache (
+  provider       TEXT NOT NULL,           -- 'spotify', 'musicbrainz'
+  query          TEXT NOT NULL,           -- as sent to the provider
+  songs          TEXT NOT NULL,           -- JSON list of the parsed songs, not scored
+  fetched_at     INTEGER NOT NULL,        -- unix time, fetched again after lookup_cache.TTL
+  used_at        INTEGER NOT NULL,        -- unix time of the last hit, for the LRU eviction
+  PRIMARY KEY (provider, query)
+);
+
+CREATE INDEX idx_lookup_cache_used ON lookup_cache(used_at);
+
 -- Store all candidate matches per play for auditability and human review.
 CREATE TABLE match_candidate (
   candidate_id     INTEGER PRIMARY KEY,
@@ -203,7 +257,8 @@ CREATE TABLE match_candidate (
   song_id          INTEGER REFERENCES song(song_id) ON DELETE SET NULL,
   candidate_score  REAL NOT NULL,               -- 0..100
   method           TEXT NOT NULL,               -- e.g., 'alias-fts','token-fuzzy','phonetic','exact'
-  generated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+  generated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+  generated_epoch  INTEGER GENERATED ALWAYS AS (unixepoch(generated_at)) VIRTUAL
 );
 
 CREATE UNIQUE INDEX ux_candidate_play_song ON match_candidate(play_id, song_id);
@@ -212,6 +267,37 @@ CREATE INDEX idx_candidate_play ON match_candidate(play_id);
 
 CREATE INDEX idx_candidate_song ON match_candidate(song_id);
 
+CREATE INDEX idx_candidate_generated_epoch ON match_candidate(generated_epoch);
+
+
+-- Plays without candidates, see smatcher.record_misses
+CREATE TABLE match_miss (
+  title_raw      TEXT NOT NULL,
+  performer_raw  TEXT NOT NULL,
+  misses         INTEGER NOT NULL,        -- consecutive lookups without candidates
+  last_at        INTEGER NOT NULL,        -- unix time of the last miss
+  next_at        INTEGER NOT NULL,        -- unix time, not looked up before
+  PRIMARY KEY (title_raw, performer_raw)
+);
+
+-- Plays to match, see smatcher.claim_plays
+CREATE TABLE match_queue (
+  play_id        INTEGER PRIMARY KEY REFERENCES play(play_id) ON DELETE CASCADE,
+  due_at         INTEGER NOT NULL,        -- unix time, not claimed before
+  claim          TEXT,                    -- token of the matcher holding the play
+  attempts       INTEGER NOT NULL DEFAULT 0  -- claims without a result
+);
+
+CREATE INDEX idx_match_queue_due ON match_queue(due_at);
+
+-- OR REPLACE: a play_id can be reused after a delete
+CREATE TRIGGER trg_play_ai_queue
+AFTER INSERT ON play
+FOR EACH ROW
+BEGIN
+  INSERT OR REPLACE INTO match_queue (play_id, due_at)
+  VALUES (NEW.play_id, unixepoch(NEW.inserted_at));
+END;
 
 -- Final mapping of a play to its canonical song
 CREATE TABLE play_resolution (
@@ -220,13 +306,27 @@ CREATE TABLE play_resolution (
   chosen_score   REAL,                         -- score of the chosen candidate
   status         TEXT NOT NULL CHECK (status IN ('pending','auto','human')) DEFAULT 'auto',
   decided_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
-  notes          TEXT
+  notes          TEXT,
+  decided_epoch  INTEGER GENERATED ALWAYS AS (unixepoch(decided_at)) VIRTUAL
 );
 
 CREATE INDEX idx_resolution_song ON play_resolution(song_id);
 
+CREATE INDEX idx_resolution_decided_epoch ON play_resolution(decided_epoch);
+
 CREATE INDEX idx_resolution_status ON play_resolution(status);
 
+-- Resolutions by raw strings, see smatcher.find_signatures
+CREATE TABLE match_signature (
+  signature      TEXT PRIMARY KEY,        -- smatcher.signature of title_raw and performer_raw
+  song_id        INTEGER NOT NULL REFERENCES song(song_id) ON DELETE CASCADE,
+  score          REAL NOT NULL,           -- chosen score of the resolution
+  status         TEXT NOT NULL CHECK (status IN ('auto','human')),
+  updated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
+
+CREATE INDEX idx_signature_song ON match_signature(song_id);
+
 CREATE VIEW v_master_song
 AS
 SELECT
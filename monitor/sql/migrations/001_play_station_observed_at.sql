@@ -0,0 +1,2 @@
+-- Index for the duplicate lookup of insert_into_radio
+CREATE INDEX IF NOT EXISTS idx_play_station_observed_at ON play(station_id, observed_at);
@@ -0,0 +1,18 @@
+CREATE TABLE payload_dict (
+  dict_id        INTEGER PRIMARY KEY,
+  station_id     INTEGER NOT NULL REFERENCES station(station_id) ON DELETE RESTRICT,
+  zdict          BLOB NOT NULL,           -- zlib preset dictionary
+  created_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
+
+CREATE TABLE payload (
+  payload_id     INTEGER PRIMARY KEY,
+  payload_hash   BLOB NOT NULL UNIQUE,    -- sha256 of the raw text
+  station_id     INTEGER NOT NULL REFERENCES station(station_id) ON DELETE RESTRICT,
+  dict_id        INTEGER REFERENCES payload_dict(dict_id) ON DELETE RESTRICT,
+  data           BLOB NOT NULL            -- zlib compressed, with the dictionary if any
+);
+
+CREATE INDEX idx_payload_station ON payload(station_id, payload_id);
+
+ALTER TABLE play ADD COLUMN payload_id INTEGER REFERENCES payload(payload_id);
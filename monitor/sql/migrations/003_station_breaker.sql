@@ -0,0 +1,7 @@
+CREATE TABLE station_breaker (
+  station        TEXT PRIMARY KEY,        -- station module in monitor.radio
+  failures       INTEGER NOT NULL DEFAULT 0,  -- consecutive failed polls
+  open_until     REAL,                    -- unix time, not polled until then
+  last_error     TEXT,
+  updated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
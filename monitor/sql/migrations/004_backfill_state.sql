@@ -0,0 +1,6 @@
+CREATE TABLE backfill_state (
+  name           TEXT PRIMARY KEY,        -- name of the backfill run
+  last_play_id   INTEGER NOT NULL,        -- plays up to this one are done
+  updated        INTEGER NOT NULL DEFAULT 0,  -- changed plays
+  updated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
@@ -0,0 +1,25 @@
+-- Integer unix times of the ISO timestamps, computed by SQLite and indexed:
+-- time ranges become index range scans, no strftime per row
+ALTER TABLE play ADD COLUMN observed_epoch INTEGER GENERATED ALWAYS AS (unixepoch(observed_at)) VIRTUAL;
+
+ALTER TABLE play ADD COLUMN inserted_epoch INTEGER GENERATED ALWAYS AS (unixepoch(inserted_at)) VIRTUAL;
+
+ALTER TABLE match_candidate ADD COLUMN generated_epoch INTEGER GENERATED ALWAYS AS (unixepoch(generated_at)) VIRTUAL;
+
+ALTER TABLE play_resolution ADD COLUMN decided_epoch INTEGER GENERATED ALWAYS AS (unixepoch(decided_at)) VIRTUAL;
+
+-- the indexes hold the values of the existing rows
+CREATE INDEX idx_play_observed_epoch ON play(observed_epoch);
+
+CREATE INDEX idx_play_station_observed_epoch ON play(station_id, observed_epoch);
+
+CREATE INDEX idx_play_inserted_epoch ON play(inserted_epoch);
+
+CREATE INDEX idx_candidate_generated_epoch ON match_candidate(generated_epoch);
+
+CREATE INDEX idx_resolution_decided_epoch ON play_resolution(decided_epoch);
+
+-- replaced by the epoch ones
+DROP INDEX IF EXISTS idx_play_observed_at;
+
+DROP INDEX IF EXISTS idx_play_station_observed_at;
@@ -0,0 +1,10 @@
+CREATE TABLE lookup_cache (
+  provider       TEXT NOT NULL,           -- 'spotify', 'musicbrainz'
+  query          TEXT NOT NULL,           -- as sent to the provider
+  songs          TEXT NOT NULL,           -- JSON list of the parsed songs, not scored
+  fetched_at     INTEGER NOT NULL,        -- unix time, fetched again after lookup_cache.TTL
+  used_at        INTEGER NOT NULL,        -- unix time of the last hit, for the LRU eviction
+  PRIMARY KEY (provider, query)
+);
+
+CREATE INDEX idx_lookup_cache_used ON lookup_cache(used_at);
@@ -0,0 +1,8 @@
+CREATE TABLE match_miss (
+  title_raw      TEXT NOT NULL,
+  performer_raw  TEXT NOT NULL,
+  misses         INTEGER NOT NULL,        -- consecutive lookups without candidates
+  last_at        INTEGER NOT NULL,        -- unix time of the last miss
+  next_at        INTEGER NOT NULL,        -- unix time, not looked up before
+  PRIMARY KEY (title_raw, performer_raw)
+);
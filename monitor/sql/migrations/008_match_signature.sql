@@ -0,0 +1,9 @@
+CREATE TABLE match_signature (
+  signature      TEXT PRIMARY KEY,        -- smatcher.signature of title_raw and performer_raw
+  song_id        INTEGER NOT NULL REFERENCES song(song_id) ON DELETE CASCADE,
+  score          REAL NOT NULL,           -- chosen score of the resolution
+  status         TEXT NOT NULL CHECK (status IN ('auto','human')),
+  updated_at     TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+);
+
+CREATE INDEX idx_signature_song ON match_signature(song_id);
@@ -0,0 +1,32 @@
+CREATE TABLE match_queue (
+  play_id        INTEGER PRIMARY KEY REFERENCES play(play_id) ON DELETE CASCADE,
+  due_at         INTEGER NOT NULL,        -- unix time, not claimed before
+  claim          TEXT,                    -- token of the matcher holding the play
+  attempts       INTEGER NOT NULL DEFAULT 0  -- claims without a result
+);
+
+CREATE INDEX idx_match_queue_due ON match_queue(due_at);
+
+-- OR REPLACE: a play_id can be reused after a delete
+CREATE TRIGGER trg_play_ai_queue
+AFTER INSERT ON play
+FOR EACH ROW
+BEGIN
+  INSERT OR REPLACE INTO match_queue (play_id, due_at)
+  VALUES (NEW.play_id, unixepoch(NEW.inserted_at));
+END;
+
+INSERT INTO match_queue (play_id, due_at)
+SELECT p.play_id, max(p.inserted_epoch, COALESCE(mm.next_at, 0))
+FROM play AS p
+LEFT JOIN match_miss AS mm ON mm.title_raw = p.title_raw AND mm.performer_raw = p.performer_raw
+WHERE NOT EXISTS (
+    SELECT 1 FROM match_candidate AS mc
+    WHERE mc.play_id = p.play_id AND (mm.next_at IS NULL OR mc.method != 'todo')
+) AND (
+    mm.next_at IS NULL
+    OR NOT EXISTS (
+        SELECT 1 FROM play_resolution AS pr
+        WHERE pr.play_id = p.play_id AND pr.status != 'pending'
+    )
+);
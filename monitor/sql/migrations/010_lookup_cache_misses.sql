@@ -0,0 +1,3 @@
+-- The searches without results are no longer cached, their match_miss backoff
+-- decides when they are sent again
+DELETE FROM lookup_cache WHERE songs = '[]';
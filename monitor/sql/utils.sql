@@ -40,7 +40,7 @@ SELECT
         ON s.song_id = pr.song_id
     WHERE
         pr.chosen_score > 0 AND pr.chosen_score < 0.7
-ORDER BY pr.decided_at DESC
+ORDER BY pr.decided_epoch DESC
 LIMIT 20;
 
 
@@ -1,18 +1,26 @@
 import re
 import unicodedata
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import UTC, datetime
 from difflib import SequenceMatcher
-from typing import Any
+from functools import lru_cache
+from typing import Any, NamedTuple
 
-from onlymaps import Database, connect
+from onlymaps import Bulk, Database, connect
+
+from monitor import payloads
+
+BUSY_TIMEOUT = 5000  # milliseconds a connection waits for the write lock
 
 
 @contextmanager
 def conn_db(path="radio.sqlite3") -> Iterator[Database]:
     conn = connect(f"sqlite:///{path}")
     conn.open()
+    # the readers do not block the writer, and a writer waits for the lock
+    conn.exec("PRAGMA journal_mode = WAL")
+    conn.exec(f"PRAGMA busy_timeout = {BUSY_TIMEOUT}")
     try:
         yield conn
     finally:
@@ -23,6 +31,188 @@ class RMError(Exception):
     pass
 
 
+class RadioPlay(NamedTuple):
+    radio: str
+    performer: str
+    title: str
+    timestamp: datetime | None = None
+    payload: str = ""
+
+
+def _epoch(timestamp: datetime) -> float:
+    """Seconds since epoch, naive timestamps are UTC (as in SQLite)"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=UTC)
+    return timestamp.timestamp()
+
+
+class _LastPlays:
+    """The most recent plays of every station, kept in memory to detect
+    duplicates without querying the whole play table"""
+
+    SIZE = 2
+
+    def __init__(self) -> None:
+        self.key: tuple[str, int] | None = None  # database file, last play_id
+        self.plays = dict[str, list[tuple[float, str, str]]]()
+
+    def sync(self, conn: Database) -> None:
+        """Reload the cache if the play table was changed by someone else"""
+        key = conn.fetch_one(
+            tuple[str, int],
+            """SELECT
+                (SELECT file FROM pragma_database_list WHERE name = 'main'),
+                COALESCE((SELECT MAX(play_id) FROM play), 0)""",
+        )
+        if key == self.key:
+            return
+        self.plays.clear()
+        rows = conn.fetch_many(
+            tuple[str, str, str, str],
+            """
+    SELECT st.station_code, p.observed_at, p.title_raw, p.performer_raw
+    FROM station AS st
+    JOIN play AS p ON p.play_id IN (
+        SELECT pp.play_id
+        FROM play AS pp
+        WHERE pp.station_id = st.station_id
+        ORDER BY pp.observed_epoch DESC
+        LIMIT ?
+    )""",
+            self.SIZE,
+        )
+        for radio, observed_at, title, performer in rows:
+            self.add(radio, datetime.fromisoformat(observed_at), title, performer)
+        self.key = key
+
+    def add(self, radio: str, timestamp: datetime, title: str, performer: str) -> None:
+        plays = self.plays.setdefault(radio, [])
+        plays.append((_epoch(timestamp), title, performer))
+        plays.sort()
+        del plays[: -self.SIZE]
+
+    def inserted(self, count: int, conn: Database) -> None:
+        """Check that the added plays are the only ones inserted since the last sync"""
+        if not self.key or not count:
+            return
+        last_id = conn.fetch_one(int, "SELECT MAX(play_id) FROM play")
+        if last_id != self.key[1] + count:
+            # someone else inserted a play meanwhile
+            self.key = None
+            return
+        self.key = (self.key[0], last_id)
+
+    def is_duplicate(
+        self, radio: str, title: str, performer: str, timestamp: datetime
+    ) -> bool | None:
+        """Check if the play is one of the two nearest in time, None if unknown"""
+        plays = self.plays.get(radio, [])
+        if plays and _epoch(timestamp) < plays[-1][0]:
+            # older than the cached plays, the nearest ones are not in memory
+            return None
+        return any(t == title and p == performer for _, t, p in plays)
+
+
+_last_plays = _LastPlays()
+
+
+def _is_duplicate_db(
+    radio: str, title: str, performer: str, timestamp: datetime, conn: Database
+) -> bool:
+    # nearest plays before and after, range scans on idx_play_station_observed_epoch
+    lasts = conn.fetch_many(
+        tuple[int, str, str],
+        """
+    WITH st AS (SELECT station_id FROM station WHERE station_code = ?1)
+    SELECT observed_epoch, title_raw, performer_raw
+    FROM (
+        SELECT * FROM (
+            SELECT observed_epoch, title_raw, performer_raw
+            FROM play
+            WHERE station_id = (SELECT station_id FROM st) AND observed_epoch <= ?2
+            ORDER BY observed_epoch DESC
+            LIMIT 2
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT observed_epoch, title_raw, performer_raw
+            FROM play
+            WHERE station_id = (SELECT station_id FROM st) AND observed_epoch > ?2
+            ORDER BY observed_epoch ASC
+            LIMIT 2
+        )
+    )
+    ORDER BY ABS(observed_epoch - ?2)
+    LIMIT 2
+    """,
+        radio,
+        int(_epoch(timestamp)),
+    )
+    return any(t == title and p == performer for _, t, p in lasts)
+
+
+def insert_plays(
+    plays: Iterable[RadioPlay], acquisition_id: str, conn: Database
+) -> list[RadioPlay]:
+    """Insert the plays of an acquisition in a single transaction,
+    return the ones actually inserted"""
+    stations = dict(
+        conn.fetch_many(tuple[str, int], "SELECT station_code, station_id FROM station")
+    )
+    now = datetime.now()
+    inserted = list[RadioPlay]()
+    rows = list[tuple[int, str, str, str, str, str]]()
+    try:
+        with conn.transaction():
+            _last_plays.sync(conn)
+            for play in plays:
+                performer = play.performer.strip()
+                title = play.title.strip()
+                if not performer and not title:
+                    continue
+                if play.radio not in stations:
+                    print(f"Radio {play.radio} not found")
+                    continue
+                timestamp = play.timestamp or now
+                # Avoid duplicates
+                duplicate = _last_plays.is_duplicate(play.radio, title, performer, timestamp)
+                if duplicate is None:
+                    duplicate = _is_duplicate_db(play.radio, title, performer, timestamp, conn)
+                if duplicate:
+                    continue
+                rows.append(
+                    (
+                        stations[play.radio],
+                        timestamp.isoformat(),
+                        title,
+                        performer,
+                        acquisition_id,
+                        play.payload,
+                    )
+                )
+                _last_plays.add(play.radio, timestamp, title, performer)
+                inserted.append(play)
+            if rows:
+                payload_ids = payloads.store([(row[0], row[5]) for row in rows], conn)
+                conn.exec(
+                    """INSERT INTO play (
+                        station_id,
+                        observed_at,
+                        title_raw,
+                        performer_raw,
+                        acquisition_id,
+                        payload_id
+                    ) VALUES (?, ?, ?, ?, ?, ?)""",
+                    Bulk([(*row[:5], pid) for row, pid in zip(rows, payload_ids, strict=True)]),
+                )
+            _last_plays.inserted(len(rows), conn)
+    except BaseException:
+        # rolled back: the cache holds plays never stored, reload it
+        _last_plays.key = None
+        raise
+    return inserted
+
+
 def insert_into_radio(
     radio: str,
     performer: str,
@@ -37,50 +227,15 @@ def insert_into_radio(
     if not performer and not title:
         return None
     with conn_db() as conn:
-        if not timestamp:
-            timestamp = datetime.now()
-        # Avoid duplicates
-        lasts = conn.fetch_many(
-            tuple[str, str, str],
-            """
-    SELECT observed_at, title_raw, performer_raw
-    FROM play
-    WHERE station_id = (SELECT station_id FROM station WHERE station_code = ?)
-    ORDER BY ABS(strftime('%s', observed_at) - strftime('%s', ?))
-    LIMIT 2
-    """,
-            radio,
-            timestamp.isoformat(),
-        )
-        for _, t, p in lasts:
-            if t == title and p == performer:
-                # skip
-                return radio, p, t
-
-        # Insert
-        conn.exec(
-            """INSERT INTO play (
-                station_id,
-                observed_at,
-                title_raw,
-                performer_raw,
-                acquisition_id,
-                source_payload
-            ) VALUES (
-                (SELECT station_id FROM station WHERE station_code = ?),
-                ?,
-                ?,
-                ?,
-                ?,
-                ?)""",
-            radio,
-            timestamp.isoformat(),
-            title,
-            performer,
-            acquisition_id,
-            payload,
-        )
-        return radio, performer, title
+        insert_plays([RadioPlay(radio, performer, title, timestamp, payload)], acquisition_id, conn)
+    return radio, performer, title
+
+
+def insert_play(play: RadioPlay, acquisition_id: str) -> None | tuple[str, str, str]:
+    """Insert a play fetched by a station into the radio database"""
+    return insert_into_radio(
+        play.radio, play.performer, play.title, acquisition_id, play.timestamp, play.payload
+    )
 
 
 def generate_batch(prefix="test", time: None | datetime = None) -> str:
@@ -105,21 +260,11 @@ def clear_title(title: str) -> str:
     return title
 
 
-def __string_match(a: str, b: str) -> float:
-    sm = SequenceMatcher(None, a, b)
-    return sm.ratio()
-
-
 JUNK = {"and", "feat", "feature"}
-
-
-def __string_smart_diff(a: str, b: str) -> float:
-    """Return the similarity between two strings based on set of words appearing in each."""
-    a_words = set(re.split(r"\W+", a))
-    b_words = set(re.split(r"\W+", b))
-    a_diff = a_words - b_words - JUNK
-    b_diff = b_words - a_words - JUNK
-    return 1 - ((sum(map(len, a_diff)) + sum(map(len, b_diff))) / (len(a) + len(b)))
+# weights of calc_score
+W_TITLE = 1.0
+W_ARTIST = 1.0
+W_CONCAT = 2  # TBV
 
 
 def __normalize(txt: str) -> str:
@@ -128,29 +273,77 @@ def __normalize(txt: str) -> str:
     )
 
 
+def exact_key(title: str, performer: str) -> None | tuple[str, str]:
+    """The title and performer as compared by calc_score: equal keys score 1.
+    None if the normalization drops more than the accents, or leaves a part empty:
+    the keys of non-Latin texts would collide"""
+    for part in (title, performer):
+        decomposed = unicodedata.normalize("NFKD", part.strip())
+        if not decomposed or any(ord(c) > 127 and not unicodedata.combining(c) for c in decomposed):
+            return None
+    key = __normalize(title), __normalize(performer)
+    if not key[0].strip() or not key[1].strip():
+        return None
+    return key
+
+
+@lru_cache(maxsize=4096)
+def _prepare(title: str, performer: str) -> tuple[str, str, str, frozenset[str]]:
+    """Normalized title and performer, their concatenation and its words"""
+    title, performer = __normalize(title), __normalize(performer)
+    concat = title + " " + performer
+    return title, performer, concat, frozenset(re.split(r"\W+", concat))
+
+
 def calc_score(otitle: str, operformer: str, title: str, performer: str) -> float:
-    otitle, operformer, title, performer = (
-        __normalize(otitle),
-        __normalize(operformer),
-        __normalize(title),
-        __normalize(performer),
-    )
     """Return a measure of similarity,
     1 if the title and performer are identical, and 0 if
     they have nothing in common."""
-    if otitle == title and operformer == performer:
-        return 1.0
-    w_title = 1.0
-    w_artist = 1.0
-    w_concat = 2  # TBV
-    rtitle = __string_match(title, otitle)
-    rartist = __string_match(performer, operformer)
-    rconcat = __string_smart_diff(title + " " + performer, otitle + " " + operformer)
-    return min(
-        (rtitle * w_title + rartist * w_artist + rconcat * w_concat)
-        / (w_artist + w_title + w_concat),
-        0.99,
-    )
+    return calc_score_many((otitle, operformer), [(title, performer)])[0]
+
+
+def calc_score_many(
+    query: tuple[str, str], candidates: Iterable[tuple[str, str]], reverse: bool = False
+) -> list[float]:
+    """calc_score(*query, *candidate) of every (title, performer) candidate,
+    or calc_score(*candidate, *query) if reverse.
+    The query is normalized and tokenized once, the candidates are cached."""
+    qtitle, qperformer, qconcat, qwords = _prepare(*query)
+    # the ratios are not symmetric, keep the sides of calc_score:
+    # SequenceMatcher indexes the second sequence, the query when not reverse
+    m_title, m_artist = SequenceMatcher(), SequenceMatcher()
+    if reverse:
+        m_title.set_seq1(qtitle)
+        m_artist.set_seq1(qperformer)
+    else:
+        m_title.set_seq2(qtitle)
+        m_artist.set_seq2(qperformer)
+    scores = list[float]()
+    for title, performer in candidates:
+        ctitle, cperformer, cconcat, cwords = _prepare(title, performer)
+        if ctitle == qtitle and cperformer == qperformer:
+            scores.append(1.0)
+            continue
+        if reverse:
+            m_title.set_seq2(ctitle)
+            m_artist.set_seq2(cperformer)
+        else:
+            m_title.set_seq1(ctitle)
+            m_artist.set_seq1(cperformer)
+        # similarity of the sets of words
+        c_diff = cwords - qwords - JUNK
+        q_diff = qwords - cwords - JUNK
+        rconcat = 1 - (
+            (sum(map(len, c_diff)) + sum(map(len, q_diff))) / (len(cconcat) + len(qconcat))
+        )
+        scores.append(
+            min(
+                (m_title.ratio() * W_TITLE + m_artist.ratio() * W_ARTIST + rconcat * W_CONCAT)
+                / (W_ARTIST + W_TITLE + W_CONCAT),
+                0.99,
+            )
+        )
+    return scores
 
 
 def print_ascii_table(data: list[list[Any]], head: int | set = -1) -> None:
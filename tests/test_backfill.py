@@ -0,0 +1,165 @@
+import json
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from monitor import backfill, db_init, smatcher, utils
+
+
+def m2o_payload(title: str) -> str:
+    return json.dumps({"title": title})
+
+
+def rds_payload(artist: str, title: str, mid: str) -> str:
+    song = {"artist": artist, "title": title, "mid": mid}
+    return json.dumps({"song_status": {"current_song": song}})
+
+
+class BackfillTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_backfill.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_backfill.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def setUp(self):
+        now = datetime(2026, 1, 1, 12, 0, 0)
+        plays = [
+            # stored by a broken parser
+            utils.RadioPlay(
+                "m2o",
+                "",
+                "The Fate of Ophelia TAYLOR SWIFT",
+                now,
+                m2o_payload("The Fate of Ophelia TAYLOR SWIFT"),
+            ),
+            utils.RadioPlay(
+                "m2o",
+                "SEKOU",
+                "Catching Bodies",
+                now.replace(hour=13),
+                m2o_payload("Catching Bodies SEKOU"),
+            ),
+            utils.RadioPlay(
+                "rds",
+                "Ed Sheeran",
+                "Camera",
+                now,
+                rds_payload("Ed Sheeran", "Camera", "1#2#2026-01-01T11:58:00"),
+            ),
+            utils.RadioPlay("m2o", "X", "Y", now.replace(hour=14), m2o_payload("not split")),
+            utils.RadioPlay("dj", "A", "B", now, ""),
+        ]
+        with utils.conn_db() as conn:
+            self.assertEqual(len(utils.insert_plays(plays, "test_backfill", conn)), len(plays))
+
+    def tearDown(self):
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM play")
+            conn.exec("DELETE FROM backfill_state")
+            conn.exec("DELETE FROM match_candidate")
+            conn.exec("DELETE FROM play_resolution")
+            conn.exec("DELETE FROM match_signature")
+            conn.exec("DELETE FROM song")
+
+    def plays(self) -> list[tuple[str, str, str]]:
+        with utils.conn_db() as conn:
+            return conn.fetch_many(
+                tuple[str, str, str],
+                "SELECT performer_raw, title_raw, observed_at FROM play ORDER BY play_id",
+            )
+
+    def test_backfill(self):
+        with utils.conn_db() as conn:
+            self.assertEqual(backfill.backfill(conn, workers=2), 2)
+        plays = self.plays()
+        self.assertEqual(plays[0][:2], ("TAYLOR SWIFT", "The Fate of Ophelia"))
+        self.assertEqual(plays[1][:2], ("SEKOU", "Catching Bodies"))
+        self.assertEqual(plays[2], ("Ed Sheeran", "Camera", "2026-01-01T11:58:00"))
+        self.assertEqual(plays[3][:2], ("X", "Y"))
+        with utils.conn_db() as conn:
+            # already done
+            self.assertEqual(backfill.backfill(conn, workers=2), 0)
+            self.assertEqual(backfill.backfill(conn, workers=2, restart=True), 0)
+
+    def test_rematch(self):
+        """A play with new raw strings loses its matches and is queued again,
+        a play with only a new time keeps them"""
+        with utils.conn_db() as conn:
+            song_id = conn.fetch_one(
+                int,
+                """INSERT INTO song (song_title, song_performers, song_key)
+                VALUES ('Wrong', 'Song', 'wrong|song') RETURNING song_id""",
+            )
+            play_ids = conn.fetch_many(int, "SELECT play_id FROM play ORDER BY play_id")
+            # the broken Taylor Swift play and the Ed Sheeran one, matched
+            for play_id in (play_ids[0], play_ids[2]):
+                conn.exec(
+                    """INSERT INTO match_candidate (play_id, song_id, candidate_score, method)
+                    VALUES (?, ?, 0.9, 'spotify')""",
+                    play_id,
+                    song_id,
+                )
+                conn.exec(
+                    "INSERT INTO play_resolution (play_id, song_id, status) VALUES (?, ?, 'auto')",
+                    play_id,
+                    song_id,
+                )
+            smatcher.remember_signatures(None, conn)
+            conn.exec("DELETE FROM match_queue")
+            self.assertEqual(backfill.backfill(conn, workers=1), 2)
+            self.assertEqual(conn.fetch_many(int, "SELECT play_id FROM match_queue"), play_ids[:1])
+            self.assertEqual(
+                conn.fetch_many(int, "SELECT play_id FROM match_candidate"), [play_ids[2]]
+            )
+            self.assertEqual(
+                conn.fetch_many(int, "SELECT play_id FROM play_resolution"), [play_ids[2]]
+            )
+            self.assertEqual(
+                conn.fetch_many(str, "SELECT signature FROM match_signature"),
+                [smatcher.signature("Camera", "Ed Sheeran")],
+            )
+
+    def test_resume(self):
+        """An interrupted backfill goes on from the last chunk written"""
+        write_chunk = backfill.write_chunk
+        calls = []
+
+        def failing_write_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            write_chunk(*args)
+
+        with (
+            utils.conn_db() as conn,
+            mock.patch("monitor.backfill.CHUNK", 1),
+            mock.patch("monitor.backfill.write_chunk", failing_write_chunk),
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            backfill.backfill(conn, ["m2o"], workers=1)
+        self.assertEqual(self.plays()[0][:2], ("TAYLOR SWIFT", "The Fate of Ophelia"))
+        self.assertEqual(self.plays()[2][:2], ("Ed Sheeran", "Camera"))
+        with utils.conn_db() as conn, mock.patch("monitor.backfill.CHUNK", 1):
+            self.assertEqual(backfill.backfill(conn, ["m2o", "rds"], workers=1), 1)
+            self.assertEqual(
+                conn.fetch_one(tuple[int, int], "SELECT last_play_id, updated FROM backfill_state"),
+                (4, 2),
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
+
+if __name__ == "__main__":
+    unittest.main()
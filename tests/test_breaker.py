@@ -0,0 +1,100 @@
+import asyncio
+import time
+import unittest
+from pathlib import Path
+from types import ModuleType
+
+from monitor import db_init, utils
+from monitor.radio import breaker, do
+
+
+def station(name: str, fetch) -> ModuleType:
+    module = ModuleType(f"monitor.radio.{name}")
+    module.fetch = fetch  # type: ignore
+    module.calls = 0  # type: ignore
+    return module
+
+
+class BreakerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_breaker.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_breaker.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def test_breaker(self):
+        b = breaker.Breaker("dj")
+        for _ in range(breaker.FAILURES - 1):
+            b.record("boom", 0)
+        self.assertEqual(b.state(0), "closed")
+        b.record("boom", 0)
+        self.assertEqual(b.state(0), "open")
+        self.assertFalse(b.allow(breaker.COOLDOWN - 1))
+        # half-open, the probe fails: open for longer
+        self.assertEqual(b.state(breaker.COOLDOWN), "half-open")
+        b.record("boom", breaker.COOLDOWN)
+        self.assertEqual(b.open_until, breaker.COOLDOWN * 3)
+        # the probe succeeds
+        b.record(None, breaker.COOLDOWN * 3)
+        self.assertEqual((b.state(0), b.failures, b.last_error), ("closed", 0, None))
+
+    def test_deadline(self):
+        """A hanging station does not stretch the cycle"""
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def ok():
+            return utils.RadioPlay("dj", "Performer", "Title")
+
+        slow, fast = station("slow", hang), station("fast", ok)
+        slow.DEADLINE = 0.1  # type: ignore
+        start = time.monotonic()
+        outcomes = asyncio.run(do.fetch_outcomes([slow, fast]))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual([o.error for o in outcomes], ["timeout", None])
+        self.assertEqual(outcomes[1].play.title, "Title")
+        self.assertEqual(do.deadline(slow, budget=0.05), 0.05)
+
+    def test_main_async(self):
+        """A failing station is skipped once the breaker is open, the state persists"""
+
+        async def fail():
+            failing.calls += 1
+            raise ValueError("down")
+
+        async def ok():
+            return utils.RadioPlay("dj", "Performer", "Title")
+
+        failing, working = station("failing", fail), station("working", ok)
+        try:
+            for _ in range(breaker.FAILURES + 2):
+                do.main_async([failing, working])
+            self.assertEqual(failing.calls, breaker.FAILURES)
+            with utils.conn_db() as conn:
+                breakers = breaker.load(["failing", "working"], conn)
+                self.assertEqual(breakers["failing"].failures, breaker.FAILURES)
+                self.assertEqual(breakers["failing"].last_error, "ValueError('down')")
+                self.assertEqual(breakers["failing"].state(time.time()), "open")
+                self.assertEqual(breakers["working"].state(time.time()), "closed")
+                self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM play"), 1)
+        finally:
+            with utils.conn_db() as conn:
+                conn.exec("DELETE FROM play")
+                conn.exec("DELETE FROM station_breaker")
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import asyncio
+import unittest
+
+from monitor import clients
+from monitor.radio import capital, m2o, r101, r105, virgin
+
+
+class ClientsTestCase(unittest.TestCase):
+    def test_pool_name(self):
+        self.assertEqual(clients.pool_name(capital.URL), "gedi")
+        self.assertEqual(clients.pool_name(m2o.URL), "gedi")
+        for module in (r101, r105, virgin):
+            self.assertEqual(clients.pool_name(module.URL), "mediaset")
+        self.assertEqual(clients.pool_name("https://example.com/"), "default")
+
+    def test_shared_client(self):
+        self.assertIs(clients.client(capital.URL), clients.client(m2o.URL))
+        self.assertIsNot(clients.client(capital.URL), clients.client(virgin.URL))
+
+    def test_async_pools(self):
+        async def run():
+            with self.assertRaises(RuntimeError):
+                clients.async_client(capital.URL)
+            async with clients.async_pools():
+                client = clients.async_client(capital.URL)
+                self.assertIs(client, clients.async_client(m2o.URL))
+
+                # tasks share the pools
+                async def lookup():
+                    return clients.async_client(virgin.URL)
+
+                task = asyncio.create_task(lookup())
+                self.assertIs(await task, clients.async_client(r101.URL))
+            self.assertTrue(client.is_closed)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
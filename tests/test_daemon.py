@@ -0,0 +1,187 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import ModuleType
+from unittest import mock
+
+from monitor import daemon, db_init, payloads, utils
+from monitor.radio import deejay
+
+
+def station(name: str, titles: list[str]) -> ModuleType:
+    """A station module on air with the titles, one per fetch, then the last one"""
+    module = ModuleType(f"monitor.radio.{name}")
+    module.fetches = 0  # type: ignore
+
+    async def fetch() -> utils.RadioPlay:
+        module.fetches += 1  # type: ignore
+        return utils.RadioPlay("dj", "Performer", titles[min(module.fetches, len(titles)) - 1])
+
+    module.fetch = fetch  # type: ignore
+    return module
+
+
+class DaemonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2026, 1, 1, 12, 0, 0).astimezone()
+        self.state = daemon.StationState(deejay)
+
+    def play(self, title: str, timestamp: datetime | None = None) -> utils.RadioPlay:
+        return utils.RadioPlay("dj", "Performer", title, timestamp)
+
+    def test_change_with_duration(self):
+        """Wait for the end of the song"""
+        started = self.now - timedelta(seconds=60)
+        self.assertTrue(self.state.update(self.play("A", started), self.now, 200))
+        self.assertEqual(self.state.next_interval(self.now, True), 140)
+
+    def test_change_without_duration(self):
+        """Unknown duration, use a typical one from the first observation"""
+        self.assertTrue(self.state.update(self.play("A"), self.now, None))
+        self.assertEqual(
+            self.state.next_interval(self.now, True),
+            min(daemon.TYPICAL_DURATION, daemon.MAX_INTERVAL),
+        )
+
+    def test_change_due(self):
+        """Near a change, poll often"""
+        started = self.now - timedelta(seconds=300)
+        self.assertTrue(self.state.update(self.play("A", started), self.now, 200))
+        self.assertEqual(self.state.next_interval(self.now, True), daemon.MIN_INTERVAL)
+
+    def test_back_off(self):
+        """Same metadata after the predicted end, back off"""
+        started = self.now - timedelta(seconds=300)
+        self.state.update(self.play("A", started), self.now, 200)
+        self.state.next_interval(self.now, True)
+        intervals = []
+        for _ in range(6):
+            self.assertFalse(self.state.update(self.play("A", started), self.now, 200))
+            intervals.append(self.state.next_interval(self.now, False))
+        self.assertEqual(intervals, sorted(intervals))
+        self.assertGreater(intervals[-1], daemon.MIN_INTERVAL)
+        self.assertEqual(intervals[-1], daemon.MAX_INTERVAL)
+        # a new song resets the interval
+        self.assertTrue(self.state.update(self.play("B"), self.now, 200))
+        self.assertEqual(self.state.next_interval(self.now, True), 200)
+
+    def test_overdue(self):
+        """The song goes on after the predicted end: poll soon, then less and less often"""
+        started = self.now - timedelta(seconds=5)
+        self.state.update(self.play("A", started), self.now, 200)
+        self.assertEqual(self.state.next_interval(self.now, True), 195)
+        later = self.now + timedelta(seconds=195)
+        self.assertFalse(self.state.update(self.play("A", started), later, 200))
+        self.assertEqual(self.state.next_interval(later, False), daemon.MIN_INTERVAL * 2)
+        self.assertEqual(self.state.next_interval(later, False), daemon.MIN_INTERVAL * 4)
+
+    def test_failed_poll(self):
+        """A failed poll is not a change"""
+        self.assertFalse(self.state.update(None, self.now, None))
+        self.assertGreater(self.state.next_interval(self.now, False), daemon.MIN_INTERVAL)
+
+
+class DaemonDbTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_daemon.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_daemon.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def tearDown(self):
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM play_resolution")
+            conn.exec("DELETE FROM song")
+            conn.exec("DELETE FROM play")
+
+    def resolve(self, title: str, status: str, conn) -> None:
+        """A play of the title, resolved to a song of 200 seconds"""
+        utils.insert_plays([utils.RadioPlay("dj", "Performer", title)], "test", conn)
+        song_id = conn.fetch_one(
+            int,
+            """INSERT INTO song (song_title, song_performers, song_key, duration)
+            VALUES (?1, 'Performer', ?1, 200) RETURNING song_id""",
+            title,
+        )
+        conn.exec(
+            """INSERT INTO play_resolution (play_id, song_id, status)
+            SELECT MAX(play_id), ?, ? FROM play""",
+            song_id,
+            status,
+        )
+
+    def test_find_duration(self):
+        """Only a decided resolution gives the duration"""
+        with utils.conn_db() as conn:
+            self.resolve("Known", "auto", conn)
+            self.resolve("Pending", "pending", conn)
+            self.assertEqual(daemon.find_duration(" Performer", "Known ", conn), 200)
+            self.assertIsNone(daemon.find_duration("Performer", "Pending", conn))
+            self.assertIsNone(daemon.find_duration("Performer", "Unknown", conn))
+
+    def test_poll(self):
+        """A change is returned with the duration of its song, the same song is not"""
+        module = station("stub", ["Known", "Known"])
+        state = daemon.StationState(module)
+
+        async def run() -> list[None | utils.RadioPlay]:
+            return [await daemon.poll(state, conn), await daemon.poll(state, conn)]
+
+        with utils.conn_db() as conn:
+            self.resolve("Known", "auto", conn)
+            first, second = asyncio.run(run())
+        self.assertEqual(first.title, "Known")
+        self.assertIsNone(second)
+        self.assertEqual((state.current, state.duration), (("Performer", "Known"), 200))
+        self.assertGreater(state.next_poll, 0)
+
+    def test_store(self):
+        """A failed insert is reported, the daemon goes on"""
+        play = utils.RadioPlay("dj", "Performer", "Stored")
+        with utils.conn_db() as conn:
+            with mock.patch.object(payloads, "store", side_effect=RuntimeError("disk full")):
+                daemon.store([play], "test", conn)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM play"), 0)
+            daemon.store([play], "test", conn)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM play"), 1)
+
+    def test_schedule(self):
+        """The due stations are polled and stored, the matcher is started once"""
+        states = [
+            daemon.StationState(station("one", ["A"])),
+            daemon.StationState(station("two", ["B"])),
+        ]
+
+        async def run() -> None:
+            try:
+                await asyncio.wait_for(daemon.schedule(states, conn), 0.5)
+            except TimeoutError:
+                pass
+
+        with utils.conn_db() as conn, mock.patch.object(daemon, "match") as match:
+            asyncio.run(run())
+            rows = conn.fetch_many(
+                tuple[str, str], "SELECT title_raw, acquisition_id FROM play ORDER BY title_raw"
+            )
+        self.assertEqual([title for title, _ in rows], ["A", "B"])
+        self.assertTrue(all(batch.startswith("daemon") for _, batch in rows))
+        # polled once, the next poll waits for the end of the song
+        self.assertEqual([state.module.fetches for state in states], [1, 1])
+        match.assert_called_once()
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
+
+if __name__ == "__main__":
+    unittest.main()
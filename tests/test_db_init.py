@@ -0,0 +1,91 @@
+import unittest
+from pathlib import Path
+
+from monitor import db_init, utils
+
+
+class DbInitTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_db_init.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_db_init.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def schema(self) -> set[tuple[str, str]]:
+        """Tables, columns and indexes"""
+        with utils.conn_db() as conn:
+            return set(
+                conn.fetch_many(
+                    tuple[str, str],
+                    """
+SELECT m.name, c.name
+FROM sqlite_master AS m
+JOIN pragma_table_xinfo(m.name) AS c
+WHERE m.type = 'table'
+UNION
+SELECT name, tbl_name FROM sqlite_master WHERE type IN ('index', 'trigger')""",
+                )
+            )
+
+    def test_migrate(self):
+        """A database created before the migrations gets the current schema"""
+        latest = db_init.migrations()[-1][0]
+        with utils.conn_db() as conn:
+            self.assertEqual(conn.fetch_one(int, "PRAGMA user_version"), latest)
+        current = self.schema()
+        Path("test_db_init.sqlite3").unlink()
+        with utils.conn_db() as conn:
+            for statem in db_init.read_statements(Path("fixtures/db_init_v0.sql")):
+                conn.exec(statem)
+            db_init.init_data(conn)
+            self.assertEqual(conn.fetch_one(int, "PRAGMA user_version"), 0)
+            play_id = conn.fetch_one(
+                int,
+                """INSERT INTO play (station_id, observed_at, title_raw, performer_raw)
+                VALUES (1, '2025-12-22T14:51:53Z', 't', 'p') RETURNING play_id""",
+            )
+        # again on the existing database
+        db_init.main()
+        with utils.conn_db() as conn:
+            self.assertEqual(conn.fetch_one(int, "PRAGMA user_version"), latest)
+            self.assertGreater(conn.fetch_one(int, "SELECT COUNT(*) FROM station"), 1)
+            # the plays to match are queued
+            self.assertEqual(conn.fetch_many(int, "SELECT play_id FROM match_queue"), [play_id])
+        self.assertEqual(self.schema(), current)
+
+    def test_epoch(self):
+        """The epoch columns follow the ISO timestamps and range scans use the indexes"""
+        with utils.conn_db() as conn:
+            try:
+                conn.exec(
+                    """INSERT INTO play (station_id, observed_at, title_raw, performer_raw)
+                    VALUES (1, '2025-12-22T14:51:53', 't', 'p')"""
+                )
+                self.assertEqual(
+                    conn.fetch_one(int, "SELECT observed_epoch FROM play"),
+                    conn.fetch_one(int, "SELECT unixepoch('2025-12-22 14:51:53')"),
+                )
+                plan = conn.fetch_many(
+                    ...,
+                    """EXPLAIN QUERY PLAN SELECT play_id FROM play
+                    WHERE station_id = 1 AND observed_epoch > 1766400000""",
+                )
+                self.assertIn("idx_play_station_observed_epoch", str(plan))
+            finally:
+                conn.exec("DELETE FROM play")
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
+
+if __name__ == "__main__":
+    unittest.main()
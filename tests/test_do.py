@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from monitor import utils
+from monitor.radio import do
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def test_no_env(self):
+        """The entry points import without SPOTIFY_AUTH and without the stations"""
+        env = {k: v for k, v in os.environ.items() if k != "SPOTIFY_AUTH"}
+        code = """
+import sys
+import monitor.do, monitor.daemon, monitor.smatcher, monitor.check_song
+from monitor.radio.do import STATIONS
+print([name for name in STATIONS if f"monitor.radio.{name}" in sys.modules])
+"""
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_stations(self):
+        modules = do.stations(["deejay", "rds"])
+        self.assertEqual(
+            [m.__name__ for m in modules], ["monitor.radio.deejay", "monitor.radio.rds"]
+        )
+        self.assertEqual(len(do.stations()), len(do.STATIONS))
+        with self.assertRaises(utils.RMError):
+            do.stations(["nope"])
+
+
+if __name__ == "__main__":
+    unittest.main()
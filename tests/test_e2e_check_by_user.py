@@ -7,7 +7,12 @@ from unittest.mock import MagicMock, patch
 
 import vcr
 from test_e2e_multiple_save import candidate_eqgr, check_one_tocheck, check_zero_tocheck
-from test_e2e_ok import basic_match_checks, empty_songs_checks, one_play_checks
+from test_e2e_ok import (
+    basic_match_checks,
+    empty_songs_checks,
+    one_play_checks,
+    private_token,
+)
 from test_e2e_solution import check_alias_created
 from vcr.record_mode import RecordMode
 
@@ -31,6 +36,7 @@ class E2ETestCaseCheckByUser(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path("test_e2e_check.sqlite3").unlink()
         except FileNotFoundError:
@@ -4,7 +4,12 @@ import unittest
 from pathlib import Path
 
 import vcr
-from test_e2e_ok import basic_match_checks, empty_songs_checks, one_play_checks
+from test_e2e_ok import (
+    basic_match_checks,
+    empty_songs_checks,
+    one_play_checks,
+    private_token,
+)
 from vcr.record_mode import RecordMode
 
 from monitor import db_init, smatcher, utils
@@ -14,6 +19,7 @@ class E2ETestCaseDuplicate(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path("test_e2e_dupe.sqlite3").unlink()
         except FileNotFoundError:
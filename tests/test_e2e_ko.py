@@ -1,19 +1,27 @@
 """Test no song found via spotify"""
 
+import time
 import unittest
 from pathlib import Path
+from unittest import mock
 
 import vcr
-from test_e2e_ok import basic_match_checks, empty_songs_checks, one_play_checks
+from test_e2e_ok import (
+    basic_match_checks,
+    empty_songs_checks,
+    one_play_checks,
+    private_token,
+)
 from vcr.record_mode import RecordMode
 
-from monitor import db_init, smatcher, utils
+from monitor import db_init, smatcher, spotify, utils
 
 
 class E2ETestCaseKO(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path("test_e2e_ko.sqlite3").unlink()
         except FileNotFoundError:
@@ -60,6 +68,103 @@ class E2ETestCaseKO(unittest.TestCase):
             for row in rows:
                 self.assertEqual(row[1], "TODO", "No new song rows should exists")
 
+    def test_3_miss(self):
+        """The play not found is skipped, until its backoff expires"""
+        with utils.conn_db() as conn:
+            misses, next_at = conn.fetch_one(
+                tuple[int, int], "SELECT misses, next_at FROM match_miss"
+            )
+            self.assertEqual(misses, 1)
+            self.assertGreater(next_at, time.time() + smatcher.MISS_BACKOFF - 60)
+            self.assertEqual(
+                conn.fetch_one(tuple[int, int], "SELECT due_at, attempts FROM match_queue"),
+                (next_at, 0),
+            )
+            self.assertEqual(smatcher.claim_plays("test", conn), [])
+            # a new play of the same song waits too
+            conn.exec(
+                """INSERT INTO play (station_id, observed_at, title_raw, performer_raw)
+                SELECT station_id, observed_at, title_raw, performer_raw FROM play"""
+            )
+            self.assertEqual(smatcher.claim_plays("test", conn), [])
+            self.assertEqual(
+                conn.fetch_many(int, "SELECT due_at FROM match_queue WHERE claim IS NULL"),
+                [next_at, next_at],
+            )
+            later = next_at + 1
+            with mock.patch.object(time, "time", return_value=later):
+                todos = smatcher.claim_plays("test", conn)
+                self.assertEqual(len(todos), 2)
+                # claimed, until the lease expires
+                self.assertEqual(smatcher.claim_plays("other", conn), [])
+                todo = todos[0]
+                smatcher.record_misses([t[1:] for t in todos], conn)
+            misses, next_at = conn.fetch_one(
+                tuple[int, int], "SELECT misses, next_at FROM match_miss"
+            )
+            self.assertEqual(misses, 2)
+            self.assertEqual(next_at, later + smatcher.MISS_BACKOFF * 2)
+            smatcher.clear_misses([todo[1:]], conn)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM match_miss"), 0)
+            smatcher.complete_plays([t[0] for t in todos], "test", conn)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM match_queue"), 0)
+            conn.exec("DELETE FROM play WHERE play_id > ?", todo[0])
+
+    def test_4_search_error(self):
+        """A failed search is no miss, the play is claimed again soon, without backoff"""
+        utils.insert_into_radio(
+            "dj", "lkjh98asdh", "qwpoeiru87 zxmcnv", utils.generate_batch("e2e_ko"), None, "{}"
+        )
+        with utils.conn_db() as conn:
+            error = spotify.SearchError("Spotify search failed: 503")
+            with (
+                mock.patch.object(spotify, "get_token", return_value="t"),
+                mock.patch.object(spotify, "search", side_effect=error) as search,
+            ):
+                smatcher.main()
+            search.assert_called()
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM match_miss"), 0)
+            play_id = conn.fetch_one(int, "SELECT MAX(play_id) FROM play")
+            self.assertEqual(
+                conn.fetch_one(
+                    int, "SELECT COUNT(*) FROM match_candidate WHERE play_id = ?", play_id
+                ),
+                0,
+            )
+            due_at, claim = conn.fetch_one(
+                tuple[int, None | str],
+                "SELECT due_at, claim FROM match_queue WHERE play_id = ?",
+                play_id,
+            )
+            self.assertIsNone(claim)
+            self.assertAlmostEqual(due_at, time.time() + smatcher.SEARCH_RETRY, delta=60)
+
+    def test_5_due_miss(self):
+        """A due miss is searched again on Spotify, the empty result is not cached"""
+        utils.insert_into_radio(
+            "dj", "poiu65mnbv", "zlkj43 wqeroiu", utils.generate_batch("e2e_ko"), None, "{}"
+        )
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM match_queue WHERE play_id != (SELECT MAX(play_id) FROM play)")
+            with (
+                mock.patch.object(spotify, "get_token", return_value="t"),
+                mock.patch.object(spotify, "search", return_value=[]) as search,
+            ):
+                smatcher.main()
+                self.assertEqual(search.call_count, 1)
+                # the backoff expires
+                conn.exec("UPDATE match_miss SET next_at = unixepoch()")
+                conn.exec("UPDATE match_queue SET due_at = unixepoch()")
+                smatcher.main()
+                self.assertEqual(search.call_count, 2)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM lookup_cache"), 0)
+            self.assertEqual(
+                conn.fetch_one(
+                    int, "SELECT misses FROM match_miss WHERE title_raw = 'zlkj43 wqeroiu'"
+                ),
+                2,
+            )
+
     @classmethod
     def tearDownClass(cls):
         utils.conn_db = cls.orig_db
@@ -5,7 +5,12 @@ from pathlib import Path
 
 import vcr
 from test_e2e_multiple_save import candidate_eqgr, check_one_tocheck, check_zero_tocheck
-from test_e2e_ok import basic_match_checks, empty_songs_checks, one_play_checks
+from test_e2e_ok import (
+    basic_match_checks,
+    empty_songs_checks,
+    one_play_checks,
+    private_token,
+)
 from test_e2e_solution import check_alias_created
 from vcr.record_mode import RecordMode
 
@@ -19,6 +24,7 @@ class E2ETestCaseManual(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path("test_e2e_manual.sqlite3").unlink()
         except FileNotFoundError:
@@ -5,7 +5,12 @@ from pathlib import Path
 
 import vcr
 from onlymaps import Database
-from test_e2e_ok import basic_match_checks, empty_songs_checks, one_play_checks
+from test_e2e_ok import (
+    basic_match_checks,
+    empty_songs_checks,
+    one_play_checks,
+    private_token,
+)
 from vcr.record_mode import RecordMode
 
 from monitor import check_song, db_init, smatcher, utils
@@ -48,6 +53,7 @@ class E2ETestCaseM2O(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path("test_e2e_m2o.sqlite3").unlink()
         except FileNotFoundError:
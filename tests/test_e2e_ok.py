@@ -1,16 +1,32 @@
 """Test to check happy path deejay+spotify"""
 
+import os
+import tempfile
 import unittest
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from unittest import mock
 
 import vcr
 from onlymaps import Database
 from vcr.record_mode import RecordMode
 
-from monitor import db_init, smatcher, utils
+from monitor import db_init, smatcher, spotify, utils
 from monitor.radio import deejay
 
 
+@contextmanager
+def private_token() -> Iterator[None]:
+    """The Spotify token of the cassettes stays out of the real token file"""
+    with (
+        tempfile.TemporaryDirectory() as tmp,
+        mock.patch.dict(os.environ, {"SPOTIFY_TOKEN_FILE": f"{tmp}/token"}),
+        mock.patch.dict(spotify._tokens, clear=True),
+    ):
+        yield
+
+
 def empty_songs_checks(self: unittest.TestCase, conn: Database):
     """Sanity check - empty tables"""
     rows = conn.fetch_many(..., "SELECT artist_id FROM artist")
@@ -171,6 +187,7 @@ class E2ETestCaseDJ(unittest.TestCase):
     def setUpClass(cls):
         db_path = "test_e2e.sqlite3"
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path(db_path).unlink()
         except FileNotFoundError:
@@ -2,12 +2,18 @@
 
 import unittest
 from pathlib import Path
+from unittest import mock
 
 import vcr
-from test_e2e_ok import basic_match_checks, empty_songs_checks, one_play_checks
+from test_e2e_ok import (
+    basic_match_checks,
+    empty_songs_checks,
+    one_play_checks,
+    private_token,
+)
 from vcr.record_mode import RecordMode
 
-from monitor import db_init, smatcher, utils
+from monitor import db_init, smatcher, spotify, utils
 from monitor.radio import deejay
 
 
@@ -15,6 +21,7 @@ class E2ETestCaseDJ(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path("test_e2e_ok_db.sqlite3").unlink()
         except FileNotFoundError:
@@ -66,6 +73,7 @@ class E2ETestCaseDJ(unittest.TestCase):
             self.assertEqual(status, "human")
             conn.exec("DELETE FROM match_candidate")
             conn.exec("DELETE FROM play_resolution")
+            conn.exec("DELETE FROM match_signature")
             # artist
             rows = conn.fetch_many(tuple[int, str], "SELECT artist_id, artist_name FROM artist")
             self.assertGreaterEqual(len(rows), 1, "Artist rows should persist")
@@ -92,6 +100,181 @@ class E2ETestCaseDJ(unittest.TestCase):
             status = basic_match_checks(self, conn)
             self.assertEqual(status, "auto")
 
+    def test_4_signature(self):
+        """Another play of the same raw strings is resolved without searching"""
+        with utils.conn_db() as conn:
+            song_id = conn.fetch_one(int, "SELECT song_id FROM play_resolution")
+            play_id = conn.fetch_one(
+                int,
+                """INSERT INTO play (station_id, observed_at, title_raw, performer_raw)
+                SELECT station_id, observed_at, upper(title_raw), '  ' || performer_raw
+                FROM play
+                RETURNING play_id""",
+            )
+            with (
+                mock.patch.object(smatcher, "db_find", side_effect=AssertionError),
+                mock.patch.object(spotify, "search", side_effect=AssertionError),
+            ):
+                smatcher.main()
+            self.assertEqual(
+                conn.fetch_one(
+                    tuple[int, str],
+                    "SELECT song_id, method FROM match_candidate WHERE play_id = ?",
+                    play_id,
+                ),
+                (song_id, "signature"),
+            )
+            self.assertEqual(
+                conn.fetch_one(
+                    tuple[int, str],
+                    "SELECT song_id, status FROM play_resolution WHERE play_id = ?",
+                    play_id,
+                ),
+                (song_id, "auto"),
+            )
+
+    def test_5_alias_index(self):
+        """Exact matches are found in memory, new songs are added to the index"""
+        with utils.conn_db() as conn:
+            song_id = conn.fetch_one(int, "SELECT song_id FROM play_resolution")
+            self.assertEqual(smatcher.db_find("When I Come Around", "GREEN DAY", conn)[0][1], 1)
+            with (
+                mock.patch.object(conn, "fetch_one", side_effect=AssertionError),
+                mock.patch.object(conn, "fetch_many", side_effect=AssertionError),
+            ):
+                self.assertEqual(
+                    smatcher.db_find(" when i come around", "Green Day ", conn), [(song_id, 1.0)]
+                )
+            song = smatcher.Song("Basket Case", "Green Day", ("Green Day",), None, 1994, "US", None)
+            play_id = conn.fetch_one(int, "SELECT MAX(play_id) FROM play")
+            smatcher.save_candidates({play_id: [smatcher.CandidateBySong(song, 0.5, "test")]}, conn)
+            new_id = conn.fetch_one(
+                int, "SELECT song_id FROM song WHERE song_key = ?", song.unique_key()
+            )
+            with mock.patch.object(conn, "fetch_many", side_effect=AssertionError):
+                self.assertEqual(
+                    smatcher.db_find("Basket Case", "Green Day", conn), [(new_id, 1.0)]
+                )
+            # non-Latin texts are left to FTS, their keys would collide
+            song = smatcher.Song("Кино", "Виктор Цой", ("Виктор Цой",), None, 1988, "SU", None)
+            smatcher.save_candidates({play_id: [smatcher.CandidateBySong(song, 0.5, "test")]}, conn)
+            self.assertEqual(smatcher.db_find("Ёлка", "Алла Пугачёва", conn), [])
+        # the index is kept by the process, a new connection loads only the new aliases
+        with (
+            utils.conn_db() as conn,
+            mock.patch.object(conn, "fetch_many", side_effect=AssertionError),
+        ):
+            self.assertEqual(smatcher.db_find("Basket Case", "Green Day", conn), [(new_id, 1.0)])
+
+    def test_6_bulk_save(self):
+        """A batch of plays is saved with a few statements"""
+        with utils.conn_db() as conn:
+            play_ids = [
+                conn.fetch_one(
+                    int,
+                    """INSERT INTO play (station_id, observed_at, title_raw, performer_raw)
+                    SELECT station_id, observed_at, ?, 'Bulk' FROM play LIMIT 1
+                    RETURNING play_id""",
+                    f"Bulk {i}",
+                )
+                for i in range(20)
+            ]
+            candidates: dict[int, smatcher.CandidateList] = {
+                play_id: [
+                    smatcher.CandidateBySong(
+                        smatcher.Song(
+                            f"Bulk {i}", "Bulk", ("Bulk", f"Feat {i % 3}"), None, None, None, None
+                        ),
+                        1,
+                        "test",
+                    )
+                ]
+                for i, play_id in enumerate(play_ids)
+            }
+            candidates[play_ids[0]] = [smatcher.CAND_TODO]
+            with (
+                mock.patch.object(conn, "exec", wraps=conn.exec) as execs,
+                mock.patch.object(conn, "fetch_many", wraps=conn.fetch_many) as fetches,
+            ):
+                smatcher.save_candidates(candidates, conn)
+                smatcher.save_resolution(candidates, conn)
+            self.assertLessEqual(execs.call_count + fetches.call_count, 12)
+            self.assertEqual(
+                conn.fetch_one(
+                    int,
+                    f"""SELECT COUNT(*) FROM match_candidate AS mc
+                    JOIN song AS s ON s.song_id = mc.song_id
+                    JOIN play AS p ON p.play_id = mc.play_id
+                    WHERE mc.play_id IN ({", ".join("?" * len(play_ids))})
+                        AND s.song_title = p.title_raw""",
+                    *play_ids,
+                ),
+                19,
+            )
+            self.assertEqual(
+                conn.fetch_many(
+                    tuple[str, int],
+                    """SELECT a.artist_name, COUNT(*) FROM song_artist AS sa
+                    JOIN artist AS a ON a.artist_id = sa.artist_id
+                    WHERE a.artist_name LIKE 'Feat %' OR a.artist_name = 'Bulk'
+                    GROUP BY a.artist_name ORDER BY a.artist_name""",
+                ),
+                [("Bulk", 19), ("Feat 0", 6), ("Feat 1", 7), ("Feat 2", 6)],
+            )
+            self.assertEqual(
+                conn.fetch_one(
+                    int,
+                    "SELECT COUNT(*) FROM play_resolution"
+                    f" WHERE status = 'auto' AND play_id IN ({', '.join('?' * len(play_ids))})",
+                    *play_ids,
+                ),
+                19,
+            )
+
+    def test_7_drain(self):
+        """The queue is matched by the worker processes, saved by this one"""
+        with utils.conn_db() as conn:
+            # the plays of the previous tests are saved directly, not from the queue
+            conn.exec("DELETE FROM match_queue")
+            play_ids = [
+                conn.fetch_one(
+                    int,
+                    """INSERT INTO play (station_id, observed_at, title_raw, performer_raw)
+                    SELECT station_id, observed_at, ?, ? FROM play LIMIT 1
+                    RETURNING play_id""",
+                    title,
+                    performer,
+                )
+                for title, performer in [
+                    ("basket case", "GREEN DAY"),
+                    ("When I Come Around", " green day"),
+                    ("Basket Case", ""),
+                ]
+            ]
+            with (
+                mock.patch.object(spotify, "search", side_effect=AssertionError),
+                mock.patch.object(smatcher, "claim_plays", wraps=smatcher.claim_plays) as claims,
+            ):
+                self.assertEqual(smatcher.drain(conn, workers=2, chunk=2), len(play_ids))
+            # the lease grows with the plays claimed ahead
+            leases = [call.args[3] for call in claims.call_args_list]
+            self.assertEqual(
+                leases,
+                [smatcher.LEASE + n * smatcher.MAX_QUERIES // spotify.RATE for n in (2, 4, 5)],
+            )
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM match_queue"), 0)
+            self.assertEqual(
+                conn.fetch_many(
+                    tuple[str, str],
+                    f"""SELECT s.song_title, pr.status FROM play_resolution AS pr
+                    JOIN song AS s ON s.song_id = pr.song_id
+                    WHERE pr.play_id IN ({", ".join("?" * len(play_ids))})
+                    ORDER BY pr.play_id""",
+                    *play_ids,
+                ),
+                [("Basket Case", "auto"), ("When I Come Around", "auto"), ("TODO", "pending")],
+            )
+
     @classmethod
     def tearDownClass(cls):
         utils.conn_db = cls.orig_db
@@ -6,7 +6,12 @@ from pathlib import Path
 import vcr
 from onlymaps import Database
 from test_e2e_multiple_save import candidate_eqgr, check_one_tocheck, check_zero_tocheck
-from test_e2e_ok import basic_match_checks, empty_songs_checks, one_play_checks
+from test_e2e_ok import (
+    basic_match_checks,
+    empty_songs_checks,
+    one_play_checks,
+    private_token,
+)
 from vcr.record_mode import RecordMode
 
 from monitor import check_song, db_init, smatcher, utils
@@ -31,6 +36,7 @@ class E2ETestCaseManual(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.orig_db = utils.conn_db
+        cls.enterClassContext(private_token())
         try:
             Path("test_e2e_solution.sqlite3").unlink()
         except FileNotFoundError:
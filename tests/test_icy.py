@@ -0,0 +1,154 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from monitor import clients, utils
+from monitor.radio import icy, virgin
+
+METAINT = 32
+
+
+def metadata_block(stream_title: str | None, encoding: str = "utf-8") -> bytes:
+    """Length byte and padded block, an empty block for None"""
+    if stream_title is None:
+        return b"\x00"
+    data = f"StreamTitle='{stream_title}';StreamUrl='';".encode(encoding)
+    length = -(-len(data) // 16)
+    return bytes([length]) + data.ljust(length * 16, b"\x00")
+
+
+class IcecastStub:
+    """A local Icecast server, sending the given titles then closing the stream"""
+
+    def __init__(self, titles: list[str | None], encoding: str = "utf-8"):
+        self.titles = titles
+        self.encoding = encoding
+        self.requests: list[bytes] = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.requests.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(
+            b"HTTP/1.0 200 OK\r\nContent-Type: audio/mpeg\r\n"
+            + f"icy-metaint: {METAINT}\r\n\r\n".encode()
+        )
+        for stream_title in self.titles:
+            writer.write(bytes(range(METAINT)))
+            writer.write(metadata_block(stream_title, self.encoding))
+            await writer.drain()
+        writer.write(bytes(METAINT // 2))
+        writer.close()
+
+    async def __aenter__(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/Virgin.mp3"
+
+    async def __aexit__(self, *exc) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class IcyTestCase(unittest.TestCase):
+    def test_parse_metadata(self):
+        self.assertEqual(
+            icy.parse_metadata(b"StreamTitle='Guns N' Roses - Patience';StreamUrl='';\x00\x00"),
+            {"StreamTitle": "Guns N' Roses - Patience", "StreamUrl": ""},
+        )
+        self.assertEqual(icy.parse_metadata(b"StreamTitle='Citt\xe0';"), {"StreamTitle": "Città"})
+        self.assertEqual(
+            icy.split_title("BLACK KEYS - MAN ON A MISSION"), ("BLACK KEYS", "MAN ON A MISSION")
+        )
+        self.assertEqual(icy.split_title("Virgin Radio"), ("", "Virgin Radio"))
+
+    def test_read_titles(self):
+        """Only the changes are reported"""
+        titles = ["A - 1", "A - 1", None, "B - 2", None, "B - 2", "C - 3"]
+
+        async def run():
+            async with IcecastStub(titles) as url, clients.async_pools():
+                return [title async for title, _ in icy.read_titles(url)]
+
+        self.assertEqual(asyncio.run(run()), ["A - 1", "B - 2", "C - 3"])
+
+    def test_latin1_payload(self):
+        """The stored payload of a Latin-1 stream parses again to the same title"""
+
+        async def run():
+            async with IcecastStub(["Vasco - Città"], "latin-1") as url, clients.async_pools():
+                return [t async for t in icy.read_titles(url)]
+
+        [(title, payload)] = asyncio.run(run())
+        self.assertEqual(title, "Vasco - Città")
+        self.assertEqual(payload, "StreamTitle='Vasco - Città';StreamUrl='';")
+        self.assertEqual(virgin.parse_payload(payload), ("Vasco", "Città", None))
+
+    def test_no_metaint(self):
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: audio/mpeg\r\n\r\n" + bytes(64))
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            host, port = server.sockets[0].getsockname()[:2]
+            async with server, clients.async_pools():
+                return [t async for t in icy.read_titles(f"http://{host}:{port}/")]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+
+    def test_listen(self):
+        """The station pushes a play on every change, asking for the metadata"""
+        plays: list[utils.RadioPlay] = []
+        stub = IcecastStub(["BLACK KEYS - MAN ON A MISSION", "ANNALISA - MON AMOUR"])
+
+        async def run():
+            async with stub as url, clients.async_pools():
+                done = asyncio.Event()
+
+                def on_play(play: utils.RadioPlay) -> None:
+                    plays.append(play)
+                    if len(plays) == 2:
+                        done.set()
+
+                task = asyncio.create_task(virgin.listen(on_play, url))
+                await asyncio.wait_for(done.wait(), 5)
+                task.cancel()
+
+        asyncio.run(run())
+        self.assertIn(b"icy-metadata: 1", stub.requests[0].lower())
+        self.assertEqual(
+            [(p.radio, p.performer, p.title) for p in plays],
+            [("vir", "BLACK KEYS", "MAN ON A MISSION"), ("vir", "ANNALISA", "MON AMOUR")],
+        )
+        self.assertEqual(
+            plays[0].payload, "StreamTitle='BLACK KEYS - MAN ON A MISSION';StreamUrl='';"
+        )
+
+    def test_listen_failure(self):
+        """An error of on_play does not stop the station, it reconnects"""
+        plays: list[utils.RadioPlay] = []
+        stub = IcecastStub(["BLACK KEYS - MAN ON A MISSION"])
+
+        async def run():
+            async with stub as url, clients.async_pools():
+                done = asyncio.Event()
+
+                def on_play(play: utils.RadioPlay) -> None:
+                    if len(stub.requests) == 1:
+                        raise RuntimeError("database is locked")
+                    plays.append(play)
+                    done.set()
+
+                task = asyncio.create_task(icy.listen(url, "vir", on_play))
+                await asyncio.wait_for(done.wait(), 5)
+                task.cancel()
+
+        with mock.patch.object(icy, "RECONNECT_MIN", 0):
+            asyncio.run(run())
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual([p.title for p in plays], ["MAN ON A MISSION"])
+
+
+if __name__ == "__main__":
+    unittest.main()
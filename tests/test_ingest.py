@@ -0,0 +1,113 @@
+import asyncio
+import os
+import queue
+import threading
+import unittest
+from pathlib import Path
+from types import ModuleType
+from unittest import mock
+
+import vcr
+from test_radio import merged_cassette
+from vcr.record_mode import RecordMode
+
+from monitor import clients, db_init, ingest, utils
+from monitor.radio import breaker
+
+
+class IngestTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_ingest.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_ingest.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def test_shard(self):
+        names = ["a", "b", "c", "d", "e"]
+        self.assertEqual(ingest.shard(names, 2), [["a", "c", "e"], ["b", "d"]])
+        self.assertEqual(ingest.shard(names[:1], 3), [["a"]])
+
+    def test_fetch_cycles(self):
+        """All the cycles of a fetcher share the event loop and the clients"""
+        seen = []
+
+        async def fetch():
+            seen.append((asyncio.get_running_loop(), clients.async_client("http://dj.test/")))
+            if len(seen) == 2:
+                stop.set()
+            return utils.RadioPlay("dj", "Performer", "Title")
+
+        module = ModuleType("monitor.radio.stub")
+        module.fetch = fetch  # type: ignore
+        messages = queue.Queue()
+        stop = threading.Event()
+        asyncio.run(
+            ingest.fetch_cycles([module], {"stub": breaker.Breaker("stub")}, messages, stop, 0)
+        )
+        self.assertEqual(len(seen), 2)
+        self.assertIs(seen[0][0], seen[1][0])
+        self.assertIs(seen[0][1], seen[1][1])
+        self.assertEqual(messages.qsize(), 2)
+
+    def test_run_once(self):
+        """Two fetchers, one cycle each, stored by the writer"""
+        my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
+        cassette = merged_cassette("fixtures/e2e_dj.yml", "fixtures/e2e_rds.yml")
+        try:
+            # the processes are forked inside the cassette, spawned ones would not see it
+            with (
+                my_vcr.use_cassette(cassette),  # type: ignore
+                mock.patch.object(ingest, "START_METHOD", "fork"),
+            ):
+                ingest.run(["deejay", "rds"], shards=2, once=True)
+        finally:
+            Path(cassette).unlink()
+        with utils.conn_db() as conn:
+            try:
+                rows = conn.fetch_many(
+                    tuple[str, str, str],
+                    """SELECT s.station_code, p.title_raw, p.acquisition_id
+                    FROM play p JOIN station s ON s.station_id = p.station_id
+                    ORDER BY s.station_code""",
+                )
+                self.assertEqual(
+                    [r[:2] for r in rows], [("dj", "When I Come Around"), ("rds", "Camera")]
+                )
+                self.assertTrue(all(r[2].startswith("ingest_") for r in rows))
+                self.assertEqual(
+                    conn.fetch_many(
+                        tuple[str, int],
+                        "SELECT station, failures FROM station_breaker ORDER BY station",
+                    ),
+                    [("deejay", 0), ("rds", 0)],
+                )
+            finally:
+                conn.exec("DELETE FROM play")
+                conn.exec("DELETE FROM station_breaker")
+
+    def test_dead_fetcher(self):
+        """A fetcher killed before its last message does not keep the writer waiting"""
+        with (
+            mock.patch.object(ingest, "START_METHOD", "fork"),
+            mock.patch.object(ingest, "fetcher", lambda *args: os._exit(1)),
+        ):
+            # returns, the writer is told by this process
+            ingest.run(["deejay", "rds"], shards=2, once=True)
+        with utils.conn_db() as conn:
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM play"), 0)
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from monitor import db_init, lookup_cache, spotify, utils
+
+SONG = spotify.SpSong(
+    title="Synchronicity II",
+    s_performers="The Police",
+    l_performers=("The Police",),
+    isrc="GBAAM8300001",
+    year=1983,
+    country="GB",
+    score=0,
+    duration=300,
+)
+
+
+class LookupCacheTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_lookup_cache.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_lookup_cache.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def tearDown(self):
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM lookup_cache")
+
+    def test_round_trip(self):
+        """Songs are cached without the score, it is computed again for the play"""
+        query = spotify.search_query("Synchronicity II", "The Police")
+        with utils.conn_db() as conn:
+            with lookup_cache.cached("spotify", [query], conn) as lookups:
+                self.assertIsNone(lookups.get(query))
+                with mock.patch.object(spotify, "search", return_value=[SONG]) as search:
+                    releases = spotify.find_releases("Synchronicity II", "The Police", "", lookups)
+                search.assert_called_once()
+            self.assertAlmostEqual(releases[0].score, 1)
+            with lookup_cache.cached("spotify", [query], conn) as lookups:
+                with mock.patch.object(spotify.clients, "get") as get:
+                    releases = spotify.find_releases(
+                        "Synchronicity II (Remastered)", "The Police", "", lookups
+                    )
+                get.assert_not_called()
+            self.assertEqual(releases[0].l_performers, SONG.l_performers)
+            self.assertLess(releases[0].score, 1)
+            # other providers are not mixed
+            self.assertIsNone(lookup_cache.load("musicbrainz", [query], conn).get(query))
+
+    def test_ttl(self):
+        with utils.conn_db() as conn:
+            lookup_cache.save("spotify", {"q": []}, conn)
+            self.assertEqual(lookup_cache.load("spotify", ["q"], conn).get("q"), [])
+            with mock.patch.object(time, "time", return_value=time.time() + lookup_cache.TTL + 1):
+                self.assertIsNone(lookup_cache.load("spotify", ["q"], conn).get("q"))
+
+    def test_eviction(self):
+        """The least recently used entries go first"""
+        with utils.conn_db() as conn:
+            now = time.time()
+            for i, query in enumerate(["a", "b", "c"]):
+                with mock.patch.object(time, "time", return_value=now + i):
+                    lookup_cache.save("spotify", {query: []}, conn)
+            with mock.patch.object(time, "time", return_value=now + 3):
+                lookup_cache.load("spotify", ["a"], conn)
+                lookup_cache.save("spotify", {"d": []}, conn, max_entries=3)
+            self.assertEqual(
+                conn.fetch_many(str, "SELECT query FROM lookup_cache ORDER BY query"),
+                ["a", "c", "d"],
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
+
+if __name__ == "__main__":
+    unittest.main()
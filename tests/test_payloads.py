@@ -0,0 +1,117 @@
+import json
+import unittest
+import zlib
+from pathlib import Path
+
+from monitor import db_init, payloads, utils
+
+
+def payload(n: int) -> str:
+    return json.dumps(
+        {
+            "status": "ok",
+            "player": {"name": "RDS 100% grandi successi", "stream": "https://example.com/live"},
+            "song": {"title": f"Title {n}", "artist": f"Artist {n % 3}", "cover": f"img{n}.jpg"},
+            "next": [{"title": f"Next {n + i}", "artist": "Someone"} for i in range(3)],
+        }
+    )
+
+
+class PayloadsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_payloads.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_payloads.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def tearDown(self):
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM play")
+            conn.exec("DELETE FROM payload")
+            conn.exec("DELETE FROM payload_dict")
+
+    def test_roundtrip(self):
+        zdict = payloads.train([payload(n) for n in range(20)])
+        self.assertLessEqual(len(zdict), payloads.ZDICT_SIZE)
+        data = payloads.compress(payload(100), zdict)
+        self.assertEqual(payloads.decompress(data, zdict), payload(100))
+        # the dictionary pays off
+        self.assertLess(len(data), len(zlib.compress(payload(100).encode(), 9)) / 2)
+        self.assertEqual(payloads.decompress(payloads.compress("x", None), None), "x")
+
+    def test_store(self):
+        """Same content stored once, a dictionary after TRAIN_SAMPLES payloads"""
+        with utils.conn_db() as conn:
+            station_id = conn.fetch_one(
+                int, "SELECT station_id FROM station WHERE station_code = 'rds'"
+            )
+            ids = payloads.store(
+                [(station_id, payload(0)), (station_id, ""), (station_id, payload(0))], conn
+            )
+            self.assertIsNotNone(ids[0])
+            self.assertEqual(ids, [ids[0], None, ids[0]])
+            ids = payloads.store(
+                [(station_id, payload(n)) for n in range(payloads.TRAIN_SAMPLES)], conn
+            )
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM payload_dict"), 0)
+            ids = payloads.store([(station_id, payload(100))], conn)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(*) FROM payload_dict"), 1)
+            self.assertIsNotNone(
+                conn.fetch_one(int, "SELECT dict_id FROM payload WHERE payload_id = ?", ids[0])
+            )
+
+    def test_insert_and_load(self):
+        with utils.conn_db() as conn:
+            utils.insert_plays(
+                [
+                    utils.RadioPlay("rds", f"Artist {n}", f"Title {n}", None, payload(n))
+                    for n in range(40)
+                ],
+                "test_payloads",
+                conn,
+            )
+            rows = conn.fetch_many(
+                tuple[int, str], "SELECT play_id, title_raw FROM play ORDER BY play_id"
+            )
+            self.assertEqual(len(rows), 40)
+            for n, (play_id, title) in enumerate(rows):
+                self.assertEqual(title, f"Title {n}")
+                self.assertEqual(payloads.load(play_id, conn), payload(n))
+            self.assertIsNone(payloads.load(-1, conn))
+
+    def test_compact(self):
+        """Legacy payloads are moved out of play"""
+        with utils.conn_db() as conn:
+            for n in range(30):
+                conn.exec(
+                    """INSERT INTO play (
+                        station_id, observed_at, title_raw, performer_raw, source_payload
+                    ) VALUES (
+                        (SELECT station_id FROM station WHERE station_code = 'dj'), ?, ?, 'P', ?
+                    )""",
+                    f"2026-01-01T00:{n:02}:00",
+                    f"Title {n}",
+                    payload(n),
+                )
+            self.assertEqual(payloads.compact(conn, batch=7), 30)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(source_payload) FROM play"), 0)
+            self.assertEqual(conn.fetch_one(int, "SELECT COUNT(DISTINCT payload_id) FROM play"), 30)
+            play_id = conn.fetch_one(int, "SELECT play_id FROM play WHERE title_raw = 'Title 29'")
+            self.assertEqual(payloads.load(play_id, conn), payload(29))
+            self.assertEqual(payloads.compact(conn), 0)
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
+
+if __name__ == "__main__":
+    unittest.main()
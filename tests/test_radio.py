@@ -1,12 +1,26 @@
+import asyncio
+import tempfile
 import unittest
 from pathlib import Path
 
 import vcr
+import yaml
 from test_e2e_ok import one_play_checks
 from vcr.record_mode import RecordMode
 
-from monitor import db_init, utils
-from monitor.radio import capital, deejay, m2o, r101, r105, rds, virgin
+from monitor import db_init, payloads, utils
+from monitor.radio import capital, deejay, do, freccia, m2o, r101, r105, rds, rtl, virgin
+
+
+def merged_cassette(*paths: str) -> str:
+    """Write a temporary cassette with the interactions of all the given ones"""
+    interactions = []
+    for path in paths:
+        with Path(path).open("rt") as fi:
+            interactions += yaml.safe_load(fi)["interactions"]
+    with tempfile.NamedTemporaryFile("wt", suffix=".yml", delete=False) as fo:
+        yaml.safe_dump({"interactions": interactions, "version": 1}, fo)
+    return fo.name
 
 
 class RadiosTestCaseDJ(unittest.TestCase):
@@ -167,6 +181,42 @@ class RadiosTestCaseDJ(unittest.TestCase):
                 # Clean up
                 conn.exec("DELETE FROM play")
 
+    def test_rtl(self):
+        """Insert a know song, read from the ID3 tag of the HLS segment"""
+        my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
+        acquisition_id = utils.generate_batch("e2e_rtl")
+        with my_vcr.use_cassette("fixtures/e2e_rtl.yml"):  # type: ignore
+            rtl.main(acquisition_id)
+        with utils.conn_db() as conn:
+            station_name, title, performer, db_acquisition_id, _ = one_play_checks(self, conn)
+            try:
+                self.assertEqual(station_name, "rtl")
+                self.assertEqual(title, "Viva La Vida")
+                self.assertEqual(performer, "Coldplay")
+                self.assertEqual(db_acquisition_id, acquisition_id)
+                payload = payloads.load(conn.fetch_one(int, "SELECT play_id FROM play"), conn)
+                self.assertEqual(rtl.parse_probe(payload), ("Coldplay", "Viva La Vida", payload))
+            finally:
+                # Clean up
+                conn.exec("DELETE FROM play")
+
+    def test_freccia(self):
+        """Insert a know song, the match in db"""
+        my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
+        acquisition_id = utils.generate_batch("e2e_freccia")
+        with my_vcr.use_cassette("fixtures/e2e_freccia.yml"):  # type: ignore
+            freccia.main(acquisition_id)
+        with utils.conn_db() as conn:
+            station_name, title, performer, db_acquisition_id, _ = one_play_checks(self, conn)
+            try:
+                self.assertEqual(station_name, "freccia")
+                self.assertEqual(title, "Everlong")
+                self.assertEqual(performer, "Foo Fighters")
+                self.assertEqual(db_acquisition_id, acquisition_id)
+            finally:
+                # Clean up
+                conn.exec("DELETE FROM play")
+
     def test_double_dj(self):
         """Insert a know song, the match in db"""
         my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
@@ -187,6 +237,34 @@ class RadiosTestCaseDJ(unittest.TestCase):
             # Clean up
             conn.exec("DELETE FROM play")
 
+    def test_fetch_all(self):
+        """Fetch all stations concurrently, then insert with one acquisition_id"""
+        my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
+        cassette = merged_cassette("fixtures/e2e_dj.yml", "fixtures/e2e_rds.yml")
+        try:
+            with my_vcr.use_cassette(cassette):  # type: ignore
+                plays = asyncio.run(do.fetch_all([deejay, rds]))
+            self.assertEqual(
+                [(p.radio, p.title) for p in plays],
+                [("dj", "When I Come Around"), ("rds", "Camera")],
+            )
+            with my_vcr.use_cassette(cassette):  # type: ignore
+                do.main_async([deejay, rds])
+        finally:
+            Path(cassette).unlink()
+        with utils.conn_db() as conn:
+            try:
+                rows = conn.fetch_many(
+                    tuple[str, str],
+                    """SELECT s.station_code, p.acquisition_id
+                    FROM play p JOIN station s ON s.station_id = p.station_id""",
+                )
+                self.assertEqual(sorted(r[0] for r in rows), ["dj", "rds"])
+                self.assertEqual(len({r[1] for r in rows}), 1, "Same acquisition_id expected")
+            finally:
+                # Clean up
+                conn.exec("DELETE FROM play")
+
     @classmethod
     def tearDownClass(cls):
         utils.conn_db = cls.orig_db
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import subprocess
+import unittest
+from unittest import mock
+
+import vcr
+from vcr.record_mode import RecordMode
+
+from monitor import clients, utils
+from monitor.radio import rtl
+
+TEXT = json.dumps(
+    {"songInfo": {"present": {"class": "Music", "mus_art_name": "A", "mus_sng_title": "T"}}}
+)
+
+
+def frame(frame_id: str, data: bytes, version: int) -> bytes:
+    size = len(data)
+    if version == 4:
+        size = (
+            (size >> 21 & 0x7F) << 24
+            | (size >> 14 & 0x7F) << 16
+            | (size >> 7 & 0x7F) << 8
+            | size & 0x7F
+        )
+    return frame_id.encode() + size.to_bytes(4) + b"\x00\x00" + data
+
+
+def tag(frames: bytes, version: int, flags: int = 0) -> bytes:
+    size = len(frames)
+    syncsafe = bytes([size >> 21 & 0x7F, size >> 14 & 0x7F, size >> 7 & 0x7F, size & 0x7F])
+    return b"ID3" + bytes([version, 0, flags]) + syncsafe + frames
+
+
+class ID3TestCase(unittest.TestCase):
+    def test_v24_utf8(self):
+        data = tag(
+            frame("PRIV", b"owner\x00" + bytes(8), 4) + frame("TEXT", b"\x03" + TEXT.encode(), 4), 4
+        )
+        self.assertEqual(rtl.id3_size(data), len(data))
+        self.assertEqual(rtl.parse_id3(data + b"\xff\xf1"), {"TEXT": TEXT})
+
+    def test_v23_utf16(self):
+        data = tag(frame("TIT2", b"\x01" + "Tìtle".encode("utf-16") + b"\x00\x00", 3), 3)
+        self.assertEqual(rtl.parse_id3(data), {"TIT2": "Tìtle"})
+
+    def test_padding_and_truncated(self):
+        data = tag(frame("TEXT", b"\x00abc", 4) + bytes(20), 4)
+        self.assertEqual(rtl.parse_id3(data), {"TEXT": "abc"})
+        self.assertEqual(rtl.parse_id3(data[:15]), {})
+        self.assertEqual(rtl.parse_id3(b"\xff\xf1\x50\x80"), {})
+        self.assertEqual(rtl.id3_size(b"\xff\xf1\x50\x80"), 0)
+
+    def test_next_uri(self):
+        base = "https://example.com/live/playlist.m3u8"
+        master = "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=128000\nchunklist.m3u8\n"
+        self.assertEqual(
+            rtl.next_uri(master, base), ("https://example.com/live/chunklist.m3u8", True)
+        )
+        media = "#EXTM3U\n#EXTINF:10.0,\nmedia_1.aac\n#EXTINF:10.0,\nmedia_2.aac\n"
+        self.assertEqual(rtl.next_uri(media, base), ("https://example.com/live/media_2.aac", False))
+        with self.assertRaises(utils.RMError):
+            rtl.next_uri("#EXTM3U\n", base)
+
+    def test_fetch(self):
+        """Async path, no subprocess"""
+        my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
+
+        async def run():
+            async with clients.async_pools():
+                return await rtl.fetch()
+
+        with (
+            my_vcr.use_cassette("fixtures/e2e_rtl.yml"),  # type: ignore
+            mock.patch("asyncio.create_subprocess_exec") as create,
+        ):
+            play = asyncio.run(run())
+        create.assert_not_called()
+        self.assertEqual(
+            (play.radio, play.performer, play.title), ("rtl", "Coldplay", "Viva La Vida")
+        )
+
+    def test_no_id3(self):
+        """Without the tag ffprobe is needed"""
+        with (
+            mock.patch("monitor.radio.rtl.read_id3", return_value=None),
+            mock.patch("monitor.radio.rtl.shutil.which", return_value=None),
+            vcr.VCR(record_mode=RecordMode.NONE).use_cassette("fixtures/e2e_rtl.yml"),  # type: ignore
+            self.assertRaises(utils.RMError),
+        ):
+            rtl.parse(rtl.URL)
+
+    def test_ffprobe_timeout(self):
+        """ffprobe does not outlive the deadline, on both paths"""
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        proc = mock.Mock()
+        proc.communicate = mock.AsyncMock(side_effect=hang)
+        proc.wait = mock.AsyncMock(return_value=-9)
+
+        async def run():
+            async with clients.async_pools(), asyncio.timeout(0.1):
+                await rtl.aparse(rtl.URL)
+
+        timeout = subprocess.TimeoutExpired("ffprobe", rtl.DEADLINE)
+        with (
+            mock.patch("monitor.radio.rtl.read_id3", return_value=None),
+            mock.patch("monitor.radio.rtl.aread_id3", return_value=None),
+            mock.patch("monitor.radio.rtl.shutil.which", return_value="/usr/bin/ffprobe"),
+            mock.patch("asyncio.create_subprocess_exec", return_value=proc),
+            mock.patch("monitor.radio.rtl.subprocess.run", side_effect=timeout) as run_sync,
+            vcr.VCR(record_mode=RecordMode.NONE).use_cassette(
+                "fixtures/e2e_rtl.yml", allow_playback_repeats=True
+            ),  # type: ignore
+        ):
+            with self.assertRaises(TimeoutError):
+                asyncio.run(run())
+            with self.assertRaises(subprocess.TimeoutExpired):
+                rtl.parse(rtl.URL)
+        proc.kill.assert_called_once()
+        proc.wait.assert_awaited_once()
+        self.assertEqual(run_sync.call_args.kwargs["timeout"], rtl.DEADLINE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,25 @@
+import os
+import tempfile
+import time
 import unittest
+from unittest import mock
 
+import httpx
 import vcr
 from vcr.record_mode import RecordMode
 
-from monitor import spotify
+from monitor import spotify, utils
 
 
 class SpotifyTestCase(unittest.TestCase):
     def test_find_releases(self):
         my_vcr = vcr.VCR(record_mode=RecordMode.NONE)
-        with my_vcr.use_cassette("fixtures/sp_fd_police.yml", filter_headers=["Authorization"]):  # type: ignore
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.dict(os.environ, {"SPOTIFY_TOKEN_FILE": f"{tmp}/token"}),
+            mock.patch.dict(spotify._tokens, clear=True),
+            my_vcr.use_cassette("fixtures/sp_fd_police.yml", filter_headers=["Authorization"]),  # type: ignore
+        ):
             token = spotify.get_token()
             releases = spotify.find_releases("Synchronicity II", "The Police", token)
         self.assertGreaterEqual(len(releases), 1)
@@ -23,6 +33,111 @@ class SpotifyTestCase(unittest.TestCase):
         self.assertAlmostEqual(release.score, 1)
         self.assertEqual(release.duration, 300)
 
+    def test_no_auth(self):
+        """The credentials are read when the token is needed"""
+        with (
+            mock.patch.dict(os.environ, {"SPOTIFY_AUTH": ""}),
+            self.assertRaises(utils.RMError),
+        ):
+            spotify.get_token()
+
+    def test_shared_token(self):
+        """A token is requested once, shared by the processes, renewed before it expires"""
+        request = httpx.Request("POST", spotify.TOKEN_URL)
+        responses = [
+            httpx.Response(200, json={"access_token": f"t{i}", "expires_in": 3600}, request=request)
+            for i in range(2)
+        ]
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.dict(
+                os.environ, {"SPOTIFY_AUTH": "id:secret", "SPOTIFY_TOKEN_FILE": f"{tmp}/token"}
+            ),
+            mock.patch.dict(spotify._tokens, clear=True),
+            mock.patch.object(spotify.clients, "post", side_effect=responses) as post,
+        ):
+            self.assertEqual(spotify.get_token(), "t0")
+            self.assertEqual(spotify.get_token(), "t0")
+            # another process
+            spotify._tokens.clear()
+            self.assertEqual(spotify.get_token(), "t0")
+            self.assertEqual(post.call_count, 1)
+            later = time.time() + 3600 - spotify.TOKEN_MARGIN + 1
+            with mock.patch.object(time, "time", return_value=later):
+                self.assertEqual(spotify.get_token(), "t1")
+            self.assertEqual(post.call_count, 2)
+
+    def test_refused_token(self):
+        """A token refused with 401 is dropped, the search is sent again with a new one"""
+        request = httpx.Request("GET", spotify.SEARCH_URL)
+        token_request = httpx.Request("POST", spotify.TOKEN_URL)
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            mock.patch.dict(
+                os.environ, {"SPOTIFY_AUTH": "id:secret", "SPOTIFY_TOKEN_FILE": f"{tmp}/token"}
+            ),
+            mock.patch.dict(spotify._tokens, clear=True),
+            mock.patch.object(
+                spotify.clients,
+                "post",
+                side_effect=[
+                    httpx.Response(
+                        200,
+                        json={"access_token": f"t{i}", "expires_in": 3600},
+                        request=token_request,
+                    )
+                    for i in range(2)
+                ],
+            ),
+            mock.patch.object(
+                spotify.clients,
+                "get",
+                side_effect=[
+                    httpx.Response(401, request=request),
+                    httpx.Response(200, json={"tracks": {"items": []}}, request=request),
+                ],
+            ) as get,
+        ):
+            self.assertEqual(spotify.search("query", spotify.get_token()), [])
+            self.assertEqual(
+                [c.kwargs["headers"]["Authorization"] for c in get.call_args_list],
+                ["Bearer t0", "Bearer t1"],
+            )
+            # the new token is shared
+            spotify._tokens.clear()
+            self.assertEqual(spotify.get_token(), "t1")
+
+    def test_token_bucket(self):
+        """The burst goes at once, then the rate"""
+        bucket = spotify.TokenBucket(rate=50, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.02)
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.08)
+        bucket.pause(0.1)
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_retry_after(self):
+        """A 429 stops the searches for Retry-After seconds, then the search is retried"""
+        request = httpx.Request("GET", spotify.SEARCH_URL)
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "0.1"}, request=request),
+            httpx.Response(200, json={"tracks": {"items": []}}, request=request),
+        ]
+        with (
+            mock.patch.object(spotify, "limiter", spotify.TokenBucket(100, 1)),
+            mock.patch.object(spotify.clients, "get", side_effect=responses) as get,
+        ):
+            start = time.monotonic()
+            self.assertEqual(spotify.find_releases("Title", "Artist", "token"), [])
+            self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertEqual(get.call_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
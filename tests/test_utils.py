@@ -1,8 +1,11 @@
 import secrets
 import string
 import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-from monitor import utils
+from monitor import db_init, payloads, utils
 
 
 def _random_ascii_alnum(length: int) -> str:
@@ -109,6 +112,137 @@ class UtilTestCase(unittest.TestCase):
             "Waterfall",
         )
 
+    def test_exact_key(self):
+        self.assertEqual(utils.exact_key(" Beyoncé ", "JAY-Z"), ("beyonce", "jay-z"))
+        self.assertIsNone(utils.exact_key("Кино", "Виктор Цой"))
+        self.assertIsNone(utils.exact_key("Кино 2", "DJ"))
+        self.assertIsNone(utils.exact_key("Title", " "))
+
+    def test_calc_score_many(self):
+        query = ("Bonnie and Clyde", "JAY-Z")
+        candidates = [
+            ("Bonnie & Clyde", "JAY-Z, Beyoncé"),
+            ("'03 Bonnie & Clyde", "Jay-Z"),
+            ("Waterfall", "TLC"),
+            ("", ""),
+        ]
+        self.assertEqual(
+            utils.calc_score_many(query, candidates),
+            [utils.calc_score(*query, *c) for c in candidates],
+        )
+        self.assertEqual(
+            utils.calc_score_many(query, candidates, reverse=True),
+            [utils.calc_score(*c, *query) for c in candidates],
+        )
+        self.assertEqual(utils.calc_score_many(query, []), [])
+
+
+class InsertTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.orig_db = utils.conn_db
+        try:
+            Path("test_utils.sqlite3").unlink()
+        except FileNotFoundError:
+            pass
+
+        def test_conn_db(path=""):
+            return cls.orig_db("test_utils.sqlite3")
+
+        utils.conn_db = test_conn_db
+        db_init.main()
+
+    def count_plays(self) -> int:
+        with utils.conn_db() as conn:
+            return conn.fetch_one(int, "SELECT COUNT(*) FROM play")
+
+    def test_duplicates(self):
+        now = datetime(2026, 1, 1, 12, 0, 0)
+        try:
+            utils.insert_into_radio("dj", "Performer", "A", "test", now)
+            utils.insert_into_radio("dj", "Performer", "A", "test", now + timedelta(minutes=1))
+            self.assertEqual(self.count_plays(), 1, "Same song as last time")
+            utils.insert_into_radio("rds", "Performer", "A", "test", now)
+            utils.insert_into_radio("dj", "Performer", "B", "test", now + timedelta(minutes=4))
+            utils.insert_into_radio("dj", "Performer", "C", "test", now + timedelta(minutes=8))
+            self.assertEqual(self.count_plays(), 4)
+            utils.insert_into_radio("dj", "Performer", "A", "test", now + timedelta(minutes=9))
+            self.assertEqual(self.count_plays(), 5, "Not one of the last two plays")
+            # older than the last plays
+            utils.insert_into_radio("dj", "Performer", "A", "test", now - timedelta(minutes=1))
+            self.assertEqual(self.count_plays(), 5, "Near the first play")
+            utils.insert_into_radio("dj", "Performer", "D", "test", now + timedelta(minutes=6))
+            self.assertEqual(self.count_plays(), 6)
+        finally:
+            with utils.conn_db() as conn:
+                conn.exec("DELETE FROM play")
+
+    def test_external_changes(self):
+        now = datetime(2026, 1, 1, 12, 0, 0)
+        utils.insert_into_radio("dj", "Performer", "A", "test", now)
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM play")
+        utils.insert_into_radio("dj", "Performer", "A", "test", now)
+        self.assertEqual(self.count_plays(), 1, "Deleted play is not a duplicate")
+        with utils.conn_db() as conn:
+            conn.exec(
+                """INSERT INTO play (station_id, observed_at, title_raw, performer_raw)
+                VALUES ((SELECT station_id FROM station WHERE station_code = 'dj'), ?, ?, ?)""",
+                (now + timedelta(minutes=4)).isoformat(),
+                "B",
+                "Performer",
+            )
+        utils.insert_into_radio("dj", "Performer", "B", "test", now + timedelta(minutes=5))
+        self.assertEqual(self.count_plays(), 2, "Play inserted by others is a duplicate")
+        with utils.conn_db() as conn:
+            conn.exec("DELETE FROM play")
+
+    def test_insert_plays(self):
+        now = datetime(2026, 1, 1, 12, 0, 0)
+        plays = [
+            utils.RadioPlay("dj", "Performer", "A", now),
+            utils.RadioPlay("rds", "Performer", "A", now, "{}"),
+            utils.RadioPlay("dj", "Performer", "A", now + timedelta(minutes=1)),
+            utils.RadioPlay("dj", "Performer", "B", now + timedelta(minutes=4)),
+            utils.RadioPlay("vir", "", "", now),
+            utils.RadioPlay("xxx", "Performer", "A", now),
+        ]
+        try:
+            with utils.conn_db() as conn:
+                inserted = utils.insert_plays(plays, "test_batch", conn)
+                self.assertEqual(inserted, [plays[0], plays[1], plays[3]])
+                rows = conn.fetch_many(tuple[int, str], "SELECT play_id, acquisition_id FROM play")
+                self.assertEqual({row[1] for row in rows}, {"test_batch"})
+                self.assertEqual(
+                    [payloads.load(play_id, conn) for play_id, _ in rows], [None, "{}", None]
+                )
+                # again, all duplicates
+                self.assertEqual(utils.insert_plays(plays, "test_batch", conn), [])
+            self.assertEqual(self.count_plays(), 3)
+        finally:
+            with utils.conn_db() as conn:
+                conn.exec("DELETE FROM play")
+
+    def test_rollback(self):
+        """The plays of a failed transaction are not duplicates of the retry"""
+        play = utils.RadioPlay("dj", "Performer", "A", datetime(2026, 1, 1, 12, 0, 0), "{}")
+        try:
+            with utils.conn_db() as conn:
+                with (
+                    mock.patch.object(payloads, "store", side_effect=RuntimeError),
+                    self.assertRaises(RuntimeError),
+                ):
+                    utils.insert_plays([play], "test", conn)
+                self.assertEqual(utils.insert_plays([play], "test", conn), [play])
+            self.assertEqual(self.count_plays(), 1)
+        finally:
+            with utils.conn_db() as conn:
+                conn.exec("DELETE FROM play")
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.conn_db = cls.orig_db
+
 
 if __name__ == "__main__":
     unittest.main()